@@ -12,9 +12,9 @@
 import os
 import re
 import numpy as np
-import matplotlib.pyplot as plt
 from blocking import blocking_with_k_blocks
 from jackknife import jackknife_secondary_estimate
+from observables_store import load_store, PER_L_COLUMNS
 
 
 def get_latest_file(folder, pattern):
@@ -90,7 +90,7 @@ def analyze_all_results(base_dir='results', k=16, output_file='osservabili.txt')
             f.write("{:8.6f}  {: .6f} {: .6f}  {: .6f} {: .6f}  {: .6f} {: .6f}  {: .6f} {: .6f}  {: .6f} {: .6f}  {: .6f} {: .6f}\n".format(*r))
 
 
-def plot_observable_vs_beta(root_dir='analyzed_results', observable_index=1, observable_label='<m>', ylabel='⟨m⟩'):
+def plot_observable_vs_beta(root_dir='analyzed_results', observable_index=1, observable_label='<m>', ylabel='⟨m⟩', save_path=None):
     """
     Plotta un'osservabile in funzione di beta per ogni L.
 
@@ -98,40 +98,24 @@ def plot_observable_vs_beta(root_dir='analyzed_results', observable_index=1, obs
         root_dir : str
             Directory dove si trovano le cartelle L*/ con i file observables_vX.txt
         observable_index : int
-            Indice dell'osservabile da plottare (1 per <m>, 2 per <m|>, 3 per χ', ecc.)
+            Indice dell'osservabile da plottare nelle colonne dei file L*/observables_vX.txt
+            (0 per <m>, 1 per <|m|>, 2 per χ', ecc., vedi observables_store.PER_L_COLUMNS)
         observable_label : str
             Etichetta nel file da usare per la legenda
         ylabel : str
             Etichetta dell'asse y
+        save_path : str
+            Se dato la figura si salva invece di essere mostrata
     """
-    plt.figure(figsize=(8,6))
+    import matplotlib.pyplot as plt
 
-    for folder in sorted(os.listdir(root_dir)):
-        if not folder.startswith("L"):
-            continue
-        L = int(folder[1:])
-        subfolder = os.path.join(root_dir, folder)
+    store = load_store(root_dir)
+    name = PER_L_COLUMNS[observable_index]
 
-        # Trova il file più recente observables_vX.txt
-        files = [f for f in os.listdir(subfolder) if re.match(r'observables_v\d+\.txt', f)]
-        if not files:
-            continue
-        files.sort(key=lambda f: int(re.search(r'_v(\d+)', f).group(1)))
-        latest_file = os.path.join(subfolder, files[-1])
-
-        # Carica i dati
-        beta, obs, obs_err = [], [], []
-        with open(latest_file) as f:
-            for line in f:
-                if line.startswith("#") or not line.strip():
-                    continue
-                cols = line.strip().split()
-                beta.append(float(cols[0]))
-                value = float(cols[1 + 2 * observable_index])
-                err = float(cols[2 + 2 * observable_index])
-                obs.append(value)
-                obs_err.append(err)
+    plt.figure(figsize=(8,6))
 
+    for L in store.Ls(name):
+        beta, obs, obs_err = store.curve(L, name)
         plt.errorbar(beta, obs, yerr=obs_err, label=f"L={L}", fmt='o-', capsize=3)
 
     plt.xlabel(r'$\beta$')
@@ -140,5 +124,8 @@ def plot_observable_vs_beta(root_dir='analyzed_results', observable_index=1, obs
     plt.legend()
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    if save_path:
+        plt.savefig(save_path, bbox_inches="tight")
+    else:
+        plt.show()
 
@@ -12,38 +12,37 @@
     -> * 
 
 """
-import numpy as np
-from scipy.optimize import curve_fit
-import matplotlib.pyplot as plt
 import os
-import re
-from scipy.interpolate import interp1d
-from scipy.optimize import brentq
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from multihistogram import solve_L, beta_grid, moment_means, replica_means, observable_values
+from reweighting import find_peak
+from main import find_latest_files, compute_tables, RESULTS_DIR, OUTPUT_DIR
+from moments import replica_means_from_table
+from binary_series import resolve_series_path
+from analysis_cache import AnalysisCache, file_hashes
+from observables_store import load_store, PER_L_COLUMNS
 
 def chi_prime_parabola(beta, a, beta_pc, chi_max):
     return a * (beta - beta_pc)**2 + chi_max
 
-def fit_peak_parabola_single_L(file_path, L, observable_column_index=5, err_column_index=6, window=5, plot=True):
+def _per_L_name(column_index):
+    # indice di colonna nei file L*/observables_vX.txt (beta, valore, errore, ...) -> nome nell'archivio
+    return PER_L_COLUMNS[(column_index - 1) // 2]
+
+
+def fit_peak_parabola(beta_vals, chi_vals, chi_errs, L, window=5, plot=True, save_path=None):
     """
-    Fit parabolico locale di χ'(β) per un singolo L, da file observables_vX.txt.
+    Fit parabolico locale di χ'(β) attorno al massimo per un singolo L.
 
     Ritorna:
         beta_pc, err_beta_pc, chi_max, err_chi_max
     """
-    beta_vals, chi_vals, chi_errs = [], [], []
-
-    with open(file_path) as f:
-        for line in f:
-            if line.startswith("#") or not line.strip():
-                continue
-            cols = line.strip().split()
-            beta_vals.append(float(cols[0]))
-            chi_vals.append(float(cols[observable_column_index]))
-            chi_errs.append(float(cols[err_column_index]))
-
-    beta_vals = np.array(beta_vals)
-    chi_vals = np.array(chi_vals)
-    chi_errs = np.array(chi_errs)
+    from scipy.optimize import curve_fit
+    beta_vals = np.asarray(beta_vals)
+    chi_vals = np.asarray(chi_vals)
+    chi_errs = np.asarray(chi_errs)
 
     idx_max = np.argmax(chi_vals)
     i_start = max(0, idx_max - window)
@@ -57,7 +56,9 @@ def fit_peak_parabola_single_L(file_path, L, observable_column_index=5, err_colu
     a, beta_pc, chi_max = popt
     err_a, err_beta_pc, err_chi_max = np.sqrt(np.diag(pcov))
 
-    if plot:
+    if plot or save_path:
+        import matplotlib.pyplot as plt
+        plt.figure()
         beta_dense = np.linspace(beta_fit[0], beta_fit[-1], 200)
         chi_dense = chi_prime_parabola(beta_dense, *popt)
         plt.errorbar(beta_fit, chi_fit, yerr=err_fit, fmt='o', label='data')
@@ -69,36 +70,47 @@ def fit_peak_parabola_single_L(file_path, L, observable_column_index=5, err_colu
         plt.legend()
         plt.grid(True)
         plt.tight_layout()
-        plt.show()
+        if save_path:
+            plt.savefig(save_path, bbox_inches="tight")
+        else:
+            plt.show()
 
     return beta_pc, err_beta_pc, chi_max, err_chi_max
 
 
-def extract_fit_data_all_L(root_dir='analyzed_results', observable_column_index=5, err_column_index=6, window=5, plot=False):
+def fit_peak_parabola_single_L(file_path, L, observable_column_index=5, err_column_index=6, window=5, plot=True):
     """
-    Esegue il fit parabolico per tutti i file observables_vX.txt trovati in analyzed_results/L*/
+    Fit parabolico locale di χ'(β) per un singolo L, da file observables_vX.txt.
 
     Ritorna:
-        Lista di tuple: (L, beta_pc, err_beta_pc, chi'_max, err_chi'_max)
+        beta_pc, err_beta_pc, chi_max, err_chi_max
     """
-    results = []
+    data = np.loadtxt(file_path, comments="#", ndmin=2)
+    return fit_peak_parabola(data[:, 0], data[:, observable_column_index], data[:, err_column_index],
+                             L, window, plot)
 
-    for folder in sorted(os.listdir(root_dir)):
-        if not folder.startswith("L"):
-            continue
-        L = int(folder[1:])
-        subfolder = os.path.join(root_dir, folder)
 
-        files = [f for f in os.listdir(subfolder) if re.match(r'observables_v\d+\.txt', f)]
-        if not files:
-            continue
-        files.sort(key=lambda f: int(re.search(r'_v(\d+)', f).group(1)))
-        file_path = os.path.join(subfolder, files[-1])
+def extract_fit_data_all_L(root_dir='analyzed_results', observable_column_index=5, err_column_index=6, window=5, plot=False,
+                           save_dir=None):
+    """
+    Esegue il fit parabolico per tutti gli L, con l'ultima versione dei file observables_vX.txt
+    di analyzed_results/L*/ (letti dall'archivio di observables_store.py).
+    Con save_dir i fit dei singoli L si salvano in save_dir/fit_picco_L{L}.png.
+
+    Ritorna:
+        Lista di tuple: (L, beta_pc, err_beta_pc, chi'_max, err_chi'_max)
+    """
+    if err_column_index != observable_column_index + 1:
+        raise ValueError("L'errore deve stare nella colonna successiva al valore.")
+    store = load_store(root_dir)
+    name = _per_L_name(observable_column_index)
+    results = []
 
+    for L in store.Ls(name):
         try:
-            beta_pc, err_beta_pc, chi_max, err_chi_max = fit_peak_parabola_single_L(
-                file_path, L, observable_column_index, err_column_index, window, plot=plot
-            )
+            save_path = os.path.join(save_dir, f"fit_picco_L{L}.png") if save_dir else None
+            beta_pc, err_beta_pc, chi_max, err_chi_max = fit_peak_parabola(*store.curve(L, name), L, window, plot=plot,
+                                                                           save_path=save_path)
             results.append((L, beta_pc, err_beta_pc, chi_max, err_chi_max))
         except Exception as e:
             print(f"[L={L}] Fit fallito: {e}")
@@ -107,11 +119,12 @@ def extract_fit_data_all_L(root_dir='analyzed_results', observable_column_index=
     return results
 
 
-def fit_beta_pc_vs_L(L_array, beta_pc_array, err_beta_pc_array, plot=True):
+def fit_beta_pc_vs_L(L_array, beta_pc_array, err_beta_pc_array, plot=True, save_path=None):
     """
     Fit di beta_pc(L) = beta_c + b * L^{-1/nu}
     Ritorna: beta_c, err_beta_c, 1/nu, err_1/nu
     """
+    from scipy.optimize import curve_fit
     def fit_func(L, beta_c, b, inv_nu):
         return beta_c + b * L**(-inv_nu)
 
@@ -119,7 +132,9 @@ def fit_beta_pc_vs_L(L_array, beta_pc_array, err_beta_pc_array, plot=True):
     beta_c, b, inv_nu = popt
     err_beta_c, _, err_inv_nu = np.sqrt(np.diag(pcov))
 
-    if plot:
+    if plot or save_path:
+        import matplotlib.pyplot as plt
+        plt.figure()
         L_dense = np.linspace(min(L_array), max(L_array), 300)
         plt.errorbar(L_array, beta_pc_array, yerr=err_beta_pc_array, fmt='o', label='dati')
         plt.plot(L_dense, fit_func(L_dense, *popt), '-', label='fit')
@@ -129,16 +144,20 @@ def fit_beta_pc_vs_L(L_array, beta_pc_array, err_beta_pc_array, plot=True):
         plt.grid(True)
         plt.legend()
         plt.tight_layout()
-        plt.show()
+        if save_path:
+            plt.savefig(save_path, bbox_inches="tight")
+        else:
+            plt.show()
 
     return beta_c, err_beta_c, 1/inv_nu, err_inv_nu / (inv_nu**2)
 
 
-def fit_chi_max_vs_L(L_array, chi_max_array, err_chi_max_array, plot=True):
+def fit_chi_max_vs_L(L_array, chi_max_array, err_chi_max_array, plot=True, save_path=None):
     """
     Fit di chi'_max(L) = c0 + c1 * L^{gamma/nu}
     Ritorna: gamma/nu, err_gamma/nu
     """
+    from scipy.optimize import curve_fit
     def fit_func(L, c0, c1, gamma_su_nu):
         return c0 + c1 * L**gamma_su_nu
 
@@ -146,7 +165,9 @@ def fit_chi_max_vs_L(L_array, chi_max_array, err_chi_max_array, plot=True):
     c0, c1, gamma_su_nu = popt
     err_c0, err_c1, err_gamma_su_nu = np.sqrt(np.diag(pcov))
 
-    if plot:
+    if plot or save_path:
+        import matplotlib.pyplot as plt
+        plt.figure()
         L_dense = np.linspace(min(L_array), max(L_array), 300)
         plt.errorbar(L_array, chi_max_array, yerr=err_chi_max_array, fmt='o', label='dati')
         plt.plot(L_dense, fit_func(L_dense, *popt), '-', label='fit')
@@ -156,12 +177,15 @@ def fit_chi_max_vs_L(L_array, chi_max_array, err_chi_max_array, plot=True):
         plt.grid(True)
         plt.legend()
         plt.tight_layout()
-        plt.show()
+        if save_path:
+            plt.savefig(save_path, bbox_inches="tight")
+        else:
+            plt.show()
 
     return gamma_su_nu, err_gamma_su_nu
 
 
-def estimate_betac_from_binder_crossings(root_dir='analyzed_results', observable_column_index=11, plot=True):
+def estimate_betac_from_binder_crossings(root_dir='analyzed_results', observable_column_index=11, plot=True, save_path=None):
     """
     Stima beta_c dal crossing di U(beta) tra taglie L consecutive.
     
@@ -171,31 +195,14 @@ def estimate_betac_from_binder_crossings(root_dir='analyzed_results', observable
     Ritorna:
         lista di stime beta_c da crossing
     """
+    from scipy.interpolate import interp1d
+    from scipy.optimize import brentq
+    store = load_store(root_dir)
+    name = _per_L_name(observable_column_index)
     binder_data = {}
-
-    # Leggi tutti i dati
-    for folder in sorted(os.listdir(root_dir)):
-        if not folder.startswith("L"):
-            continue
-        L = int(folder[1:])
-        subfolder = os.path.join(root_dir, folder)
-
-        files = [f for f in os.listdir(subfolder) if re.match(r'observables_v\d+\.txt', f)]
-        if not files:
-            continue
-        files.sort(key=lambda f: int(re.search(r'_v(\d+)', f).group(1)))
-        file_path = os.path.join(subfolder, files[-1])
-
-        beta_vals, U_vals = [], []
-        with open(file_path) as f:
-            for line in f:
-                if line.startswith("#") or not line.strip():
-                    continue
-                cols = line.strip().split()
-                beta_vals.append(float(cols[0]))
-                U_vals.append(float(cols[observable_column_index]))
-
-        binder_data[L] = (np.array(beta_vals), np.array(U_vals))
+    for L in store.Ls(name):
+        beta_vals, U_vals, _ = store.curve(L, name)
+        binder_data[L] = (beta_vals, U_vals)
 
     # Ordina L e stima crossing per L1 < L2
     Ls = sorted(binder_data.keys())
@@ -221,7 +228,8 @@ def estimate_betac_from_binder_crossings(root_dir='analyzed_results', observable
         except ValueError:
             print(f"Crossing non trovato tra L={L1} e L={L2}")
 
-    if plot:
+    if plot or save_path:
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(8,6))
         for L in Ls:
             beta, U = binder_data[L]
@@ -234,12 +242,324 @@ def estimate_betac_from_binder_crossings(root_dir='analyzed_results', observable
         plt.legend()
         plt.grid(True)
         plt.tight_layout()
-        plt.show()
+        if save_path:
+            plt.savefig(save_path, bbox_inches="tight")
+        else:
+            plt.show()
 
     return beta_crossings
 
 
-def plot_fig_5_5(L_array, beta_pc_array, beta_pc_err, chi_max_array, chi_max_err):
+def _jackknife(values_jk):
+    k = len(values_jk)
+    mean = np.mean(values_jk, axis=0)
+    return mean, np.sqrt((k - 1) / k * np.sum((values_jk - mean)**2, axis=0))
+
+
+def wham_solutions_all_L(results_dir=RESULTS_DIR, k=20, n_workers=1, use_tau=False):
+    """
+    Soluzione WHAM (vedi multihistogram.py) per ogni L in results_dir, combinando tutti i beta di quella L.
+    Ritorna {L: soluzione}.
+    """
+    solutions = {}
+    for L in sorted({L for L, _, _ in find_latest_files(results_dir)}):
+        try:
+            solutions[L] = solve_L(L, results_dir, k, n_workers, use_tau)
+        except ValueError as e:
+            print(f"[L={L}] WHAM non risolto: {e}")
+    return solutions
+
+
+def wham_peaks_all_L(solutions, observable="χ′", n_betas=401, plot=False, save_path=None):
+    """
+    Picco di un'osservabile dalle curve continue del WHAM invece che dal fit parabolico sui beta simulati.
+    La posizione del picco si cerca su ogni replica jackknife, quindi gli errori tengono conto
+    delle correlazioni tra beta vicini.
+
+    Ritorna:
+        Lista di tuple: (L, beta_pc, err_beta_pc, max, err_max), come extract_fit_data_all_L
+    """
+    results = []
+    if plot or save_path:
+        import matplotlib.pyplot as plt
+        plt.figure()
+    for L, solution in sorted(solutions.items()):
+        betas = beta_grid(solution, n_betas)
+        replicas = observable_values(replica_means(solution, betas), observable)
+        peaks = np.array([find_peak(betas, values) for values in replicas])
+        (beta_pc, chi_max), (err_beta_pc, err_chi_max) = _jackknife(peaks)
+        results.append((L, beta_pc, err_beta_pc, chi_max, err_chi_max))
+
+        if plot or save_path:
+            mean, err = _jackknife(replicas)
+            plt.plot(betas, mean, '-', label=f"L={L}")
+            plt.fill_between(betas, mean - err, mean + err, alpha=0.3)
+            plt.axvline(beta_pc, color='gray', linestyle='--')
+
+    if plot or save_path:
+        plt.xlabel(r"$\beta$")
+        plt.ylabel(observable)
+        plt.title(f"Curve WHAM di {observable}")
+        plt.legend()
+        plt.grid(True)
+        plt.tight_layout()
+        if save_path:
+            plt.savefig(save_path, bbox_inches="tight")
+        else:
+            plt.show()
+
+    return results
+
+
+def _crossing(betas, diff, near=None):
+    """ Zero di diff(beta) per interpolazione lineare; se ci sono più cambi di segno si prende il più vicino a near. """
+    idx = np.nonzero(np.sign(diff[:-1]) * np.sign(diff[1:]) <= 0)[0]
+    if len(idx) == 0:
+        return None
+    roots = betas[idx] - diff[idx] * (betas[idx + 1] - betas[idx]) / (diff[idx + 1] - diff[idx])
+    if near is None:
+        return roots[0]
+    return roots[np.argmin(np.abs(roots - near))]
+
+
+def wham_binder_crossings(solutions, n_betas=2001, plot=True, save_path=None):
+    """
+    Crossing di U(beta) tra taglie L consecutive dalle curve WHAM, con errori jackknife (le repliche
+    di due L diverse sono indipendenti, quindi si abbinano blocco per blocco).
+
+    Ritorna:
+        lista di tuple (L1, L2, beta_crossing, err_beta_crossing)
+    """
+    Ls = sorted(solutions)
+    crossings = []
+
+    for L1, L2 in zip(Ls[:-1], Ls[1:]):
+        sol1, sol2 = solutions[L1], solutions[L2]
+        beta_min = max(sol1["runs"]["betas"][0], sol2["runs"]["betas"][0])
+        beta_max = min(sol1["runs"]["betas"][-1], sol2["runs"]["betas"][-1])
+        if beta_min >= beta_max:
+            print(f"Intervalli di beta disgiunti tra L={L1} e L={L2}")
+            continue
+        betas = np.linspace(beta_min, beta_max, n_betas)
+
+        diff = observable_values(moment_means(sol1, betas), "U") - observable_values(moment_means(sol2, betas), "U")
+        root = _crossing(betas, diff)
+        if root is None:
+            print(f"Crossing non trovato tra L={L1} e L={L2}")
+            continue
+
+        diff_jk = observable_values(replica_means(sol1, betas), "U") - observable_values(replica_means(sol2, betas), "U")
+        roots_jk = [_crossing(betas, d, near=root) for d in diff_jk]
+        if any(r is None for r in roots_jk):
+            print(f"Crossing non trovato in tutte le repliche tra L={L1} e L={L2}")
+            continue
+        crossing, err = _jackknife(np.array(roots_jk))
+        crossings.append((L1, L2, crossing, err))
+
+    if plot or save_path:
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(8,6))
+        for L in Ls:
+            betas = beta_grid(solutions[L])
+            plt.plot(betas, observable_values(moment_means(solutions[L], betas), "U"), label=f"L={L}")
+        for _, _, b, _ in crossings:
+            plt.axvline(b, color='gray', linestyle='--')
+        plt.xlabel(r"$\beta$")
+        plt.ylabel("Binder cumulant $U$")
+        plt.title("Crossing del cumulante di Binder (WHAM)")
+        plt.legend()
+        plt.grid(True)
+        plt.tight_layout()
+        if save_path:
+            plt.savefig(save_path, bbox_inches="tight")
+        else:
+            plt.show()
+
+    return crossings
+
+
+def load_replicas_all_L(results_dir=RESULTS_DIR, observable="χ′", k=20, use_cache=True):
+    """
+    Repliche jackknife di un'osservabile per ogni (L, beta), con lo stesso k per tutti i file.
+    La replica b di ogni file è calcolata senza il suo b-esimo blocco; le serie sono indipendenti, quindi
+    la replica b di tutti i file insieme è una replica jackknife dell'intero insieme di dati e si può
+    propagare attraverso i fit di tutte le L.
+    Le tabelle delle somme per blocco vengono da analysis_cache.py quando possibile.
+
+    Ritorna:
+        {L: (betas (n_beta,), repliche (k, n_beta))}
+    """
+    cache = AnalysisCache() if use_cache else None
+    per_L = {}
+
+    for L, beta, file_path in find_latest_files(results_dir):
+        file_path = resolve_series_path(file_path)
+        tables = cache.get(file_path, [k]) if cache is not None else None
+        if tables is None:
+            with ThreadPoolExecutor(max_workers=1) as hasher:
+                # gli hash della cache si calcolano mentre compute_tables legge il file
+                hashes = hasher.submit(file_hashes, file_path) if cache is not None else None
+                N, tables = compute_tables(file_path, [k])
+            if cache is not None:
+                cache.put(file_path, tables, N, hashes=hashes.result())
+        if k not in tables:
+            print(f"[L={L}, beta={beta}] serie troppo corta per k={k}")
+            continue
+
+        table, M = tables[k]
+        per_L.setdefault(L, []).append((beta, observable_values(replica_means_from_table(table, M), observable)))
+
+    if cache is not None:
+        cache.save()
+
+    return {L: (np.array([beta for beta, _ in rows]), np.column_stack([values for _, values in rows]))
+            for L, rows in sorted(per_L.items())}
+
+
+def _inverse_variance_weights(err, what, points):
+    """
+    Pesi 1/σ² dei fit; ValueError se qualche σ è nullo o non finito (pesi infiniti o NaN),
+    indicando i punti (beta o L) interessati.
+    """
+    err = np.asarray(err, dtype=float)
+    bad = ~np.isfinite(err) | (err <= 0)
+    if np.any(bad):
+        raise ValueError(f"{what}: errore nullo o non finito per {np.asarray(points)[bad].tolist()} "
+                         f"(σ = {err[bad].tolist()}), impossibile pesare il fit con 1/σ²")
+    return 1 / err**2
+
+
+def _weighted_lsq(X, w, Y):
+    """
+    Minimi quadrati lineari pesati risolti in blocco con le equazioni normali:
+        X (..., n, p) matrici di disegno, w (..., n) pesi 1/σ², Y (..., r, n) r insiemi di dati con la stessa X.
+    Le dimensioni iniziali (...) si combinano con il broadcasting.
+    Ritorna (coefficienti (..., r, p), χ² (..., r)).
+    """
+    A = np.einsum("...ni,...n,...nj->...ij", X, w, X)
+    B = np.einsum("...ni,...n,...rn->...ri", X, w, Y)
+    coef = np.linalg.solve(A[..., None, :, :], B[..., None])[..., 0]
+    residuals = Y - np.einsum("...ni,...ri->...rn", X, coef)
+    chi2 = np.einsum("...n,...rn->...r", w, residuals**2)
+    return coef, chi2
+
+
+def fit_peak_parabola_jackknife(replicas, window=5):
+    """
+    Fit parabolico locale del picco per tutte le L e tutte le repliche jackknife insieme.
+    La parabola a (β - β_pc)² + χ_max è il polinomio c0 + c1 x + c2 x², x = β - β del massimo della
+    curva media, quindi il fit è lineare: un unico sistema di equazioni normali per ogni L, risolto
+    in blocco per tutte le repliche. Finestra di ±window beta attorno al massimo della media, pesi 1/σ²
+    dagli errori jackknife di ogni beta (le finestre tagliate dai bordi hanno pesi nulli in coda).
+
+    Ritorna:
+        Ls (n_L,), beta_pc (n_L, k), chi_max (n_L, k)
+    """
+    Ls = sorted(replicas)
+    k = replicas[Ls[0]][1].shape[0]
+    n_w = 2 * window + 1
+
+    X = np.zeros((len(Ls), n_w, 3))
+    w = np.zeros((len(Ls), n_w))
+    Y = np.zeros((len(Ls), k, n_w))
+    centers = np.empty(len(Ls))
+
+    for i, L in enumerate(Ls):
+        betas, reps = replicas[L]
+        if reps.shape[0] != k:
+            raise ValueError("Tutte le L devono avere lo stesso numero di repliche jackknife.")
+        mean, err = _jackknife(reps)
+
+        idx_max = np.argmax(mean)
+        i_start = max(0, idx_max - window)
+        i_end = min(len(betas), idx_max + window + 1)
+        n = i_end - i_start
+        if n < 3:
+            raise ValueError(f"[L={L}] servono almeno 3 beta attorno al picco")
+
+        centers[i] = betas[idx_max]
+        x = betas[i_start:i_end] - centers[i]
+        X[i, :n] = np.column_stack((np.ones(n), x, x**2))
+        w[i, :n] = _inverse_variance_weights(err[i_start:i_end], f"[L={L}] fit del picco", betas[i_start:i_end])
+        Y[i, :, :n] = reps[:, i_start:i_end]
+
+    coef, _ = _weighted_lsq(X, w, Y)
+    c0, c1, c2 = coef[..., 0], coef[..., 1], coef[..., 2]
+    beta_pc = centers[:, None] - c1 / (2 * c2)
+    chi_max = c0 - c1**2 / (4 * c2)
+    return np.array(Ls), beta_pc, chi_max
+
+
+def fit_power_law_profile(L_array, Y, sigma, exponents, sign):
+    """
+    Fit di y(L) = p0 + p1 L^(sign x) per ogni riga di Y (r, n_L), con errori sigma (n_L,) comuni.
+    Per x fisso il modello è lineare in (p0, p1): si risolvono insieme i minimi quadrati per tutta
+    la griglia exponents e tutte le righe, si prende il minimo di χ² sulla griglia e lo si raffina con
+    la parabola per i tre punti vicini, poi si ricalcolano p0 e p1 all'esponente raffinato.
+
+    Ritorna:
+        x (r,), p0 (r,), p1 (r,)
+    """
+    L_array = np.asarray(L_array, dtype=float)
+    exponents = np.asarray(exponents, dtype=float)
+    w = _inverse_variance_weights(sigma, "fit in L", L_array)
+
+    def design(x):
+        powers = L_array**(sign * np.asarray(x)[..., None])
+        return np.stack((np.ones_like(powers), powers), axis=-1)
+
+    _, chi2 = _weighted_lsq(design(exponents), w, Y[None]) # (n_grid, r)
+    i = np.argmin(chi2, axis=0)
+    if np.any((i == 0) | (i == len(exponents) - 1)):
+        print(f"Attenzione: minimo di χ² al bordo della griglia [{exponents[0]}, {exponents[-1]}]")
+    i = np.clip(i, 1, len(exponents) - 2)
+    rows = np.arange(Y.shape[0])
+    left, center, right = chi2[i - 1, rows], chi2[i, rows], chi2[i + 1, rows]
+    curvature = left - 2 * center + right
+    shift = np.where(curvature > 0, 0.5 * (left - right) / np.where(curvature > 0, curvature, 1), 0)
+    x = exponents[i] + np.clip(shift, -1, 1) * (exponents[1] - exponents[0])
+
+    coef, _ = _weighted_lsq(design(x), w, Y[:, None, :])
+    return x, coef[:, 0, 0], coef[:, 0, 1]
+
+
+def jackknife_fss(results_dir=RESULTS_DIR, k=20, window=5, inv_nu_grid=np.linspace(0.2, 3.0, 561),
+                  gamma_su_nu_grid=np.linspace(0.5, 3.0, 501), use_cache=True, plot=False):
+    """
+    Stima di beta_c, 1/nu e gamma/nu con errori jackknife: le repliche di χ′(β) di tutti i file
+    passano, senza fit non lineari, per il fit dei picchi e per i fit di beta_pc(L) e χ′_max(L)
+    (stessa forma di fit_beta_pc_vs_L e fit_chi_max_vs_L). Gli errori tengono quindi conto delle
+    correlazioni tra beta vicini e tra i parametri dei fit.
+
+    Ritorna un dizionario con L, beta_pc, chi_max (valori per L) e beta_c, inv_nu, gamma_su_nu,
+    ognuno come (stima, errore).
+    """
+    replicas = load_replicas_all_L(results_dir, "χ′", k, use_cache)
+    Ls, beta_pc, chi_max = fit_peak_parabola_jackknife(replicas, window)
+    if len(Ls) < 3:
+        raise ValueError("Servono almeno 3 taglie L per i fit di scaling.")
+
+    beta_pc_mean, beta_pc_err = _jackknife(beta_pc.T)
+    chi_max_mean, chi_max_err = _jackknife(chi_max.T)
+
+    inv_nu, beta_c, _ = fit_power_law_profile(Ls, beta_pc.T, beta_pc_err, inv_nu_grid, sign=-1)
+    gamma_su_nu, _, _ = fit_power_law_profile(Ls, chi_max.T, chi_max_err, gamma_su_nu_grid, sign=1)
+
+    if plot:
+        plot_fig_5_5(Ls, beta_pc_mean, beta_pc_err, chi_max_mean, chi_max_err)
+
+    return {
+        "L": Ls,
+        "beta_pc": (beta_pc_mean, beta_pc_err),
+        "chi_max": (chi_max_mean, chi_max_err),
+        "beta_c": _jackknife(beta_c),
+        "inv_nu": _jackknife(inv_nu),
+        "gamma_su_nu": _jackknife(gamma_su_nu),
+    }
+
+
+def plot_fig_5_5(L_array, beta_pc_array, beta_pc_err, chi_max_array, chi_max_err, save_path=None):
+    import matplotlib.pyplot as plt
     fig, ax1 = plt.subplots(figsize=(8, 6))
 
     color = 'tab:blue'
@@ -257,11 +577,15 @@ def plot_fig_5_5(L_array, beta_pc_array, beta_pc_err, chi_max_array, chi_max_err
 
     fig.tight_layout()
     plt.title("Figura 5.5: $\chi'_{\max}(L)$ e $\\beta_{pc}(L)$")
-    plt.show()
+    if save_path:
+        plt.savefig(save_path, bbox_inches="tight")
+    else:
+        plt.show()
 
 
 def plot_fig_5_6(L_array, beta_pc_array, beta_pc_err, chi_max_array, chi_max_err,
-                 beta_c_fit, err_beta_c, nu_fit, err_nu, gamma_fit, err_gamma):
+                 beta_c_fit, err_beta_c, nu_fit, err_nu, gamma_fit, err_gamma, save_path=None):
+    import matplotlib.pyplot as plt
     
     logL = np.log(L_array)
 
@@ -289,4 +613,45 @@ def plot_fig_5_6(L_array, beta_pc_array, beta_pc_err, chi_max_array, chi_max_err
 
     fig.tight_layout()
     plt.title("Figura 5.6: Fit di scaling critico")
-    plt.show()
+    if save_path:
+        plt.savefig(save_path, bbox_inches="tight")
+    else:
+        plt.show()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stima di beta_c, 1/nu e gamma/nu con il finite size scaling.")
+    parser.add_argument("--root", default=OUTPUT_DIR, help="cartella analyzed_results con le cartelle L*/")
+    parser.add_argument("--results-dir", default=RESULTS_DIR, help="serie temporali (per --jackknife e --wham)")
+    parser.add_argument("--jackknife", action="store_true",
+                        help="fit con repliche jackknife dalle serie temporali invece che da analyzed_results")
+    parser.add_argument("--wham", action="store_true", help="picchi e incroci di Binder dalle curve WHAM")
+    parser.add_argument("-k", type=int, default=20, help="blocchi jackknife (--jackknife e --wham)")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="processi per gli istogrammi (--wham)")
+    parser.add_argument("--plot", action="store_true", help="mostra le figure")
+    args = parser.parse_args()
+
+    if args.jackknife:
+        fss = jackknife_fss(args.results_dir, args.k, plot=args.plot)
+        for name in ("beta_c", "inv_nu", "gamma_su_nu"):
+            print(f"{name:<12} = {fss[name][0]:.6f} ± {fss[name][1]:.6f}")
+    else:
+        if args.wham:
+            solutions = wham_solutions_all_L(args.results_dir, args.k, args.workers)
+            results = wham_peaks_all_L(solutions, plot=args.plot)
+            for L1, L2, crossing, err in wham_binder_crossings(solutions, plot=args.plot):
+                print(f"Incrocio di U tra L={L1} e L={L2}: beta = {crossing:.6f} ± {err:.6f}")
+        else:
+            results = extract_fit_data_all_L(args.root, plot=args.plot)
+            for crossing in estimate_betac_from_binder_crossings(args.root, plot=args.plot):
+                print(f"Incrocio di U: beta = {crossing:.6f}")
+
+        for L, beta_pc, err_beta_pc, chi_max, err_chi_max in results:
+            print(f"L = {L:<4} beta_pc = {beta_pc:.6f} ± {err_beta_pc:.6f}   χ′_max = {chi_max:.4f} ± {err_chi_max:.4f}")
+        if len(results) >= 3:
+            L, beta_pc, err_beta_pc, chi_max, err_chi_max = map(np.array, zip(*results))
+            beta_c, err_beta_c, nu, err_nu = fit_beta_pc_vs_L(L, beta_pc, err_beta_pc, plot=args.plot)
+            gamma_su_nu, err_gamma_su_nu = fit_chi_max_vs_L(L, chi_max, err_chi_max, plot=args.plot)
+            print(f"beta_c      = {beta_c:.6f} ± {err_beta_c:.6f}")
+            print(f"nu          = {nu:.4f} ± {err_nu:.4f}")
+            print(f"gamma/nu    = {gamma_su_nu:.4f} ± {err_gamma_su_nu:.4f}")
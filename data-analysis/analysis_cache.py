@@ -0,0 +1,234 @@
+""" Cache persistente delle statistiche sufficienti (tabelle delle somme per blocco) di ogni file analizzato.
+
+    Un file è identificato da path, dimensione, mtime e hash del contenuto:
+    - se path, dimensione e mtime coincidono con quelli salvati il file non è cambiato;
+    - se cambia solo l'mtime (es. copia o touch) si confronta l'hash del contenuto;
+    - altrimenti la voce è invalidata e il file viene rianalizzato.
+
+    Gli hash sono due blake2b: uno campionato (dimensione, inizio, fine e HASH_SAMPLES pezzi equispaziati,
+    poche letture anche per serie di GB) che scarta subito i file chiaramente cambiati, e uno dell'intero
+    contenuto, ricalcolato prima di fidarsi della cache quando l'mtime è cambiato: una riscrittura che lascia
+    uguali i pezzi campionati non passa. Resta il caso di un file modificato senza cambiare dimensione né
+    mtime (es. mtime ripristinato a mano): con verify=True (main.py --verify-cache) l'hash completo si
+    controlla per ogni file, una sola volta per file in ogni sessione (istanza di AnalysisCache).
+    Gli hash di un file appena analizzato (file_hashes) conviene calcolarli nel processo che lo legge,
+    mentre lo legge, e passarli a put: altrimenti put rilegge tutto il file.
+    Le voci sono file .npz in cache_dir, l'indice è cache_dir/index.json; quando la dimensione totale supera
+    max_bytes si eliminano le voci usate meno di recente.
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(BASE_DIR, "analysis_cache")
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+HASH_SAMPLES = 16
+HASH_PIECE = 64 * 1024
+
+
+def content_hash(file_path):
+    size = os.path.getsize(file_path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(size).encode())
+    with open(file_path, "rb") as f:
+        offsets = {0, max(0, size - HASH_PIECE)}
+        offsets.update(i * size // (HASH_SAMPLES + 1) for i in range(1, HASH_SAMPLES + 1))
+        for offset in sorted(offsets):
+            f.seek(offset)
+            h.update(f.read(HASH_PIECE))
+    return h.hexdigest()
+
+
+def full_content_hash(file_path, block=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+def file_hashes(file_path):
+    """ (hash campionato, hash completo) del file, come salvati nelle voci della cache. """
+    return content_hash(file_path), full_content_hash(file_path)
+
+
+class AnalysisCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, verify=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self._verified = {} # path -> (dimensione, mtime) con cui l'hash completo è già stato controllato
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    def _entry_file(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".npz")
+
+    def _identity(self, file_path):
+        st = os.stat(file_path)
+        return st.st_size, st.st_mtime_ns
+
+    def _valid_entry(self, file_path):
+        """ Ritorna la voce dell'indice se il file non è cambiato, altrimenti None. """
+        key = os.path.abspath(file_path)
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+
+        size, mtime_ns = self._identity(file_path)
+        if entry["size"] != size:
+            return None
+        if (entry["mtime_ns"] != mtime_ns or self.verify) and self._verified.get(key) != (size, mtime_ns):
+            # le voci senza hash completo (versioni precedenti della cache) non si possono verificare
+            if entry["hash"] != content_hash(file_path) or entry.get("full_hash") != full_content_hash(file_path):
+                return None
+            entry["mtime_ns"] = mtime_ns # stesso contenuto, si aggiorna solo l'mtime
+            self._verified[key] = (size, mtime_ns)
+        return entry
+
+    def get(self, file_path, ks):
+        """
+        Ritorna {k: (tabella, M)} se il file è in cache con tutti i k richiesti, altrimenti None.
+        I k non validi per la lunghezza della serie (k > n_rows) vengono ignorati, come nell'analisi.
+        """
+        entry = self._valid_entry(file_path)
+        if entry is None:
+            return None
+        ks = {k for k in ks if 2 <= k <= entry["n_rows"]}
+        if not ks <= set(entry["ks"]):
+            return None
+
+        try:
+            with np.load(entry["file"]) as data:
+                tables = {k: (data[f"table_{k}"], int(data[f"M_{k}"])) for k in ks}
+        except (OSError, KeyError):
+            return None
+
+        entry["last_used"] = time.time()
+        return tables
+
+    def get_meta(self, file_path, name):
+        """ Ritorna un metadato salvato con il file (es. i τ_int), se il file non è cambiato. """
+        entry = self._valid_entry(file_path)
+        if entry is None:
+            return None
+        return entry.get("meta", {}).get(name)
+
+    def put(self, file_path, tables, n_rows, hashes=None, **meta):
+        """
+        Salva le tabelle {k: (tabella, M)} del file (lungo n_rows righe), unendole a quelle già presenti
+        se il file non è cambiato. hashes: file_hashes del file, se già calcolati durante la lettura
+        (altrimenti, per una voce nuova, si calcolano qui). meta: piccoli metadati serializzabili in JSON
+        (es. i τ_int).
+        """
+        key = os.path.abspath(file_path)
+        entry = self._valid_entry(file_path)
+
+        merged = {}
+        if entry is not None:
+            try:
+                with np.load(entry["file"]) as data:
+                    merged = {k: (data[f"table_{k}"], int(data[f"M_{k}"])) for k in entry["ks"]}
+            except (OSError, KeyError):
+                merged = {}
+        merged.update(tables)
+
+        arrays = {}
+        for k, (table, M) in merged.items():
+            arrays[f"table_{k}"] = table
+            arrays[f"M_{k}"] = np.array(M)
+
+        entry_file = self._entry_file(key)
+        np.savez(entry_file, **arrays)
+
+        if entry is not None:
+            hashes = entry["hash"], entry["full_hash"]
+        elif hashes is None:
+            hashes = file_hashes(file_path)
+
+        size, mtime_ns = self._identity(file_path)
+        self.index[key] = {
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "hash": hashes[0],
+            "full_hash": hashes[1],
+            "n_rows": int(n_rows),
+            "ks": sorted(int(k) for k in merged),
+            "file": entry_file,
+            "bytes": os.path.getsize(entry_file),
+            "last_used": time.time(),
+            "meta": dict(entry.get("meta", {}) if entry is not None else {}, **meta),
+        }
+
+    def invalidate(self, paths=None):
+        """ Elimina le voci dei path passati, o tutta la cache se paths è None. Ritorna il numero di voci rimosse. """
+        keys = list(self.index) if paths is None else [os.path.abspath(p) for p in paths]
+        removed = 0
+        for key in keys:
+            entry = self.index.pop(key, None)
+            if entry is None:
+                continue
+            if os.path.exists(entry["file"]):
+                os.remove(entry["file"])
+            removed += 1
+        return removed
+
+    def total_bytes(self):
+        return sum(entry["bytes"] for entry in self.index.values())
+
+    def evict(self, max_bytes=None):
+        """ Elimina le voci usate meno di recente finché la cache non sta in max_bytes. """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        total = self.total_bytes()
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= max_bytes:
+                break
+            total -= entry["bytes"]
+            self.invalidate([key])
+
+    def save(self):
+        self.evict()
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestione della cache di analisi.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_inv = sub.add_parser("invalidate", help="rimuove le voci dei file indicati (tutte se nessun file)")
+    p_inv.add_argument("paths", nargs="*")
+
+    p_evict = sub.add_parser("evict", help="riduce la cache sotto la dimensione indicata")
+    p_evict.add_argument("--max-mb", type=float, required=True)
+
+    sub.add_parser("stats", help="numero di voci e dimensione della cache")
+
+    args = parser.parse_args()
+    cache = AnalysisCache(args.cache_dir)
+
+    if args.command == "invalidate":
+        n = cache.invalidate(args.paths or None)
+        print(f"Rimosse {n} voci.")
+    elif args.command == "evict":
+        cache.evict(int(args.max_mb * 1024**2))
+    else:
+        print(f"{len(cache.index)} voci, {cache.total_bytes() / 1024**2:.1f} MB in {args.cache_dir}")
+
+    cache.save()
@@ -0,0 +1,203 @@
+""" Autocorrelazione a blocchi (out-of-core) per serie troppo lunghe per stare in memoria.
+
+    Si legge il file a pezzi e si accumulano le somme
+        S(τ) = sum_t y_t y_{t+τ},   τ = 0, ..., max_lag - 1
+    con il metodo overlap-save: ogni blocco di B elementi viene correlato, con una rfft di lunghezza
+    nfft >= B + max_lag, con sé stesso più i max_lag elementi successivi. La memoria dipende solo da
+    B e max_lag, non dalla lunghezza della serie.
+
+    y è la serie traslata di una costante (media del primo pezzo) per limitare le cancellazioni numeriche;
+    la correzione per la media vera si fa alla fine con le somme di testa e di coda:
+        sum_t (y_t - μ)(y_{t+τ} - μ) = S(τ) - μ (A_τ + B_τ) + (N - τ) μ²
+    dove A_τ è la somma dei primi N - τ elementi e B_τ quella degli ultimi N - τ.
+    Il risultato coincide con autocorrelation_function di tau_exp_estimate.py.
+"""
+import numpy as np
+from numpy.fft import rfft, irfft
+from binary_series import iter_chunks, count_rows
+from instrumentation import profiled
+
+# serie derivate da (m, e) su cui si può calcolare l'autocorrelazione in una stessa passata
+SERIES = {
+    "m": lambda m, e: m,
+    "|m|": lambda m, e: np.abs(m),
+    "e": lambda m, e: e,
+    "m²": lambda m, e: m**2,
+}
+
+CHUNK_ROWS = 1 << 20
+TAU_MAX_LAG = 1024 # finestra di lag della prima passata di integrated_times_file
+
+
+def _block_size(max_lag):
+    # nfft potenza di 2, con il blocco almeno grande quanto la finestra di lag
+    nfft = 1 << int(np.ceil(np.log2(max(2 * max_lag, 1 << 16))))
+    return nfft - max_lag, nfft
+
+
+class StreamingAutocovariance:
+    """
+    Accumulatore delle somme S(τ) per una o più serie (colonne) lette a pezzi.
+    """
+
+    def __init__(self, max_lag, n_series=1):
+        if max_lag < 1:
+            raise ValueError("max_lag deve essere almeno 1.")
+        self.max_lag = max_lag
+        self.B, self.nfft = _block_size(max_lag)
+        self.sums = np.zeros((max_lag, n_series))
+        self.shift = None
+        self.N = 0
+        self.total = np.zeros(n_series)
+        # buffer di dimensione fissa: blocco corrente più i max_lag elementi successivi
+        self.buffer = np.empty((self.B + max_lag, n_series))
+        self.filled = 0
+        # primi max_lag elementi e buffer circolare degli ultimi max_lag (per la correzione della media)
+        self.head = np.zeros((max_lag, n_series))
+        self.tail = np.zeros((max_lag, n_series))
+        self.tail_pos = 0
+
+    def _correlate(self, block, ext):
+        # sum_t block_t ext_{t+τ}: con nfft >= B + max_lag non ci sono contributi circolari per τ < max_lag
+        f_block = rfft(block, n=self.nfft, axis=0)
+        f_ext = rfft(ext, n=self.nfft, axis=0)
+        return irfft(np.conjugate(f_block) * f_ext, n=self.nfft, axis=0)[:self.max_lag]
+
+    def add(self, chunk):
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.ndim == 1:
+            chunk = chunk[:, None]
+        if len(chunk) == 0:
+            return
+        if self.shift is None:
+            self.shift = chunk.mean(axis=0)
+        y = chunk - self.shift
+
+        n_head = min(self.max_lag - self.N, len(y))
+        if n_head > 0:
+            self.head[self.N:self.N + n_head] = y[:n_head]
+        self.N += len(y)
+        self.total += y.sum(axis=0)
+        self._push_tail(y)
+
+        # si riempie il buffer; quando è pieno il blocco ha i suoi max_lag elementi successivi e si elabora,
+        # poi questi ultimi diventano l'inizio del blocco seguente
+        size = len(self.buffer)
+        pos = 0
+        while pos < len(y):
+            n = min(size - self.filled, len(y) - pos)
+            self.buffer[self.filled:self.filled + n] = y[pos:pos + n]
+            self.filled += n
+            pos += n
+            if self.filled == size:
+                self.sums += self._correlate(self.buffer[:self.B], self.buffer)
+                self.buffer[:self.max_lag] = self.buffer[self.B:] # B >= max_lag: nessuna sovrapposizione
+                self.filled = self.max_lag
+
+    def _push_tail(self, y):
+        L = self.max_lag
+        if len(y) >= L:
+            self.tail[:] = y[-L:]
+            self.tail_pos = 0
+        else:
+            idx = (self.tail_pos + np.arange(len(y))) % L
+            self.tail[idx] = y
+            self.tail_pos = (self.tail_pos + len(y)) % L
+
+    def result(self):
+        """
+        Ritorna (N, media, autocovarianze non normalizzate (max_lag, n_series)), come la somma
+        sum_t (x_t - μ)(x_{t+τ} - μ) calcolata da autocorrelation_function.
+        """
+        if self.max_lag >= self.N:
+            raise ValueError("max_lag deve essere minore della lunghezza della serie.")
+
+        # blocchi finali: i successivi sono meno di max_lag, lo zero padding fa il resto
+        sums = self.sums.copy()
+        pending = self.buffer[:self.filled]
+        for start in range(0, len(pending), self.B):
+            sums += self._correlate(pending[start:start + self.B], pending[start:start + self.B + self.max_lag])
+
+        N, L = self.N, self.max_lag
+        mu = self.total / N
+        taus = np.arange(L)[:, None]
+
+        # somme dei primi e degli ultimi τ elementi (τ = 0, ..., max_lag - 1)
+        head_sums = np.vstack((np.zeros((1, sums.shape[1])), np.cumsum(self.head, axis=0)[:L - 1]))
+        tail = np.roll(self.tail, -self.tail_pos, axis=0) # dal più vecchio al più recente
+        tail_sums = np.vstack((np.zeros((1, sums.shape[1])), np.cumsum(tail[::-1], axis=0)[:L - 1]))
+        A = self.total - tail_sums
+        B = self.total - head_sums
+
+        cov = sums - mu * (A + B) + (N - taus) * mu**2
+        return N, self.shift + mu, cov
+
+
+def streaming_autocovariance(file_path, max_lag, series=("m",), chunk_rows=CHUNK_ROWS):
+    """
+    Autocovarianze (non normalizzate) delle serie derivate richieste (chiavi di SERIES) lette a pezzi dal file.
+    Ritorna (N, medie, cov) con cov di forma (max_lag, len(series)).
+    """
+    acc = StreamingAutocovariance(max_lag, len(series))
+    for m, e in iter_chunks(file_path, ("m", "e"), chunk_rows):
+        acc.add(np.column_stack([SERIES[name](m, e) for name in series]))
+    return acc.result()
+
+
+def streaming_acf(file_path, max_lag, series=("m",), chunk_rows=CHUNK_ROWS):
+    """ Autocorrelazioni normalizzate C(τ) = cov(τ) / cov(0), una colonna per serie. """
+    _, _, cov = streaming_autocovariance(file_path, max_lag, series, chunk_rows)
+    return cov / cov[0]
+
+
+def integrated_time(rho, N, c=5.0):
+    """
+    Tempo di autocorrelazione integrato con finestra automatica (Madras–Sokal):
+        τ_int(W) = 1/2 + sum_{t=1}^{W} ρ(t)
+    con W il più piccolo intero tale che W >= c τ_int(W). L'errore è quello di Madras–Sokal,
+        σ(τ_int) ≈ τ_int sqrt(2 (2W + 1) / N).
+    Ritorna (τ_int, errore, W, convergenza); se la finestra non si trova entro i lag disponibili,
+    si usa l'ultimo lag e convergenza è False.
+    """
+    rho = np.asarray(rho, dtype=float)
+    if len(rho) < 2:
+        raise ValueError("Servono almeno due lag per stimare τ_int.")
+
+    taus = 0.5 + np.cumsum(rho[1:])
+    windows = np.arange(1, len(rho))
+    ok = windows >= c * taus
+
+    converged = bool(ok.any())
+    i = int(np.argmax(ok)) if converged else len(taus) - 1
+    tau, W = taus[i], int(windows[i])
+    err = tau * np.sqrt(2 * (2 * W + 1) / N)
+
+    return float(tau), float(err), W, converged
+
+
+def initial_max_lag(N, max_lag=TAU_MAX_LAG):
+    """ Finestra di lag della prima passata per τ_int: max_lag, ma non oltre N / 4. """
+    return max(2, min(max_lag, N // 4))
+
+
+def integrated_times(cov, N, series, c=5.0):
+    """ {serie: (τ_int, errore, W, convergenza)} dalle autocovarianze (max_lag, len(series)). """
+    rho = cov / cov[0]
+    return {name: integrated_time(rho[:, i], N, c) for i, name in enumerate(series)}
+
+
+@profiled("tau_int")
+def integrated_times_file(file_path, series=tuple(SERIES), max_lag=TAU_MAX_LAG, c=5.0, chunk_rows=CHUNK_ROWS):
+    """
+    τ_int di tutte le serie richieste dalla stessa passata FFT sul file; se per qualche serie la finestra
+    non rientra in max_lag si raddoppia max_lag (fino a N / 4) e si ripete la passata.
+    Ritorna {serie: (τ_int, errore, W, convergenza)} e N.
+    """
+    max_lag = initial_max_lag(count_rows(file_path), max_lag)
+    while True:
+        N, _, cov = streaming_autocovariance(file_path, max_lag, series, chunk_rows)
+        results = integrated_times(cov, N, series, c)
+
+        if all(r[3] for r in results.values()) or 2 * max_lag > N // 4:
+            return results, N
+        max_lag *= 2
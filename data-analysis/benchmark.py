@@ -0,0 +1,315 @@
+""" Benchmark dei kernel di analisi su serie sintetiche AR(1) con tempo di autocorrelazione noto.
+
+    Le serie sono x_t = φ x_{t-1} + sqrt(1 - φ²) ε_t (varianza 1, stazionarie dal primo elemento), con
+        ρ(t) = φ^t,     τ_int = (1 + φ) / (2 (1 - φ)),     τ_exp = -1 / log φ
+    e per la media di M elementi consecutivi
+        Var_M = [(1 + φ) / (1 - φ) - 2 φ (1 - φ^M) / (M (1 - φ)²)] / M
+    quindi il valore atteso di ogni stimatore è noto analiticamente: oltre a tempo, picco di memoria
+    (tracemalloc) e throughput, per ogni kernel si controlla che la stima sia compatibile con il valore
+    analitico, così un'ottimizzazione che rompe la statistica fa fallire il benchmark.
+
+    Si misurano blocking_with_k_blocks, jackknife_secondary_estimate, accumulate_block_sums (main.py),
+    autocorrelation_function (tau_exp_estimate.py), streaming_acf (autocorrelation.py) e la lettura dei file
+    binari e di testo, al variare di N e di k. Ogni misura è una riga JSON aggiunta a benchmark_results.jsonl,
+    con l'identificativo della sessione e il commit, così sessioni diverse si possono confrontare (--compare).
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+from blocking import blocking_with_k_blocks
+from jackknife import jackknife_secondary_estimate
+from moments import accumulate_block_sums, primary_from_table
+from tau_exp_estimate import autocorrelation_function
+from autocorrelation import streaming_acf, integrated_time
+from binary_series import write_series, load_columns
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(BASE_DIR, "benchmark_results.jsonl")
+
+DEFAULT_SIZES = [10**4, 10**5, 10**6, 10**7]
+DEFAULT_KS = [4, 8, 16, 32, 64, 128, 256]
+DEFAULT_TAU_INT = 10.0
+
+# soglia dei controlli di accuratezza, in deviazioni standard attese dello stimatore
+N_SIGMA = 5.0
+
+
+def ar1_phi(tau_int):
+    return (2 * tau_int - 1) / (2 * tau_int + 1)
+
+
+def ar1_tau_int(phi):
+    return 0.5 * (1 + phi) / (1 - phi)
+
+
+def ar1_mean_variance(phi, M, variance=1.0):
+    """ Varianza della media di M elementi consecutivi di un AR(1) con varianza variance. """
+    return variance * ((1 + phi) / (1 - phi) - 2 * phi * (1 - phi**M) / (M * (1 - phi)**2)) / M
+
+
+def expected_blocking_error(phi, N, k, variance=1.0):
+    """
+    Valore atteso (nel senso di sqrt(E[errore²])) dell'errore di blocking con k blocchi:
+    E[sum (b_i - b)²] = k (Var_M - Var_{kM}), con b_i le medie dei blocchi di M = N // k elementi.
+    """
+    M = N // k
+    return np.sqrt((ar1_mean_variance(phi, M, variance) - ar1_mean_variance(phi, k * M, variance)) / (k - 1))
+
+
+def ar1_series(N, phi, rng):
+    """ Serie AR(1) stazionaria di varianza 1. """
+    from scipy.signal import lfilter
+
+    noise = rng.standard_normal(N)
+    noise[0] /= np.sqrt(1 - phi**2) # il primo elemento ha già la varianza stazionaria
+    return lfilter([np.sqrt(1 - phi**2)], [1.0, -phi], noise)
+
+
+def make_series(N, tau_int, seed):
+    """ m: AR(1) con τ_int dato; e: AR(1) indipendente con lo stesso τ, spostata e riscalata come un'energia. """
+    rng = np.random.default_rng(seed)
+    phi = ar1_phi(tau_int)
+    m = ar1_series(N, phi, rng)
+    e = -1.4 + 0.05 * ar1_series(N, phi, rng)
+    return phi, m, e
+
+
+def _error_check(estimate, expected, k):
+    # l'errore stimato con k blocchi ha una dispersione relativa di circa 1 / sqrt(2 (k - 1))
+    tol = N_SIGMA / np.sqrt(2 * (k - 1))
+    return {"error": float(estimate), "expected_error": float(expected),
+            "ok": bool(abs(estimate / expected - 1) <= tol)}
+
+
+def _tau_check(rho, N, phi):
+    tau, err, W, converged = integrated_time(rho, N)
+    expected = ar1_tau_int(phi)
+    # il troncamento alla finestra W sottostima τ_int di sum_{t>W} φ^t
+    bias = phi**(W + 1) / (1 - phi)
+    return {"tau_int": tau, "tau_int_error": err, "expected_tau_int": expected, "W": W,
+            "ok": bool(converged and abs(tau - expected) <= N_SIGMA * err + bias)}
+
+
+# Kernel: ognuno prepara una chiamata (funzione senza argomenti) e il controllo sul suo risultato.
+
+def kernel_blocking(ctx, k):
+    def check(result):
+        mean, error = result
+        expected = expected_blocking_error(ctx["phi"], ctx["N"], k)
+        acc = _error_check(error, expected, k)
+        acc["mean"] = float(mean)
+        acc["ok"] = acc["ok"] and abs(mean) <= N_SIGMA * np.sqrt(ar1_mean_variance(ctx["phi"], ctx["N"]))
+        return acc
+    return lambda: blocking_with_k_blocks(ctx["m"], k), check
+
+
+def kernel_jackknife(ctx, k):
+    # varianza ⟨x²⟩ - ⟨x⟩² = 1; x² di un AR(1) gaussiano ha ρ(t) = φ^{2t} e varianza 2
+    def check(result):
+        value, error = result
+        phi2 = ctx["phi"]**2
+        expected = expected_blocking_error(phi2, ctx["N"], k, variance=2.0)
+        acc = _error_check(error, expected, k)
+        acc["value"] = float(value)
+        acc["ok"] = acc["ok"] and abs(value - 1) <= N_SIGMA * np.sqrt(ar1_mean_variance(phi2, ctx["N"], 2.0))
+        return acc
+    primary = [lambda x: x, lambda x: x**2]
+    return lambda: jackknife_secondary_estimate(ctx["m"], primary, lambda m, m2: m2 - m**2, k), check
+
+
+def kernel_block_sums(ctx, ks):
+    # una passata per tutti i k: deve dare le stesse medie ed errori di blocking_with_k_blocks
+    def check(tables):
+        ok = True
+        for k in ks:
+            table, M = tables[k]
+            mean, error = primary_from_table(table, M, "m")
+            ref_mean, ref_error = blocking_with_k_blocks(ctx["m"], k)
+            ok = ok and np.isclose(mean, ref_mean, rtol=1e-9, atol=1e-12) and np.isclose(error, ref_error, rtol=1e-9)
+        return {"ks": list(ks), "ok": bool(ok)}
+    return lambda: accumulate_block_sums(ctx["m"], ctx["e"], ks), check
+
+
+def _max_lag(ctx):
+    return min(ctx["N"] // 4, int(50 * ar1_tau_int(ctx["phi"])) + 1)
+
+
+def kernel_acf(ctx, k):
+    max_lag = _max_lag(ctx)
+    return lambda: autocorrelation_function(ctx["m"], max_lag), lambda rho: _tau_check(rho, ctx["N"], ctx["phi"])
+
+
+def kernel_streaming_acf(ctx, k):
+    max_lag = _max_lag(ctx)
+    return (lambda: streaming_acf(ctx["binary_path"], max_lag)[:, 0],
+            lambda rho: _tau_check(rho, ctx["N"], ctx["phi"]))
+
+
+def _load_check(ctx, atol):
+    def check(result):
+        m, e = result
+        return {"ok": bool(np.allclose(m, ctx["m"], rtol=0, atol=atol) and np.allclose(e, ctx["e"], rtol=0, atol=atol))}
+    return check
+
+
+def kernel_load_binary(ctx, k):
+    # np.array forza la lettura delle memmap
+    return (lambda: tuple(np.array(c) for c in load_columns(ctx["binary_path"], ("m", "e"))),
+            _load_check(ctx, 0.0))
+
+
+def kernel_load_text(ctx, k):
+    return lambda: load_columns(ctx["text_path"], ("m", "e")), _load_check(ctx, 1e-9)
+
+
+# nome: (funzione, dipende da k, N massimo di default)
+KERNELS = {
+    "blocking": (kernel_blocking, True, None),
+    "jackknife": (kernel_jackknife, True, None),
+    "block_sums": (kernel_block_sums, False, None),
+    "acf_fft": (kernel_acf, False, 10**7), # FFT in memoria su 2N punti
+    "streaming_acf": (kernel_streaming_acf, False, None),
+    "load_binary": (kernel_load_binary, False, None),
+    "load_text": (kernel_load_text, False, 10**6),
+}
+
+
+def measure(call, repeats=3, memory=True):
+    """ Tempo minimo su repeats chiamate e picco di memoria allocata (tracemalloc) in una chiamata a parte. """
+    times = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = call()
+        times.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return min(times), peak, result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _write_files(ctx, tmp_dir, text):
+    N = ctx["N"]
+    ctx["binary_path"] = os.path.join(tmp_dir, f"bench_N{N}.bin")
+    write_series(ctx["binary_path"], {"step": np.arange(N, dtype=np.int64), "m": ctx["m"], "e": ctx["e"]},
+                 L=None, beta=None, version=1)
+    if text:
+        # nome diverso dal binario: resolve_series_path preferirebbe il .bin con lo stesso nome
+        ctx["text_path"] = os.path.join(tmp_dir, f"bench_text_N{N}.txt")
+        np.savetxt(ctx["text_path"], np.column_stack((np.arange(N), ctx["m"], ctx["e"])),
+                   fmt=("%d", "%.17g", "%.17g"))
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, ks=DEFAULT_KS, kernels=tuple(KERNELS), tau_int=DEFAULT_TAU_INT,
+                   repeats=3, memory=True, no_limits=False, seed=12345):
+    """ Esegue i kernel richiesti su tutta la griglia (N, k); ritorna la lista dei record. """
+    session = {"run": time.strftime("%Y%m%dT%H%M%S"), "commit": _git_commit(), "python": platform.python_version(),
+               "numpy": np.__version__, "host": platform.node(), "tau_int": tau_int}
+    records = []
+
+    for N in sizes:
+        phi, m, e = make_series(N, tau_int, seed)
+        ctx = {"N": N, "phi": phi, "m": m, "e": e}
+        active = [name for name in kernels if no_limits or KERNELS[name][2] is None or N <= KERNELS[name][2]]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if {"streaming_acf", "load_binary", "load_text"} & set(active):
+                _write_files(ctx, tmp_dir, text="load_text" in active)
+
+            for name in active:
+                kernel, uses_k, _ = KERNELS[name]
+                if uses_k:
+                    points = [k for k in ks if k <= N]
+                elif name == "block_sums":
+                    points = [tuple(k for k in ks if k <= N)]
+                else:
+                    points = [None]
+
+                for k in points:
+                    call, check = kernel(ctx, k)
+                    seconds, peak, result = measure(call, repeats, memory)
+                    accuracy = check(result)
+                    record = dict(session, kernel=name, N=N, k=k if uses_k else None, seconds=seconds,
+                                  peak_mb=None if peak is None else peak / 1024**2,
+                                  throughput=N / seconds if seconds > 0 else None,
+                                  ok=bool(accuracy.pop("ok")), accuracy=accuracy)
+                    records.append(record)
+                    print(f"{name:<14} N={N:<10} k={str(record['k']):<5} {1000 * seconds:10.2f} ms  "
+                          f"{record['peak_mb'] if record['peak_mb'] is not None else float('nan'):9.1f} MB  "
+                          f"{record['throughput'] / 1e6:9.2f} M/s  {'ok' if record['ok'] else 'FALLITO'}")
+    return records
+
+
+def load_results(path=RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(records, baseline):
+    """ Rapporto dei tempi rispetto a una sessione precedente, per ogni (kernel, N, k) presente in entrambe. """
+    reference = {(r["kernel"], r["N"], r["k"]): r["seconds"] for r in baseline}
+    print(f"\n{'kernel':<14} {'N':>10} {'k':>5} {'rapporto':>9}   (confronto con {baseline[0]['run']}, "
+          f"commit {baseline[0]['commit']})")
+    for r in records:
+        key = (r["kernel"], r["N"], r["k"])
+        if key in reference and reference[key] > 0:
+            print(f"{r['kernel']:<14} {r['N']:>10} {str(r['k']):>5} {r['seconds'] / reference[key]:9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dei kernel di analisi su serie AR(1) con τ noto.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES,
+                        help="lunghezze N delle serie (es. 1e4 1e5 ... 1e8)")
+    parser.add_argument("--ks", type=int, nargs="+", default=DEFAULT_KS, help="numeri di blocchi k")
+    parser.add_argument("--kernels", nargs="+", choices=list(KERNELS), default=list(KERNELS))
+    parser.add_argument("--tau-int", type=float, default=DEFAULT_TAU_INT, help="τ_int delle serie sintetiche")
+    parser.add_argument("--repeats", type=int, default=3, help="ripetizioni per la misura del tempo (si tiene il minimo)")
+    parser.add_argument("--no-memory", action="store_true", help="non misura il picco di memoria (più veloce)")
+    parser.add_argument("--no-limits", action="store_true",
+                        help="esegue anche acf_fft oltre N = 1e7 e load_text oltre N = 1e6")
+    parser.add_argument("--seed", type=int, default=12345)
+    parser.add_argument("--output", default=RESULTS_FILE, help="file JSONL a cui aggiungere i risultati")
+    parser.add_argument("--compare", nargs="?", const="last", default=None, metavar="RUN",
+                        help="confronta con una sessione del file (default: l'ultima)")
+    args = parser.parse_args()
+
+    previous = load_results(args.output)
+    records = run_benchmarks([int(N) for N in args.sizes], args.ks, args.kernels, args.tau_int, args.repeats,
+                             not args.no_memory, args.no_limits, args.seed)
+
+    with open(args.output, "a") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    if args.compare and previous:
+        run = previous[-1]["run"] if args.compare == "last" else args.compare
+        baseline = [r for r in previous if r["run"] == run]
+        if baseline:
+            compare(records, baseline)
+        else:
+            print(f"Sessione {run} non trovata in {args.output}")
+
+    failed = [r for r in records if not r["ok"]]
+    print(f"\n{len(records)} misure, {len(failed)} controlli di accuratezza falliti -> {args.output}")
+    sys.exit(1 if failed else 0)
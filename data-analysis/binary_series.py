@@ -0,0 +1,440 @@
+""" Formato binario per le serie temporali (step, m, e) prodotte da data-generation.
+
+    Struttura del file (tutto little-endian):
+    - 8 byte di magic: b"ISINGBIN"
+    - uint32: lunghezza in byte dell'header JSON (padding con spazi incluso)
+    - header JSON: L, beta, n_rows, sweeps e la lista delle colonne, ognuna con
+      nome, dtype numpy e offset (in byte dall'inizio del file)
+    - dati colonna per colonna: ogni colonna è contigua e allineata a ALIGNMENT byte,
+      quindi leggere una sola colonna costa (circa) il page-in di quella colonna.
+
+    Serie intere (data-generation con --integers, convert_text_file con integers=True): le colonne m ed e
+    contengono i totali interi M ed E (int16 o int32, integer_dtypes) con "divisor": V nella colonna, e si
+    ricostruiscono esatti come M / V ed E / V; la colonna step manca e vale step_start + k * stride.
+    load_columns le ritorna come DecodedColumn: la divisione si fa solo sulle righe lette, pezzo per pezzo.
+
+    Convenzione dei pesi: "boltzmann_sign": -1 nell'header (nei file di testo la riga "# boltzmann_sign = -1")
+    indica una serie campionata con exp(-beta E). Le serie di data-generation scritte prima della correzione
+    del segno di energy_difference non lo hanno e seguono exp(+beta E); reweighting e WHAM le rifiutano.
+
+    Le letture passano da np.memmap, nessuna conversione testuale.
+"""
+import os
+import re
+import json
+import struct
+import argparse
+from itertools import islice
+import numpy as np
+
+MAGIC = b"ISINGBIN"
+FORMAT_VERSION = 1
+ALIGNMENT = 4096
+PREAMBLE = len(MAGIC) + 4
+
+# colonne dei file di testo "# step\tm\tenergy"
+TEXT_COLUMNS = {"step": 0, "m": 1, "e": 2}
+TEXT_DTYPES = {"step": "<i8", "m": "<f8", "e": "<f8"}
+
+name_pattern = re.compile(r"L(\d+)_beta([0-9.]+)_v(\d+)\.(?:txt|bin)$")
+
+# serie campionate con exp(BOLTZMANN_SIGN * beta * E)
+BOLTZMANN_SIGN = -1
+boltzmann_pattern = re.compile(r"#\s*boltzmann_sign\s*=\s*([-+]?1)\b")
+
+
+def _align(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+def _layout(n_rows, dtypes, header_fields):
+    """
+    Calcola gli offset delle colonne e serializza l'header; la lunghezza dell'header
+    dipende dagli offset, quindi si itera finché la zona dati non è stabile.
+    """
+    data_start = ALIGNMENT
+    while True:
+        columns, offset = [], data_start
+        for name, dtype, *extra in dtypes:
+            dtype = np.dtype(dtype).str
+            columns.append(dict({"name": name, "dtype": dtype, "offset": offset}, **(extra[0] if extra else {})))
+            offset = _align(offset + n_rows * np.dtype(dtype).itemsize)
+
+        header = dict(header_fields, format_version=FORMAT_VERSION, n_rows=int(n_rows), columns=columns)
+        text = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        needed = _align(PREAMBLE + len(text))
+        if needed <= data_start:
+            text = text.ljust(data_start - PREAMBLE, b" ")
+            return header, text, offset
+        data_start = needed
+
+
+def is_binary(file_path):
+    with open(file_path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_header(file_path):
+    with open(file_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{file_path} non è un file ISINGBIN")
+        (length,) = struct.unpack("<I", f.read(4))
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+def create_series(file_path, n_rows, dtypes, **header_fields):
+    """
+    Crea un file binario vuoto con n_rows righe e ritorna (header, colonne scrivibili).
+    dtypes: lista di coppie (nome, dtype) nell'ordine delle colonne, o di terne (nome, dtype, campi)
+    con campi aggiuntivi della colonna nell'header (es. {"divisor": V}).
+    """
+    header, text, total_size = _layout(n_rows, dtypes, header_fields)
+
+    with open(file_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(text)))
+        f.write(text)
+        f.truncate(total_size)
+
+    columns = {}
+    for col in header["columns"]:
+        if n_rows > 0:
+            columns[col["name"]] = np.memmap(file_path, dtype=col["dtype"], mode="r+",
+                                             offset=col["offset"], shape=(n_rows,))
+        else:
+            columns[col["name"]] = np.empty(0, dtype=col["dtype"])
+    return header, columns
+
+
+def write_series(file_path, columns, **header_fields):
+    """
+    Scrive in un colpo solo le colonne passate (dizionario ordinato nome -> array).
+    """
+    columns = {name: np.asarray(values) for name, values in columns.items()}
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) != 1:
+        raise ValueError("Tutte le colonne devono avere la stessa lunghezza.")
+    n_rows = lengths.pop()
+
+    _, out = create_series(file_path, n_rows, [(name, v.dtype) for name, v in columns.items()], **header_fields)
+    for name, values in columns.items():
+        out[name][:] = values
+        if isinstance(out[name], np.memmap):
+            out[name].flush()
+
+
+def open_series(file_path):
+    """
+    Ritorna (header, colonne) con le colonne come np.memmap in sola lettura, così come sono nel file
+    (per le serie intere: M ed E, senza step; column_values le decodifica).
+    """
+    header = read_header(file_path)
+    n_rows = header["n_rows"]
+    columns = {}
+    for col in header["columns"]:
+        if n_rows > 0:
+            columns[col["name"]] = np.memmap(file_path, dtype=col["dtype"], mode="r",
+                                             offset=col["offset"], shape=(n_rows,))
+        else:
+            columns[col["name"]] = np.empty(0, dtype=col["dtype"])
+    return header, columns
+
+
+def integer_dtypes(L):
+    """ dtype più piccoli per i totali M (|M| <= V) ed E (|E| <= 2V) su un reticolo L x L. """
+    V = L * L
+    return ("<i2" if V <= np.iinfo(np.int16).max else "<i4"), ("<i2" if 2 * V <= np.iinfo(np.int16).max else "<i4")
+
+
+def column_values(header, columns, name, start=0, stop=None):
+    """
+    Righe [start, stop) della colonna name di una serie binaria aperta con open_series:
+    - colonne float: la memmap stessa (nessuna copia);
+    - colonne intere con "divisor": valori / divisor in float64, lo stesso double di M / V calcolato in C;
+    - step assente: step_start + k * stride.
+    """
+    stop = header["n_rows"] if stop is None else min(stop, header["n_rows"])
+    if name not in columns and name == "step" and "step_start" in header:
+        return header["step_start"] + header.get("stride", 1) * np.arange(start, stop, dtype=np.int64)
+
+    values = columns[name][start:stop]
+    divisor = _column_divisor(header, name)
+    if divisor is not None:
+        return np.divide(values, divisor, dtype=np.float64)
+    return values
+
+
+class DecodedColumn:
+    """
+    Colonna intera con divisor vista come float64 senza copiarla: indicizzare o affettare decodifica
+    (valori / divisor) solo le righe richieste; np.asarray decodifica tutta la colonna.
+    """
+
+    def __init__(self, raw, divisor):
+        self.raw = raw
+        self.divisor = divisor
+        self.dtype = np.dtype(np.float64)
+        self.shape = raw.shape
+        self.ndim = raw.ndim
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __getitem__(self, key):
+        return np.divide(self.raw[key], self.divisor, dtype=np.float64)
+
+    def __array__(self, dtype=None, copy=None):
+        values = self[:]
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+
+def _column_divisor(header, name):
+    return next((col.get("divisor") for col in header["columns"] if col["name"] == name), None)
+
+
+def binary_path(file_path):
+    return os.path.splitext(file_path)[0] + ".bin"
+
+
+def resolve_series_path(file_path):
+    """
+    Per un file _vN.txt, se esiste il corrispondente _vN.bin (già convertito) si usa quello.
+    """
+    if file_path.endswith(".txt"):
+        candidate = binary_path(file_path)
+        if os.path.exists(candidate):
+            return candidate
+    return file_path
+
+
+def load_columns(file_path, names=("m", "e")):
+    """
+    Carica le colonne richieste da un file di serie temporali, binario o di testo.
+    Per i file binari le colonne sono memmap (o DecodedColumn per le colonne intere con divisor):
+    nessuna copia finché non si leggono i dati.
+    """
+    file_path = resolve_series_path(file_path)
+
+    if is_binary(file_path):
+        header, columns = open_series(file_path)
+        loaded = []
+        for name in names:
+            divisor = _column_divisor(header, name) if name in columns else None
+            loaded.append(DecodedColumn(columns[name], divisor) if divisor is not None
+                          else column_values(header, columns, name))
+        return tuple(loaded)
+
+    data = np.loadtxt(file_path, usecols=[TEXT_COLUMNS[name] for name in names], ndmin=2)
+    return tuple(data[:, i] for i in range(len(names)))
+
+
+def _text_boltzmann_sign(txt_path):
+    # dalle righe di commento iniziali del file di testo
+    with open(txt_path) as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            match = boltzmann_pattern.match(line)
+            if match:
+                return int(match.group(1))
+    return None
+
+
+def boltzmann_sign(file_path):
+    """
+    Segno dei pesi exp(sign * beta * E) con cui è stata campionata la serie, dall'header o dai commenti
+    del file di testo; None se il file non lo dichiara. Le serie di checkerboard.py hanno sempre usato -1.
+    """
+    file_path = resolve_series_path(file_path)
+    if not is_binary(file_path):
+        return _text_boltzmann_sign(file_path)
+    header = read_header(file_path)
+    if "boltzmann_sign" in header:
+        return header["boltzmann_sign"]
+    return BOLTZMANN_SIGN if header.get("source") == "checkerboard" else None
+
+
+def _count_rows(file_path):
+    n = 0
+    with open(file_path) as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                n += 1
+    return n
+
+
+def count_rows(file_path):
+    """ Numero di misure nel file: dall'header per i binari, contando le righe per i file di testo. """
+    file_path = resolve_series_path(file_path)
+    if is_binary(file_path):
+        return read_header(file_path)["n_rows"]
+    return _count_rows(file_path)
+
+
+def iter_chunks(file_path, names=("m", "e"), chunk_rows=1_000_000):
+    """
+    Legge il file a pezzi di chunk_rows righe, ritornando per ogni pezzo la tupla delle colonne richieste.
+    La memoria usata dipende solo da chunk_rows, sia per i file binari che per quelli di testo.
+    """
+    file_path = resolve_series_path(file_path)
+
+    if is_binary(file_path):
+        header, columns = open_series(file_path)
+        for start in range(0, header["n_rows"], chunk_rows):
+            chunk = []
+            for name in names:
+                values = column_values(header, columns, name, start, start + chunk_rows)
+                # np.array forza la lettura delle memmap; le colonne decodificate sono già array nuovi
+                chunk.append(values if _column_divisor(header, name) is not None else np.array(values))
+            yield tuple(chunk)
+        return
+
+    usecols = [TEXT_COLUMNS[name] for name in names]
+    with open(file_path) as f:
+        righe = (line for line in f if line.strip() and not line.startswith("#"))
+        while True:
+            chunk = list(islice(righe, chunk_rows))
+            if not chunk:
+                break
+            data = np.loadtxt(chunk, usecols=usecols, ndmin=2)
+            yield tuple(data[:, i] for i in range(len(names)))
+
+
+def _text_chunks(txt_path, chunk_rows):
+    with open(txt_path) as f:
+        righe = (line for line in f if line.strip() and not line.startswith("#"))
+        while True:
+            chunk = list(islice(righe, chunk_rows))
+            if not chunk:
+                break
+            yield np.loadtxt(chunk, ndmin=2)
+
+
+def _to_integers(values, V, name, txt_path):
+    # m ed e nei file di testo sono M / V ed E / V arrotondati a 6 decimali: per V < 5 * 10^5 l'errore su M, E
+    # è sotto 0.25 e l'arrotondamento all'intero ritrova il totale esatto
+    scaled = values * V
+    totals = np.rint(scaled)
+    if len(totals) and np.max(np.abs(scaled - totals)) > 0.25:
+        raise ValueError(f"{txt_path}: {name} * V non è intero, il file non viene da un reticolo {int(np.sqrt(V))}^2")
+    return totals
+
+
+def convert_text_file(txt_path, out_path=None, chunk_rows=1_000_000, remove_text=False, integers=False):
+    """
+    Converte un file di testo step/m/energy nel formato binario, a blocchi di chunk_rows righe
+    (la memoria usata non dipende dalla lunghezza della serie).
+    Con integers=True si scrivono i totali interi M ed E (serve L dal nome del file) e step implicito,
+    da 3 a 6 volte meno spazio, e i valori riletti sono M / V ed E / V esatti invece dei 6 decimali del testo.
+    """
+    if out_path is None:
+        out_path = binary_path(txt_path)
+
+    header_fields = {}
+    match = name_pattern.search(os.path.basename(txt_path))
+    if match:
+        header_fields = {"L": int(match.group(1)), "beta": float(match.group(2)), "version": int(match.group(3))}
+    sign = _text_boltzmann_sign(txt_path)
+    if sign is not None:
+        header_fields["boltzmann_sign"] = sign
+
+    n_rows = _count_rows(txt_path)
+    if integers:
+        if "L" not in header_fields:
+            raise ValueError(f"{txt_path}: L non ricavabile dal nome del file, serve per la conversione in interi")
+        V = header_fields["L"] ** 2
+        m_dtype, e_dtype = integer_dtypes(header_fields["L"])
+        dtypes = [("m", m_dtype, {"divisor": V}), ("e", e_dtype, {"divisor": V})]
+        first = next(_text_chunks(txt_path, 2), np.zeros((0, 3)))
+        step_start = int(first[0, 0]) if len(first) else 0
+        stride = int(first[1, 0] - first[0, 0]) if len(first) > 1 else 1
+        header_fields.update(step_start=step_start, stride=stride)
+    else:
+        dtypes = [(name, TEXT_DTYPES[name]) for name in TEXT_COLUMNS]
+    tmp_path = out_path + ".tmp"
+    _, columns = create_series(tmp_path, n_rows, dtypes, sweeps=None, source=os.path.basename(txt_path), **header_fields)
+
+    start = 0
+    for data in _text_chunks(txt_path, chunk_rows):
+        stop = start + len(data)
+        if integers:
+            if not np.array_equal(data[:, 0], step_start + stride * np.arange(start, stop)):
+                os.remove(tmp_path)
+                raise ValueError(f"{txt_path}: step non equispaziati, convertire senza integers")
+            columns["m"][start:stop] = _to_integers(data[:, TEXT_COLUMNS["m"]], V, "m", txt_path)
+            columns["e"][start:stop] = _to_integers(data[:, TEXT_COLUMNS["e"]], V, "e", txt_path)
+        else:
+            for name, idx in TEXT_COLUMNS.items():
+                columns[name][start:stop] = data[:, idx]
+        start = stop
+
+    # il numero di sweep misurati si ricava dall'ultimo step registrato
+    if integers:
+        sweeps = step_start + stride * (n_rows - 1) + 1 if n_rows else 0
+    else:
+        sweeps = int(columns["step"][-1]) + 1 if n_rows else 0
+    for col in columns.values():
+        if isinstance(col, np.memmap):
+            col.flush()
+    del columns
+    _rewrite_header_field(tmp_path, sweeps=sweeps)
+
+    os.replace(tmp_path, out_path)
+    if remove_text:
+        os.remove(txt_path)
+    return out_path
+
+
+def _rewrite_header_field(file_path, **fields):
+    """
+    Aggiorna campi dell'header senza spostare i dati: il nuovo JSON deve stare nello spazio esistente.
+    """
+    header = read_header(file_path)
+    header.update(fields)
+    with open(file_path, "r+b") as f:
+        f.seek(len(MAGIC))
+        (length,) = struct.unpack("<I", f.read(4))
+        text = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(text) > length:
+            raise ValueError("Header troppo lungo per essere riscritto sul posto.")
+        f.write(text.ljust(length, b" "))
+
+
+def convert_tree(root_dir, remove_text=False, chunk_rows=1_000_000, integers=False):
+    """
+    Converte tutti i file L*_beta*/..._vN.txt sotto root_dir che non hanno già un .bin aggiornato.
+    """
+    converted = []
+    for folder in sorted(os.listdir(root_dir)):
+        full_folder = os.path.join(root_dir, folder)
+        if not os.path.isdir(full_folder):
+            continue
+        for file_name in sorted(os.listdir(full_folder)):
+            if not (file_name.endswith(".txt") and name_pattern.search(file_name)):
+                continue
+            txt_path = os.path.join(full_folder, file_name)
+            bin_path = binary_path(txt_path)
+            if os.path.exists(bin_path) and os.path.getmtime(bin_path) >= os.path.getmtime(txt_path):
+                if remove_text:
+                    os.remove(txt_path)
+                continue
+            print(f"Converto {txt_path}")
+            converted.append(convert_text_file(txt_path, bin_path, chunk_rows, remove_text, integers))
+    return converted
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    default_roots = [os.path.join(base_dir, "../data-generation/results"),
+                     os.path.join(base_dir, "../data-generation/results-tau-exp")]
+
+    parser = argparse.ArgumentParser(description="Converte le serie temporali di testo nel formato binario ISINGBIN.")
+    parser.add_argument("roots", nargs="*", default=default_roots, help="cartelle results da convertire")
+    parser.add_argument("--remove-text", action="store_true", help="cancella i .txt dopo la conversione")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--integers", action="store_true", help="salva M ed E interi (esatti) e step implicito")
+    args = parser.parse_args()
+
+    for root in args.roots:
+        if os.path.isdir(root):
+            convert_tree(os.path.abspath(root), args.remove_text, args.chunk_rows, args.integers)
@@ -0,0 +1,116 @@
+""" Analisi di binning: curva dell'errore stimato in funzione del numero di blocchi k per tutte le osservabili,
+    da una sola passata sulla serie (le tabelle delle somme per blocco di tutti i k si costruiscono insieme,
+    vedi moments.accumulate_block_sums), e stima automatica del k di saturazione.
+
+    Oltre alla scansione su tutti i k interi si può usare la scansione diadica alla Flyvbjerg–Petersen,
+    con blocchi di 2^j elementi (k = N // 2^j): la tabella del blocco più piccolo si costruisce con una
+    passata e le altre si ottengono sommando i blocchi a coppie. Il blocco di partenza è il più piccolo
+    con al più DYADIC_MAX_BLOCKS blocchi, quindi la memoria non cresce con N.
+"""
+import numpy as np
+from moments import accumulate_block_sums, primary_from_table, secondary_from_table
+from main import primary_observables, secondary_observables
+
+# osservabili della scansione di k_estimate.py (nome -> momento o (momenti, funzione secondaria))
+SCAN_OBSERVABLES = {
+    "⟨m⟩": primary_observables["⟨m⟩"],
+    "⟨e⟩": primary_observables["⟨e⟩"],
+    "⟨|m|⟩": primary_observables["⟨|m|⟩"],
+    "⟨m²⟩": primary_observables["⟨m²⟩"],
+    "χ′": secondary_observables["χ′"],
+    "U": secondary_observables["U"],
+    "C": secondary_observables["C"],
+}
+
+# blocchi al più nella tabella di partenza della scansione diadica
+DYADIC_MAX_BLOCKS = 1 << 16
+
+
+def _dyadic_start(N, max_blocks):
+    # blocco di partenza: la più piccola potenza di 2 con al più max_blocks blocchi
+    size = 1
+    while N // size > max_blocks:
+        size *= 2
+    return size
+
+
+def dyadic_ks(N, k_min=4, max_blocks=DYADIC_MAX_BLOCKS):
+    """ Numeri di blocchi per blocchi di 2^j elementi (dal blocco di partenza), finché restano almeno k_min blocchi. """
+    ks = []
+    size = _dyadic_start(N, max_blocks)
+    while N // size >= max(k_min, 2):
+        ks.append(N // size)
+        size *= 2
+    return ks
+
+
+def _scan_errors(tables, ks, observables):
+    errors = {name: np.empty(len(ks)) for name in observables}
+    for i, k in enumerate(ks):
+        table, M = tables[k]
+        for name, spec in observables.items():
+            if isinstance(spec, str):
+                _, errors[name][i] = primary_from_table(table, M, spec)
+            else:
+                _, errors[name][i] = secondary_from_table(table, M, *spec)
+    return errors
+
+
+def error_scan(m, e, ks, observables=SCAN_OBSERVABLES):
+    """
+    Ritorna (ks validi, {nome: array degli errori per ogni k}) con una sola lettura di m ed e.
+    """
+    N = len(m)
+    ks = sorted({k for k in ks if 2 <= k <= N})
+    tables = accumulate_block_sums(m, e, ks)
+    return np.array(ks), _scan_errors(tables, ks, observables)
+
+
+def dyadic_error_scan(m, e, k_min=4, max_blocks=DYADIC_MAX_BLOCKS, observables=SCAN_OBSERVABLES):
+    """
+    Come error_scan sui k di dyadic_ks, con blocchi di esattamente 2^j elementi (si usano i primi k 2^j):
+    una passata per la tabella del blocco di partenza, poi decimazione a coppie in O(k).
+    """
+    N = len(m)
+    ks = dyadic_ks(N, k_min, max_blocks)
+    if not ks:
+        return np.array(ks, dtype=int), {name: np.empty(0) for name in observables}
+
+    size = _dyadic_start(N, max_blocks)
+    table, M = accumulate_block_sums(m, e, [ks[0]], n_rows=ks[0] * size)[ks[0]]
+    tables = {}
+    for k in ks:
+        tables[k] = (table, M)
+        table = table[:2 * (k // 2)].reshape(-1, 2, table.shape[1]).sum(axis=1)
+        M *= 2
+    return np.array(ks), _scan_errors(tables, ks, observables)
+
+
+def find_saturation(ks, errors, tol=0.01):
+    """
+    Primo k in cui l'errore si stabilizza: variazione relativa rispetto al k precedente sotto tol.
+    """
+    for i in range(1, len(errors)):
+        delta = abs(errors[i] - errors[i - 1])
+        if errors[i - 1] != 0:
+            rel_delta = delta / abs(errors[i - 1])
+            if rel_delta < tol:
+                return int(ks[i])
+    return None
+
+
+def find_plateau_dyadic(ks, errors, n_sigma=2.0):
+    """
+    Criterio alla Flyvbjerg–Petersen per la scansione diadica: scorrendo blocchi sempre più grandi,
+    il primo k oltre il quale nessuna stima dell'errore cresce più della sua incertezza statistica,
+    err / sqrt(2 (k - 1)), moltiplicata per n_sigma.
+    """
+    order = np.argsort(ks)[::-1] # k decrescente = blocchi sempre più grandi
+    ks = np.asarray(ks)[order]
+    errors = np.asarray(errors)[order]
+    sigmas = errors / np.sqrt(2 * (ks - 1))
+
+    for i in range(len(ks) - 1):
+        if np.all(errors[i + 1:] - errors[i] < n_sigma * sigmas[i + 1:]):
+            return int(ks[i])
+    return None
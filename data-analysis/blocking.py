@@ -1,5 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 def blocking_with_k_blocks(data, k, func = lambda x: x):
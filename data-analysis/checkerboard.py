@@ -0,0 +1,247 @@
+""" Simulatore Metropolis a scacchiera in NumPy, senza compilatore: per scansioni veloci e prove.
+
+    Stesso modello di data-generation/src/ising.c (reticolo L x L periodico, J = 1, h = 0) e stessa
+    dinamica di metropolis_sweep: ogni sito propone il flip con probabilità 1/2 e lo accetta con
+    min(1, exp(-beta ΔE)), con la tabella di initialize_metropolis_lookup. Cambia l'ordine dei siti:
+    prima tutti i siti neri (i + j pari), poi tutti i bianchi. I siti di un colore non sono vicini tra loro,
+    quindi si aggiornano insieme con operazioni su array; serve L pari.
+
+    - Più beta/repliche insieme: gli spin stanno in array (R, L, L/2), uno per sottoreticolo, con R = numero
+      di catene; ogni catena ha il suo beta e la sua tabella di accettazione.
+    - M ed E si aggiornano a ogni mezzo sweep con le somme di ΔM e ΔE dei flip accettati: misurare costa O(R).
+    - Le serie (step, m, e) si scrivono nel formato binario di binary_series, con i nomi
+      results/L{L}_beta{beta:.6f}/L{L}_beta{beta:.6f}_v{N}.bin letti dal manifest e da main.py.
+
+    ΔE è E' - E = 2 s S (s spin prima del flip, S somma dei vicini), come energy_difference in ising.c:
+    entrambe le simulazioni campionano exp(-beta E) e le serie sono confrontabili.
+"""
+import os
+import time
+import argparse
+import numpy as np
+
+P_TRIAL = 0.5 # probabilità di proporre il flip, come "epsilon < 0.5" in metropolis_sweep
+
+
+def acceptance_table(betas, p_trial=P_TRIAL):
+    """
+    Probabilità di flip per s*S = -4, -2, 0, 2, 4 (indice (s*S + 4) // 2), una riga per beta:
+    p_trial * min(1, exp(-beta ΔE)) con ΔE = 2 s S, cioè exp(-beta k) per k = 4, 8 come in
+    initialize_metropolis_lookup.
+    """
+    betas = np.atleast_1d(np.asarray(betas, dtype=np.float64))
+    dE = 2 * np.arange(-4, 5, 2)
+    return (p_trial * np.minimum(1.0, np.exp(-betas[:, None] * dE[None, :]))).astype(np.float32)
+
+
+class CheckerboardSimulation:
+    """
+    R catene di Metropolis a scacchiera su reticoli L x L, una per elemento di betas.
+    Gli spin sono in self.black e self.white, array int8 (R, L, L/2): il sito compatto (i, c)
+    è la colonna j = 2c + i % 2 per il nero e j = 2c + 1 - i % 2 per il bianco.
+    """
+
+    def __init__(self, L, betas, seed=None, p_trial=P_TRIAL, hot_start=True):
+        if L % 2 or L < 2:
+            raise ValueError("la scacchiera con condizioni periodiche richiede L pari")
+        self.L = L
+        self.betas = np.atleast_1d(np.asarray(betas, dtype=np.float64))
+        self.R = len(self.betas)
+        self.table = acceptance_table(self.betas, p_trial)
+        self.rng = np.random.default_rng(seed)
+        self.sweeps = 0
+
+        shape = (self.R, L, L // 2)
+        if hot_start:
+            self.black = (2 * self.rng.integers(0, 2, size=shape, dtype=np.int8) - 1).astype(np.int8)
+            self.white = (2 * self.rng.integers(0, 2, size=shape, dtype=np.int8) - 1).astype(np.int8)
+        else:
+            self.black = np.ones(shape, dtype=np.int8)
+            self.white = np.ones(shape, dtype=np.int8)
+
+        # buffer riusati a ogni mezzo sweep
+        self._uniform = np.empty(shape, dtype=np.float32)
+        self._neighbours = np.empty(shape, dtype=np.int8)
+        self._rows = np.arange(self.R)[:, None, None]
+
+        self.M = self.black.sum(axis=(1, 2), dtype=np.int64) + self.white.sum(axis=(1, 2), dtype=np.int64)
+        self.E = self._total_energy()
+
+    def lattice(self):
+        """ Configurazioni complete (R, L, L), int8. """
+        full = np.empty((self.R, self.L, self.L), dtype=np.int8)
+        full[:, 0::2, 0::2] = self.black[:, 0::2]
+        full[:, 1::2, 1::2] = self.black[:, 1::2]
+        full[:, 0::2, 1::2] = self.white[:, 0::2]
+        full[:, 1::2, 0::2] = self.white[:, 1::2]
+        return full
+
+    def _total_energy(self):
+        # come compute_energy_per_spin (per V): somma verso destra e verso il basso
+        s = self.lattice().astype(np.int64)
+        return -(s * np.roll(s, -1, axis=2) + s * np.roll(s, -1, axis=1)).sum(axis=(1, 2))
+
+    def _neighbour_sum(self, other, even_shift, out):
+        # somma dei 4 vicini dei siti di un colore, dagli spin dell'altro colore:
+        # sopra/sotto stessa colonna compatta, a sinistra/destra la stessa colonna e quella spostata di even_shift
+        # nelle righe pari e di -even_shift nelle dispari
+        np.add(np.roll(other, 1, axis=1), np.roll(other, -1, axis=1), out=out)
+        out += other
+        out[:, 0::2] += np.roll(other[:, 0::2], even_shift, axis=2)
+        out[:, 1::2] += np.roll(other[:, 1::2], -even_shift, axis=2)
+        return out
+
+    def _update(self, spins, other, even_shift):
+        S = self._neighbour_sum(other, even_shift, self._neighbours)
+        sS = S * spins # s * S in {-4, ..., 4}, int8
+        p = self.table[self._rows, (sS + 4) >> 1]
+        self.rng.random(out=self._uniform, dtype=np.float32)
+        flip = self._uniform < p
+
+        # ΔM = -2 s e ΔE = 2 s S sui siti girati (non vicini tra loro: i contributi si sommano)
+        self.M -= 2 * np.where(flip, spins, 0).sum(axis=(1, 2), dtype=np.int64)
+        self.E += 2 * np.where(flip, sS, 0).sum(axis=(1, 2), dtype=np.int64)
+        np.negative(spins, out=spins, where=flip)
+
+    def sweep(self, n=1):
+        """ n sweep completi (neri poi bianchi) di tutte le catene. """
+        for _ in range(n):
+            self._update(self.black, self.white, 1)
+            self._update(self.white, self.black, -1)
+        self.sweeps += n
+
+    def observables(self):
+        """ (m, e) per spin di ogni catena, dai totali aggiornati. """
+        V = self.L * self.L
+        return self.M / V, self.E / V
+
+    def run(self, n_sweeps, stride=1, m_out=None, e_out=None, totals=False):
+        """
+        n_sweeps sweep con una misura ogni stride sweep; m_out ed e_out (R, n_sweeps // stride)
+        si allocano se non sono dati. Ritorna (m_out, e_out): m ed e per spin, oppure con totals=True
+        i totali interi M ed E (int64).
+        """
+        n = n_sweeps // stride
+        dtype = np.int64 if totals else np.float64
+        if m_out is None:
+            m_out = np.empty((self.R, n), dtype=dtype)
+        if e_out is None:
+            e_out = np.empty((self.R, n), dtype=dtype)
+        for k in range(n):
+            self.sweep(stride)
+            m_out[:, k], e_out[:, k] = (self.M, self.E) if totals else self.observables()
+        self.sweep(n_sweeps - n * stride)
+        return m_out, e_out
+
+
+def next_version_path(folder, base_name):
+    """ Primo results/.../{base_name}_v{N}.bin libero (N conta anche i .txt, come generate_unique_filename). """
+    version = 1
+    while any(os.path.exists(os.path.join(folder, f"{base_name}_v{version}{ext}")) for ext in (".txt", ".bin")):
+        version += 1
+    return os.path.join(folder, f"{base_name}_v{version}.bin")
+
+
+def simulate_to_results(results_dir, L, betas, sweeps, thermalization=0, stride=1, replicas=1, seed=None,
+                        chunk_sweeps=10_000, integers=False):
+    """
+    Simula replicas catene per ogni beta e scrive una serie binaria per catena nell'albero results_dir.
+    Le misure vanno direttamente nelle colonne memmap dei file, a blocchi di chunk_sweeps sweep.
+    Con integers=True si salvano i totali interi M ed E e step implicito (come main --integers).
+    Ritorna la lista dei file scritti.
+    """
+    from binary_series import create_series, integer_dtypes, BOLTZMANN_SIGN
+
+    chain_betas = np.repeat(np.asarray(betas, dtype=np.float64), replicas)
+    sim = CheckerboardSimulation(L, chain_betas, seed=seed)
+    sim.sweep(thermalization)
+
+    n_rows = sweeps // stride
+    step_start = thermalization + stride - 1 # indice dello sweep misurato, come main.c
+    extra = {}
+    if integers:
+        m_dtype, e_dtype = integer_dtypes(L)
+        dtypes = [("m", m_dtype, {"divisor": L * L}), ("e", e_dtype, {"divisor": L * L})]
+        extra = {"step_start": step_start}
+    else:
+        dtypes = [("step", "<i8"), ("m", "<f8"), ("e", "<f8")]
+    paths, columns = [], []
+    for r, beta in enumerate(chain_betas):
+        base_name = f"L{L}_beta{beta:.6f}"
+        folder = os.path.join(results_dir, base_name)
+        os.makedirs(folder, exist_ok=True)
+        path = next_version_path(folder, base_name)
+        _, cols = create_series(path, n_rows, dtypes, L=L, beta=float(beta), sweeps=thermalization + sweeps,
+                                thermalization=thermalization, stride=stride, replica=r % replicas,
+                                seed=seed, source="checkerboard", boltzmann_sign=BOLTZMANN_SIGN, **extra)
+        if n_rows and not integers:
+            cols["step"][:] = step_start + stride * np.arange(n_rows)
+        paths.append(path)
+        columns.append(cols)
+
+    chunk = max(chunk_sweeps // stride, 1)
+    buf_dtype = np.int64 if integers else np.float64
+    m_buf, e_buf = np.empty((sim.R, chunk), dtype=buf_dtype), np.empty((sim.R, chunk), dtype=buf_dtype)
+    for start in range(0, n_rows, chunk):
+        stop = min(start + chunk, n_rows)
+        sim.run((stop - start) * stride, stride, m_buf[:, :stop - start], e_buf[:, :stop - start], totals=integers)
+        for r, cols in enumerate(columns):
+            cols["m"][start:stop] = m_buf[r, :stop - start]
+            cols["e"][start:stop] = e_buf[r, :stop - start]
+
+    for cols in columns:
+        for col in cols.values():
+            if isinstance(col, np.memmap):
+                col.flush()
+    return paths
+
+
+def flips_per_second(L, n_chains, sweeps=200):
+    """ Tentativi di flip al secondo (siti * sweep / tempo) del simulatore NumPy. """
+    sim = CheckerboardSimulation(L, np.full(n_chains, 0.44), seed=0)
+    sim.sweep(5)
+    start = time.perf_counter()
+    sim.sweep(sweeps)
+    return n_chains * L * L * sweeps / (time.perf_counter() - start)
+
+
+def flips_per_second_c(L, sweeps=200):
+    """ Lo stesso per il kernel C (libising.so, un solo reticolo); None se la libreria non c'è. """
+    try:
+        import ising_lib
+        lattice = ising_lib.new_lattice(L, seed=(0, 54))
+    except (OSError, FileNotFoundError):
+        return None
+    ising_lib.thermalize(lattice, 0.44, 5)
+    start = time.perf_counter()
+    ising_lib.thermalize(lattice, 0.44, sweeps)
+    return L * L * sweeps / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Metropolis a scacchiera in NumPy, più beta/repliche insieme.")
+    parser.add_argument("L", type=int)
+    parser.add_argument("betas", type=float, nargs="*", help="valori di beta (default: solo --speed)")
+    parser.add_argument("--sweeps", type=int, default=100_000, help="sweep misurati")
+    parser.add_argument("--thermalization", type=int, default=1000)
+    parser.add_argument("--stride", type=int, default=1, help="sweep tra due misure")
+    parser.add_argument("-r", "--replicas", type=int, default=1, help="catene indipendenti per beta")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--results-dir", default="../data-generation/results")
+    parser.add_argument("--integers", action="store_true", help="salva M ed E interi (esatti) e step implicito")
+    parser.add_argument("--speed", action="store_true", help="confronta i flip al secondo con il kernel C")
+    args = parser.parse_args()
+
+    if args.speed or not args.betas:
+        c_rate = flips_per_second_c(args.L)
+        print(f"L = {args.L}: C (libising.so) " + ("non disponibile" if c_rate is None else f"{c_rate / 1e6:.1f} Mflip/s"))
+        for n_chains in (1, 8, 32):
+            rate = flips_per_second(args.L, n_chains)
+            ratio = "" if c_rate is None else f"  ({c_rate / rate:.1f}x più lento del C)" if rate < c_rate \
+                else f"  ({rate / c_rate:.1f}x più veloce del C)"
+            print(f"  NumPy, {n_chains:>2} catene: {rate / 1e6:.1f} Mflip/s{ratio}")
+
+    if args.betas:
+        paths = simulate_to_results(args.results_dir, args.L, args.betas, args.sweeps, args.thermalization,
+                                    args.stride, args.replicas, args.seed, integers=args.integers)
+        print(f"{len(paths)} serie scritte in {args.results_dir}")
@@ -0,0 +1,97 @@
+""" Punto di ingresso unico per gli script di analisi:
+
+        python cli.py analyse [-j 8] ...        -> main.py
+        python cli.py k-scan --headless ...     -> k_estimate.py
+        python cli.py tau [--tau-int DIR] ...   -> tau_exp_estimate.py
+        python cli.py fss [--jackknife] ...     -> FSS_extract_critical_values.py
+        python cli.py plot [-j 4] ...           -> render.py
+        python cli.py startup [--check]         -> tempi di avvio dei comandi
+
+    Gli argomenti dopo il comando passano invariati allo script, che si esegue come __main__:
+    si importa solo il modulo del comando scelto. matplotlib e scipy si importano dentro le funzioni
+    che li usano, quindi i comandi numerici partono senza caricarli; "startup" lo verifica.
+"""
+import os
+import sys
+import json
+import runpy
+import argparse
+import subprocess
+
+# comando: (modulo, descrizione, può importare matplotlib/scipy all'avvio)
+COMMANDS = {
+    "analyse": ("main", "osservabili con errori jackknife di tutte le run", False),
+    "k-scan": ("k_estimate", "errore vs numero di blocchi k e saturazione", False),
+    "tau": ("tau_exp_estimate", "stima di tau_exp e tau_int", False),
+    "fss": ("FSS_extract_critical_values", "finite size scaling: beta_c, 1/nu, gamma/nu", False),
+    "plot": ("render", "tutte le figure senza finestre, in parallelo", True),
+}
+HEAVY_MODULES = ("matplotlib", "scipy")
+
+_STARTUP_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                  "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+def measure_startup(module, repeats=5):
+    """
+    Tempo di import di un modulo in un interprete nuovo (il minimo su repeats ripetizioni)
+    e moduli pesanti caricati all'import. Ritorna (secondi, [moduli]).
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best, heavy = None, []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                             cwd=here, capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.splitlines()[-1])
+        best = result["seconds"] if best is None else min(best, result["seconds"])
+        heavy = result["heavy"]
+    return best, heavy
+
+
+def startup(argv):
+    parser = argparse.ArgumentParser(prog="cli.py startup", description="Tempi di avvio dei comandi.")
+    parser.add_argument("-n", "--repeats", type=int, default=5)
+    parser.add_argument("--check", action="store_true",
+                        help="esce con errore se un comando numerico importa matplotlib o scipy all'avvio")
+    args = parser.parse_args(argv)
+
+    failed = []
+    print(f"{'comando':<10} {'modulo':<30} {'import [ms]':>12}  moduli pesanti")
+    for command, (module, _, heavy_allowed) in COMMANDS.items():
+        seconds, heavy = measure_startup(module, args.repeats)
+        print(f"{command:<10} {module:<30} {1000 * seconds:12.1f}  {', '.join(heavy) or '-'}")
+        if heavy and not heavy_allowed:
+            failed.append(command)
+
+    if args.check and failed:
+        print(f"Comandi che importano moduli pesanti all'avvio: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    epilog = "\n".join(f"  {name:<10} {description}" for name, (_, description, _) in COMMANDS.items())
+    parser = argparse.ArgumentParser(description="Analisi delle simulazioni del modello di Ising 2D.",
+                                     epilog=f"comandi:\n{epilog}\n  {'startup':<10} tempi di avvio dei comandi",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=list(COMMANDS) + ["startup"])
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="argomenti del comando (vedi cli.py COMANDO -h)")
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        return startup(args.args)
+
+    module = COMMANDS[args.command][0]
+    sys.argv[1:] = args.args
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+""" Collapse automatico delle curve di finite size scaling: stima di (β_c, 1/ν, esponente dell'osservabile).
+
+    Per ogni L la curva y_L(β) si riscala in
+        x = (β - β_c) L^{1/ν},     Y = y L^{d} L^{-s ω}
+    (d e s da COLLAPSE_OBSERVABLES: per χ′ = ⟨m²⟩ - ⟨|m|⟩², senza il volume, d = 2 e ω = γ/ν; per ⟨|m|⟩
+    d = 0, s = -1 e ω = β/ν; U non si riscala). La qualità del collapse è la misura di Houdayer–Hartmann
+    (versione pesata con gli errori di quella di Bhattacharjee–Seno):
+        S = 1/N_overlap sum_{p != q} sum_{j di q nel dominio di p} (Y_qj - Ỹ_p(x_qj))² / (σ_qj² + σ̃_p(x_qj)²)
+    con Ỹ_p l'interpolazione della curva p; S ≈ 1 per un collapse compatibile con gli errori.
+
+    Poiché x è una funzione affine di β per ogni L, il punto x_qj sulla curva p corrisponde a
+        β' = β_c + (β_qj - β_c) (L_q / L_p)^{1/ν}
+    quindi ogni curva si interpola una volta sola in β (spline cubica, coefficienti analitici calcolati
+    all'inizio) e la valutazione di S per una scelta dei parametri costa una ricerca e un polinomio per
+    ogni punto di ogni coppia (p, q), tutte insieme in NumPy e anche per un'intera popolazione di parametri:
+    l'ottimizzazione globale (differential evolution, poi raffinamento locale) richiede pochi secondi.
+
+    Gli errori sui parametri sono bootstrap (si rigenerano i dati entro gli errori e si rifà il fit locale
+    partendo dal minimo) o jackknife togliendo una taglia L alla volta.
+"""
+import argparse
+import numpy as np
+from observables_store import MAIN_COLUMNS
+
+# nome (formato di main.py): (potenza d del volume, segno s dell'esponente, nome dell'esponente)
+COLLAPSE_OBSERVABLES = {
+    "χ′": (2, 1, "γ/ν"),
+    "⟨m²⟩": (2, 1, "γ/ν"),
+    "⟨|m|⟩": (0, -1, "β/ν"),
+    "U": (0, 0, None),
+}
+# valori esatti del modello di Ising 2D, per confronto e come valori di default dei plot
+EXACT = {"beta_c": 0.4406867935, "inv_nu": 1.0, "γ/ν": 1.75, "β/ν": 0.125}
+
+PARAMETERS = ("beta_c", "inv_nu", "omega")
+DEFAULT_BOUNDS = {"beta_c": (0.40, 0.48), "inv_nu": (0.3, 3.0), "omega": (-1.0, 3.0)}
+NO_OVERLAP = 1e10
+
+
+def load_curves(txt_path, observable, beta_range=None):
+    """
+    Curve {L: (beta, y, err)} di un'osservabile da un file observables_vN.txt di main.py,
+    eventualmente ristrette a beta_range = (beta_min, beta_max).
+    """
+    column = 2 + 2 * MAIN_COLUMNS.index(observable)
+    data = np.loadtxt(txt_path, comments="#", ndmin=2)
+    curves = {}
+    for L in np.unique(data[:, 0]).astype(int):
+        rows = data[data[:, 0] == L]
+        rows = rows[np.argsort(rows[:, 1])]
+        if beta_range is not None:
+            rows = rows[(rows[:, 1] >= beta_range[0]) & (rows[:, 1] <= beta_range[1])]
+        if len(rows) >= 3:
+            curves[int(L)] = (rows[:, 1], rows[:, column], rows[:, column + 1])
+    return curves
+
+
+def prepare(curves, observable):
+    """
+    Tabelle allineate (una riga per L, riempite con NaN) e coefficienti delle spline cubiche di y(β) ed err(β).
+    """
+    from scipy.interpolate import CubicSpline
+
+    Ls = sorted(curves)
+    if len(Ls) < 2:
+        raise ValueError("Servono almeno due taglie L per il collapse.")
+    n_max = max(len(curves[L][0]) for L in Ls)
+
+    beta = np.full((len(Ls), n_max), np.nan)
+    y = np.full((len(Ls), n_max), np.nan)
+    err = np.full((len(Ls), n_max), np.nan)
+    coef = np.zeros((len(Ls), n_max - 1, 4))
+    n = np.zeros(len(Ls), dtype=int)
+    for p, L in enumerate(Ls):
+        b, values, errors = (np.asarray(a, dtype=float) for a in curves[L])
+        n[p] = len(b)
+        beta[p, :n[p]], y[p, :n[p]], err[p, :n[p]] = b, values, errors
+        coef[p, :n[p] - 1] = CubicSpline(b, values).c.T
+
+    # chiavi crescenti di tutti i nodi (p, i) per una sola searchsorted su tutte le coppie
+    lo, hi = np.nanmin(beta), np.nanmax(beta)
+    scale = hi - lo if hi > lo else 1.0
+    keys = np.concatenate([4 * p + (beta[p, :n[p]] - lo) / scale for p in range(len(Ls))])
+    offsets = np.concatenate(([0], np.cumsum(n)[:-1]))
+
+    d, s, _ = COLLAPSE_OBSERVABLES[observable]
+    return {"L": np.array(Ls, dtype=float), "beta": beta, "y": y, "err": err, "coef": coef, "n": n,
+            "keys": keys, "offsets": offsets, "lo": lo, "scale": scale, "d": d, "s": s,
+            "curves": curves, "observable": observable}
+
+
+def collapse_quality(prep, beta_c, inv_nu, omega=0.0):
+    """
+    Misura S del collapse per i parametri dati; beta_c, inv_nu e omega possono essere array della stessa
+    forma (P,) per valutare S su una popolazione di parametri in una volta sola.
+    """
+    beta_c, inv_nu, omega = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float))
+                                                  for v in (beta_c, inv_nu, omega)))
+    L, beta, y, err, n = prep["L"], prep["beta"], prep["y"], prep["err"], prep["n"]
+    n_L, n_max = beta.shape
+    P = len(beta_c)
+    bc = beta_c[:, None, None, None]
+
+    # assi: (parametri, curva p interpolata, curva q dei punti, punto j di q)
+    ratio = (L[None, :] / L[:, None])[None, :, :, None] ** inv_nu[:, None, None, None]
+    beta_p = bc + (beta[None, None, :, :] - bc) * ratio
+
+    p_index = np.broadcast_to(np.arange(n_L)[None, :, None, None], beta_p.shape)
+    first = beta[:, 0][None, :, None, None]
+    last = beta[np.arange(n_L), n - 1][None, :, None, None]
+    mask = (beta_p >= first) & (beta_p <= last) & ~np.eye(n_L, dtype=bool)[None, :, :, None]
+    mask &= ~np.isnan(beta_p)
+
+    # segmento della spline di p che contiene β'
+    normalized = np.clip((np.where(mask, beta_p, first) - prep["lo"]) / prep["scale"], -1.0, 2.0)
+    i = np.searchsorted(prep["keys"], 4 * p_index + normalized, side="right") - 1 - prep["offsets"][p_index]
+    i = np.clip(i, 0, (n - 2)[p_index])
+
+    dt = np.where(mask, beta_p, 0.0) - beta[p_index, i]
+    c = prep["coef"][p_index, i]
+    y_interp = ((c[..., 0] * dt + c[..., 1]) * dt + c[..., 2]) * dt + c[..., 3]
+    t = dt / (beta[p_index, i + 1] - beta[p_index, i])
+    err_interp = err[p_index, i] + t * (err[p_index, i + 1] - err[p_index, i])
+
+    factor = L[None, :] ** (prep["d"] - prep["s"] * omega[:, None]) # (P, n_L)
+    f_p = factor[:, :, None, None]
+    f_q = factor[:, None, :, None]
+    residual = y[None, None, :, :] * f_q - y_interp * f_p
+    variance = (err[None, None, :, :] * f_q)**2 + (err_interp * f_p)**2
+
+    terms = np.where(mask, residual**2 / np.where(mask, variance, 1.0), 0.0)
+    counts = mask.sum(axis=(1, 2, 3))
+    S = np.where(counts > 0, terms.sum(axis=(1, 2, 3)) / np.maximum(counts, 1), NO_OVERLAP)
+    return S if P > 1 else float(S[0])
+
+
+def _free_parameters(prep, fixed):
+    free = [name for name in PARAMETERS if name not in fixed]
+    if prep["s"] == 0 and "omega" in free:
+        free.remove("omega") # osservabile che non si riscala
+    return free
+
+
+def _objective(prep, free, fixed):
+    def S(theta):
+        theta = np.asarray(theta, dtype=float)
+        values = dict(fixed)
+        values.update(zip(free, theta))
+        return collapse_quality(prep, values["beta_c"], values["inv_nu"], values.get("omega", 0.0))
+    return S
+
+
+def _local_fit(prep, free, fixed, start):
+    from scipy.optimize import minimize
+
+    result = minimize(_objective(prep, free, fixed), start, method="Nelder-Mead",
+                      options={"xatol": 1e-7, "fatol": 1e-9, "maxiter": 2000})
+    return result.x
+
+
+def fit_collapse(prep, bounds=None, fixed=None, seed=None, popsize=20):
+    """
+    Minimo globale di S sui parametri liberi (tra beta_c, inv_nu, omega; fixed = {nome: valore} li blocca).
+    Differential evolution con la popolazione valutata tutta insieme, poi raffinamento locale.
+    Ritorna ({nome: valore}, S al minimo).
+    """
+    from scipy.optimize import differential_evolution
+
+    fixed = dict(fixed or {})
+    bounds = dict(DEFAULT_BOUNDS, **(bounds or {}))
+    free = _free_parameters(prep, fixed)
+    S = _objective(prep, free, fixed)
+
+    result = differential_evolution(S, [bounds[name] for name in free], vectorized=True, updating="deferred",
+                                    popsize=popsize, tol=1e-8, seed=seed, polish=False)
+    theta = _local_fit(prep, free, fixed, result.x)
+    params = dict(fixed)
+    params.update(zip(free, (float(v) for v in theta)))
+    return params, float(S(theta))
+
+
+def bootstrap_errors(prep, params, fixed=None, n_boot=50, seed=None):
+    """
+    Errori bootstrap: si rigenerano i dati come y + err * N(0, 1) e si rifà il fit locale partendo da params.
+    Ritorna {nome: errore} dei parametri liberi.
+    """
+    rng = np.random.default_rng(seed)
+    fixed = dict(fixed or {})
+    free = _free_parameters(prep, fixed)
+    start = [params[name] for name in free]
+
+    samples = []
+    for _ in range(n_boot):
+        curves = {L: (b, y + e * rng.standard_normal(len(y)), e) for L, (b, y, e) in prep["curves"].items()}
+        samples.append(_local_fit(prepare(curves, prep["observable"]), free, fixed, start))
+    return dict(zip(free, np.std(samples, axis=0, ddof=1)))
+
+
+def jackknife_errors(prep, params, fixed=None):
+    """ Errori jackknife togliendo una taglia L alla volta (servono almeno 3 taglie). """
+    fixed = dict(fixed or {})
+    free = _free_parameters(prep, fixed)
+    Ls = sorted(prep["curves"])
+    if len(Ls) < 3:
+        raise ValueError("Il jackknife sulle taglie richiede almeno 3 valori di L.")
+    start = [params[name] for name in free]
+
+    samples = []
+    for L_out in Ls:
+        curves = {L: c for L, c in prep["curves"].items() if L != L_out}
+        samples.append(_local_fit(prepare(curves, prep["observable"]), free, fixed, start))
+    samples = np.array(samples)
+    k = len(samples)
+    return dict(zip(free, np.sqrt((k - 1) / k * np.sum((samples - samples.mean(axis=0))**2, axis=0))))
+
+
+def exponent_name(observable):
+    return COLLAPSE_OBSERVABLES[observable][2]
+
+
+def collapse_file(txt_path, observable="χ′", beta_range=None, bounds=None, fixed=None, errors="bootstrap",
+                  n_boot=50, seed=None):
+    """
+    Fit del collapse di un'osservabile da un file observables_vN.txt di main.py.
+    Ritorna (parametri, errori, S).
+    """
+    prep = prepare(load_curves(txt_path, observable, beta_range), observable)
+    params, S = fit_collapse(prep, bounds, fixed, seed)
+    if errors == "bootstrap":
+        errs = bootstrap_errors(prep, params, fixed, n_boot, seed)
+    elif errors == "jackknife":
+        errs = jackknife_errors(prep, params, fixed)
+    else:
+        errs = {}
+    return params, errs, S
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit di beta_c, 1/nu e dell'esponente dal data collapse.")
+    parser.add_argument("txt_path", help="file observables_vN.txt scritto da main.py")
+    parser.add_argument("--observable", choices=list(COLLAPSE_OBSERVABLES), default="χ′")
+    parser.add_argument("--beta-range", type=float, nargs=2, default=None, help="intervallo di beta usato")
+    parser.add_argument("--fix", nargs=2, action="append", default=[], metavar=("PARAMETRO", "VALORE"),
+                        help=f"blocca un parametro ({', '.join(PARAMETERS)})")
+    parser.add_argument("--errors", choices=("bootstrap", "jackknife", "none"), default="bootstrap")
+    parser.add_argument("--n-boot", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    fixed = {name: float(value) for name, value in args.fix}
+    params, errs, S = collapse_file(args.txt_path, args.observable, args.beta_range, fixed=fixed,
+                                    errors=args.errors, n_boot=args.n_boot, seed=args.seed)
+    labels = {"beta_c": "beta_c", "inv_nu": "1/nu", "omega": exponent_name(args.observable)}
+    for name, value in params.items():
+        if name == "omega" and labels["omega"] is None:
+            continue
+        err = f" ± {errs[name]:.6f}" if name in errs else " (fissato)" if name in fixed else ""
+        print(f"{labels[name]:<8} = {value:.6f}{err}")
+    print(f"S = {S:.3f}")
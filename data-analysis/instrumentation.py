@@ -0,0 +1,204 @@
+""" Strumentazione per stadio della pipeline di analisi: tempo reale, tempo CPU, byte letti e picco di RSS.
+
+    Gli stadi si segnano con il context manager stage(nome, **etichette) o con il decoratore profiled(nome);
+    le etichette (es. file=...) passano agli stadi annidati, quindi "block_sums" dentro lo stadio di un file
+    porta anche il nome del file. Da spento (default) stage ritorna sempre lo stesso nullcontext e non si
+    legge nessun contatore: il costo è quello di una chiamata di funzione.
+
+    Per ogni stadio si registrano:
+    - wall_s, cpu_s: time.perf_counter e time.process_time (tutti i thread del processo);
+    - rchar, read_bytes: da /proc/self/io, byte passati per read() e byte letti davvero dal disco
+      (le letture dalle memmap compaiono solo in read_bytes, e solo se non sono già in page cache);
+    - peak_rss_mb: massimo RSS durante lo stadio, azzerando VmHWM con /proc/self/clear_refs all'ingresso;
+      dove non si può azzerare (non Linux, permessi) è il massimo dall'inizio del processo (ru_maxrss).
+    I contatori non disponibili valgono None.
+
+    Nei processi di un pool si chiama enable() come initializer e si ritornano i record con collect();
+    il processo principale li aggiunge con merge().
+"""
+import os
+import csv
+import json
+import time
+import functools
+import contextlib
+
+try:
+    import resource
+except ImportError: # non POSIX
+    resource = None
+
+REPORT_FIELDS = ("stage", "file", "wall_s", "cpu_s", "rchar", "read_bytes", "peak_rss_mb", "pid")
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def _read_io():
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":") for line in f if ":" in line)
+        return int(fields["rchar"]), int(fields["read_bytes"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _read_hwm_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # kB su Linux
+    return None
+
+
+def _reset_hwm():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _delta(end, start):
+    return None if end is None or start is None else end - start
+
+
+class Profiler:
+    """ Raccoglie i record degli stadi del processo corrente in self.records. """
+
+    enabled = True
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.records = []
+        self._stack = [] # stadi aperti: [etichette, picco RSS in kB]
+
+    @contextlib.contextmanager
+    def stage(self, name, **labels):
+        if self._stack:
+            labels = dict(self._stack[-1][0], **labels)
+
+        # il picco fin qui appartiene agli stadi esterni, poi si azzera per misurare solo questo stadio
+        hwm = _read_hwm_kb()
+        for frame in self._stack:
+            frame[1] = max(frame[1] or 0, hwm or 0)
+        _reset_hwm()
+        frame = [labels, None]
+        self._stack.append(frame)
+
+        rchar, read_bytes = _read_io()
+        cpu, wall = time.process_time(), time.perf_counter()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            rchar_end, read_bytes_end = _read_io()
+            hwm = _read_hwm_kb()
+            self._stack.pop()
+            peak = None if hwm is None else max(frame[1] or 0, hwm)
+            if self._stack and peak is not None:
+                self._stack[-1][1] = max(self._stack[-1][1] or 0, peak)
+
+            self.records.append(dict(labels, stage=name, wall_s=wall, cpu_s=cpu,
+                                     rchar=_delta(rchar_end, rchar), read_bytes=_delta(read_bytes_end, read_bytes),
+                                     peak_rss_mb=None if peak is None else peak / 1024, pid=os.getpid()))
+
+    def merge(self, records):
+        self.records.extend(records)
+
+    def collect(self):
+        """ Ritorna e rimuove i record raccolti (per rimandarli dal processo di un pool a quello principale). """
+        records, self.records = self.records, []
+        return records
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.records, f, indent=1, ensure_ascii=False)
+
+    def write_csv(self, path):
+        fields = list(REPORT_FIELDS) + sorted({key for r in self.records for key in r} - set(REPORT_FIELDS))
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def write(self, path):
+        """ Report in JSON, o in CSV se path finisce con .csv. """
+        if path.endswith(".csv"):
+            self.write_csv(path)
+        else:
+            self.write_json(path)
+
+    def summary(self):
+        """ Tabella per stadio: numero di chiamate, tempi totali, MB letti e picco di RSS massimo. """
+        groups = {}
+        for r in self.records:
+            groups.setdefault(r["stage"], []).append(r)
+
+        def total(rows, key):
+            values = [r[key] for r in rows if r.get(key) is not None]
+            return sum(values) if values else float("nan")
+
+        lines = [f"{'stadio':<16} {'n':>5} {'reale [s]':>10} {'CPU [s]':>10} {'CPU/reale':>9} "
+                 f"{'rchar [MB]':>11} {'disco [MB]':>11} {'picco RSS [MB]':>15}"]
+        for name, rows in sorted(groups.items(), key=lambda item: -total(item[1], "wall_s")):
+            wall, cpu = total(rows, "wall_s"), total(rows, "cpu_s")
+            peaks = [r["peak_rss_mb"] for r in rows if r.get("peak_rss_mb") is not None]
+            lines.append(f"{name:<16} {len(rows):>5} {wall:10.3f} {cpu:10.3f} {cpu / wall if wall else float('nan'):9.2f} "
+                         f"{total(rows, 'rchar') / 1024**2:11.1f} {total(rows, 'read_bytes') / 1024**2:11.1f} "
+                         f"{max(peaks) if peaks else float('nan'):15.1f}")
+        lines.append("(gli stadi annidati sono contati anche in quelli che li contengono)")
+        return "\n".join(lines)
+
+
+class NullProfiler:
+    """ Profiler spento: nessuna misura, nessun record. """
+
+    enabled = False
+    records = []
+
+    def stage(self, name, **labels):
+        return _NULL_STAGE
+
+    def merge(self, records):
+        pass
+
+    def collect(self):
+        return []
+
+
+_profiler = NullProfiler()
+
+
+def enable():
+    """ Attiva la strumentazione nel processo corrente (usabile come initializer di un pool). """
+    global _profiler
+    # un processo figlio creato con fork eredita il profiler del padre con i suoi record: si riparte da zero
+    if not _profiler.enabled or _profiler.pid != os.getpid():
+        _profiler = Profiler()
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def stage(name, **labels):
+    return _profiler.stage(name, **labels)
+
+
+def profiled(name):
+    """ Decoratore: ogni chiamata della funzione è uno stadio name. """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _profiler.enabled:
+                return func(*args, **kwargs)
+            with _profiler.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
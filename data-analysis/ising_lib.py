@@ -0,0 +1,182 @@
+""" Kernel Metropolis di data-generation chiamato da Python con ctypes, senza file intermedi.
+
+    La libreria si compila con "make lib" in data-generation (libising.so: ising.c, geometry.c,
+    random.c, pcg32min.c). Il reticolo è un array NumPy int32 di L*L spin e le misure di m ed e
+    finiscono direttamente negli array passati a run(): array in memoria, oppure le colonne memmap
+    di binary_series.create_series per scrivere la serie sul disco mentre si simula.
+
+        lattice = new_lattice(L, seed=(1, 54))
+        m, e = run(lattice, beta, 100_000, stride=10)
+
+    - Ogni Lattice ha il suo stream pcg32 (random_stream_init), passato esplicitamente a
+      metropolis_run: il generatore di default della libreria non si usa. Reticoli diversi in
+      thread Python diversi hanno quindi sequenze indipendenti e riproducibili dal proprio seed;
+      lo stesso Lattice invece non va simulato da due thread insieme.
+    - ctypes rilascia il GIL durante la chiamata, quindi più reticoli si simulano davvero in
+      parallelo e altri thread possono analizzare le misure già scritte.
+    - e è compute_energy_per_spin così com'è, con la stessa convenzione dei file di main.c.
+"""
+import os
+import ctypes
+import argparse
+import numpy as np
+
+LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-generation", "libising.so")
+
+_lib = None
+
+
+def load_library(path=None):
+    """ Carica libising.so (una volta sola per processo) e dichiara le firme delle funzioni usate. """
+    global _lib
+    if _lib is not None:
+        return _lib
+
+    path = os.path.abspath(path or os.environ.get("ISING_LIB", LIBRARY_PATH))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} non trovata: compilarla con 'make lib' in data-generation")
+    lib = ctypes.CDLL(path)
+
+    lattice_t = np.ctypeslib.ndpointer(dtype=np.int32, ndim=1, flags=("C_CONTIGUOUS", "WRITEABLE"))
+    # buffer delle misure: array float64 contigui o NULL (None)
+    buffer_t = ctypes.c_void_p
+
+    stream_t = ctypes.POINTER(Pcg32)
+
+    lib.random_stream_init.argtypes = [stream_t, ctypes.c_uint64, ctypes.c_uint64]
+    lib.random_stream_init.restype = None
+    lib.initialize_lattice_stream.argtypes = [ctypes.c_int, lattice_t, stream_t]
+    lib.initialize_lattice_stream.restype = None
+    lib.compute_magnetization_volume.argtypes = [lattice_t, ctypes.c_int]
+    lib.compute_magnetization_volume.restype = ctypes.c_double
+    lib.compute_energy_per_spin.argtypes = [lattice_t, ctypes.c_int]
+    lib.compute_energy_per_spin.restype = ctypes.c_double
+    lib.metropolis_run.argtypes = [lattice_t, ctypes.c_int, ctypes.c_double, ctypes.c_long, ctypes.c_int,
+                                   buffer_t, buffer_t, stream_t]
+    lib.metropolis_run.restype = ctypes.c_long
+
+    _lib = lib
+    return lib
+
+
+class Pcg32(ctypes.Structure):
+    """ pcg32_random_t di pcg32min.h: stato e incremento di uno stream. """
+    _fields_ = [("state", ctypes.c_uint64), ("inc", ctypes.c_uint64)]
+
+
+class Lattice:
+    """
+    Reticolo L x L (spins: array int32 piatto) con il suo stream pcg32. seed = (initstate, initseq);
+    se None se ne estrae uno a caso, salvato in self.seed per poter ripetere la simulazione.
+    """
+
+    def __init__(self, L, seed=None):
+        if seed is None:
+            seed = tuple(int(x) for x in np.random.SeedSequence().generate_state(2, np.uint64))
+        self.L = int(L)
+        self.seed = tuple(seed)
+        self.spins = np.empty(self.L * self.L, dtype=np.int32)
+        self.rng = Pcg32()
+        lib = load_library()
+        lib.random_stream_init(ctypes.byref(self.rng), *self.seed)
+        lib.initialize_lattice_stream(self.L, self.spins, ctypes.byref(self.rng))
+
+
+def new_lattice(L, seed=None):
+    """ Reticolo L x L di spin ±1 casuali (initialize_lattice_stream) con il proprio stream. """
+    return Lattice(L, seed)
+
+
+def _buffer(out, n):
+    # puntatore a un buffer float64 contiguo con almeno n elementi (None -> NULL)
+    if out is None:
+        return None
+    if out.dtype != np.float64 or not out.flags.c_contiguous or not out.flags.writeable:
+        raise ValueError("i buffer delle misure devono essere array float64 contigui e scrivibili")
+    if len(out) < n:
+        raise ValueError(f"buffer da {len(out)} elementi, ne servono {n}")
+    return out.ctypes.data
+
+
+def measurements(lattice):
+    """ (m, e) della configurazione corrente. """
+    lib = load_library()
+    return (lib.compute_magnetization_volume(lattice.spins, lattice.L),
+            lib.compute_energy_per_spin(lattice.spins, lattice.L))
+
+
+def run(lattice, beta, n_sweeps, stride=1, m_out=None, e_out=None):
+    """
+    n_sweeps sweep Metropolis sul reticolo (modificato sul posto, con il suo stream); dopo ogni stride sweep si scrivono
+    m ed e in m_out, e_out. Se i buffer non sono dati si allocano (n_sweeps // stride elementi);
+    altrimenti si riempiono dall'inizio, senza copie: per scrivere a un offset si passa una slice.
+    Ritorna (m_out[:n], e_out[:n]) con n numero di misure.
+    """
+    stride = max(int(stride), 1)
+    n = n_sweeps // stride
+    if m_out is None and e_out is None:
+        m_out, e_out = np.empty(n), np.empty(n)
+
+    written = load_library().metropolis_run(lattice.spins, lattice.L, beta, n_sweeps, stride,
+                                            _buffer(m_out, n), _buffer(e_out, n), ctypes.byref(lattice.rng))
+    return (None if m_out is None else m_out[:written]), (None if e_out is None else e_out[:written])
+
+
+def thermalize(lattice, beta, n_sweeps):
+    """ Sweep senza misure (entrambi i buffer NULL). """
+    load_library().metropolis_run(lattice.spins, lattice.L, beta, n_sweeps, 1, None, None, ctypes.byref(lattice.rng))
+
+
+def simulate_to_file(file_path, L, beta, sweeps, thermalization=0, stride=1, seed=None, chunk_sweeps=1_000_000):
+    """
+    Simulazione completa con la serie scritta direttamente nel formato binario (binary_series):
+    le misure vanno nelle colonne memmap del file, a blocchi di chunk_sweeps sweep.
+    step segue la convenzione di main.c: indice (da 0) dello sweep dopo cui si misura.
+    """
+    from binary_series import create_series, BOLTZMANN_SIGN
+
+    lattice = new_lattice(L, seed=seed)
+    if thermalization:
+        thermalize(lattice, beta, thermalization)
+
+    stride = max(int(stride), 1)
+    n_rows = sweeps // stride
+    chunk = max(chunk_sweeps // stride, 1) * stride
+    dtypes = [("step", "<i8"), ("m", "<f8"), ("e", "<f8")]
+    _, columns = create_series(file_path, n_rows, dtypes, L=L, beta=beta, sweeps=thermalization + sweeps,
+                               thermalization=thermalization, stride=stride,
+                               seed=list(lattice.seed), source="ising_lib",
+                               boltzmann_sign=BOLTZMANN_SIGN)
+
+    if n_rows:
+        columns["step"][:] = thermalization + stride * np.arange(1, n_rows + 1) - 1
+        start = 0
+        while start < n_rows:
+            n_chunk = min(chunk, (n_rows - start) * stride)
+            stop = start + n_chunk // stride
+            run(lattice, beta, n_chunk, stride, columns["m"][start:stop], columns["e"][start:stop])
+            start = stop
+        for col in columns.values():
+            col.flush()
+    return file_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulazione Metropolis nel processo Python (libising.so).")
+    parser.add_argument("L", type=int)
+    parser.add_argument("beta", type=float)
+    parser.add_argument("sweeps", type=int, help="sweep misurati (dopo la termalizzazione)")
+    parser.add_argument("--thermalization", type=int, default=0)
+    parser.add_argument("--stride", type=int, default=1, help="sweep tra due misure")
+    parser.add_argument("--seed", type=int, nargs=2, default=(1, 54), metavar=("INITSTATE", "INITSEQ"))
+    parser.add_argument("--out", default=None, help="file .bin di output (default: solo riepilogo a schermo)")
+    args = parser.parse_args()
+
+    if args.out:
+        simulate_to_file(args.out, args.L, args.beta, args.sweeps, args.thermalization, args.stride, tuple(args.seed))
+        print(f"Serie salvata in {args.out}")
+    else:
+        lattice = new_lattice(args.L, seed=tuple(args.seed))
+        thermalize(lattice, args.beta, args.thermalization)
+        m, e = run(lattice, args.beta, args.sweeps, args.stride)
+        print(f"{len(m)} misure: <|m|> = {np.mean(np.abs(m)):.6f}, <e> = {np.mean(e):.6f}")
@@ -15,31 +15,40 @@ def jackknife_secondary_estimate(data, primary_funcs, secondary_func, k):
     N = len(data)
     if k < 2 or k > N:
         raise ValueError(f"Numero di blocchi non valido: k={k}, deve essere 2 <= k <= {N}")
-    
+
     M = N // k
     N_used = M * k
 
     data_used = data[:N_used]
-    
-    # si costruiscono i blocchi (autocorrelazioni)
+
+    # si costruiscono i blocchi (autocorrelazioni), è una vista: nessuna copia della serie
     blocks = data_used.reshape(k, M)
 
-    # prepara array per F_jackknife
-    F_jk = []
+    # somme per blocco di ogni funzione primaria, calcolate una sola volta: block_sums[i, j] = sum F_j(blocco i)
+    block_sums = np.empty((k, len(primary_funcs)))
+    for i in range(k):
+        for j, f in enumerate(primary_funcs):
+            block_sums[i, j] = np.sum(f(blocks[i]))
 
-    for i in range(k): # per ogni numero di blocchi costruisce il sample con il blocco i-esimo rimosso
-        reduced_data = np.delete(blocks, i, axis=0).reshape((k - 1) * M)
+    return jackknife_from_block_sums(block_sums, M, secondary_func)
 
-        # calcola medie delle funzioni primarie sul sample ridotto e calcola la funzione secondaria
-        primary_means = [np.mean(f(reduced_data)) for f in primary_funcs]
-        F_i = secondary_func(*primary_means) # media calcolata sul sample senza il blocco i-esimo
-        F_jk.append(F_i)
 
-    F_jk = np.array(F_jk)
+def jackknife_from_block_sums(block_sums, M, secondary_func):
+    """
+    Jackknife leave-one-block-out a partire dalla tabella delle somme per blocco (k, n) delle funzioni primarie.
+    La media del sample senza il blocco i-esimo si ottiene per sottrazione dal totale, e la funzione
+    secondaria viene valutata una sola volta su tutte le k repliche (deve accettare array).
+    """
+    block_sums = np.asarray(block_sums, dtype=float)
+    k = block_sums.shape[0]
+
+    # medie delle funzioni primarie sui k sample ridotti, ognuno di (k - 1) * M elementi
+    reduced_means = (block_sums.sum(axis=0) - block_sums) / ((k - 1) * M)
+
+    F_jk = np.asarray(secondary_func(*reduced_means.T), dtype=float) # medie calcolate sui sample senza il blocco i-esimo
     F_mean = np.mean(F_jk) # media totale
 
     F_var = (k - 1) / k * np.sum((F_jk - F_mean)**2)
     F_error = np.sqrt(F_var) # calcolo della dev st
 
     return F_mean, F_error
-
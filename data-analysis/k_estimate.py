@@ -1,66 +1,48 @@
-import numpy as np
 import os
-from utils import find_file_paths_interactive, read_data_file
-from plots import plot_estimated_error_vs_k
+import argparse
+from utils import find_file_paths_interactive, read_data_file, file_label
+from binning import error_scan, dyadic_error_scan, find_saturation, find_plateau_dyadic
+from main import find_latest_files
 
-
-if __name__ == "__main__":
-    # Vai nella cartella results/ partendo da data_analysis/
-    base_dir = os.path.dirname(__file__)
-    results_dir = os.path.abspath(os.path.join(base_dir, "../data-generation/results"))
-
-    file_paths = find_file_paths_interactive(results_dir)
-
-    # Range di k (modificabile)
-    k_range = list(range(4, 51, 4))
-
-    saturazioni_globali = []
-
-    for path in file_paths:
-        m, e = read_data_file(path)
-        file_id = os.path.basename(path).replace(".txt", "")
+# Range di k (modificabile)
+K_RANGE = list(range(4, 51, 4))
 
 
-        # Blocking
-        k_sat = plot_estimated_error_vs_k(m, k_min=k_range[0], k_max=k_range[-1],
-                                          func=lambda x: x, secondary=False)
-        saturazioni_globali.append((file_id, "⟨m⟩", k_sat))
+def error_curve_path(save_dir, file_id, obs):
+    return os.path.join(save_dir, f"{file_id}_{file_label(obs)}_errore_vs_k.png")
 
-        k_sat = plot_estimated_error_vs_k(e, k_min=k_range[0], k_max=k_range[-1],
-                                          func=lambda x: x, secondary=False)
-        saturazioni_globali.append((file_id, "⟨e⟩", k_sat))
 
-        k_sat = plot_estimated_error_vs_k(m, k_min=k_range[0], k_max=k_range[-1],
-                                          func=np.abs, secondary=False)
-        saturazioni_globali.append((file_id, "⟨|m|⟩", k_sat))
+def k_scan_file(path, k_range, dyadic=False, show=True, save_dir=None):
+    """
+    Curve errore vs k di tutte le osservabili del file da una sola lettura, con stima della saturazione.
+    Ritorna la lista di (file_id, osservabile, k_saturazione).
+    """
+    m, e = read_data_file(path)
+    file_id = os.path.splitext(os.path.basename(path))[0]
 
-        k_sat = plot_estimated_error_vs_k(m, k_min=k_range[0], k_max=k_range[-1],
-                                          func=lambda x: x**2, secondary=False)
-        saturazioni_globali.append((file_id, "⟨m²⟩", k_sat))
+    if dyadic:
+        ks, errors = dyadic_error_scan(m, e, k_min=k_range[0])
+    else:
+        ks, errors = error_scan(m, e, range(k_range[0], k_range[-1] + 1))
 
+    if show or save_dir:
+        from plots import plot_error_curve
 
-        # Jackknife
-        k_sat = plot_estimated_error_vs_k(m, k_min=k_range[0], k_max=k_range[-1],
-                                          secondary=True,
-                                          primary_functions=[lambda x: x**2, np.abs],
-                                          secondary_function=lambda m2, abs_m: m2 - abs_m**2)
-        saturazioni_globali.append((file_id, "χ′", k_sat))
+    saturazioni = []
+    for obs, errs in errors.items():
+        k_sat = find_plateau_dyadic(ks, errs) if dyadic else find_saturation(ks, errs)
+        saturazioni.append((file_id, obs, k_sat))
 
-        k_sat = plot_estimated_error_vs_k(m, k_min=k_range[0], k_max=k_range[-1],
-                                          secondary=True,
-                                          primary_functions=[lambda x: x, lambda x: x**2, lambda x: x**4],
-                                          secondary_function=lambda m, m2, m4: 1 - m4 / (3 * m2**2))
-        saturazioni_globali.append((file_id, "U", k_sat))
+        if show or save_dir:
+            save_path = error_curve_path(save_dir, file_id, obs) if save_dir else None
+            plot_error_curve(ks, errs, title=f"{file_id}: errore di {obs} vs k", k_saturazione=k_sat,
+                             show=show, save_path=save_path)
 
-        k_sat = plot_estimated_error_vs_k(e, k_min=k_range[0], k_max=k_range[-1],
-                                          secondary=True,
-                                          primary_functions=[lambda x: x, lambda x: x**2],
-                                          secondary_function=lambda e, e2: e2 - e**2)
-        saturazioni_globali.append((file_id, "C", k_sat))
+    return saturazioni
 
 
+def update_k_saturation_file(output_path, saturazioni_globali):
     # leggi risultati precedenti se esistono
-    output_path = os.path.join(base_dir, "k_saturation.txt")
     mappa_saturazioni = {}  # (file_id, osservabile) → k
 
     if os.path.exists(output_path):
@@ -84,4 +66,35 @@ if __name__ == "__main__":
         for (file_id, obs), k in sorted(mappa_saturazioni.items()):
             f.write(f"{file_id:<30} {obs:<14} {k if k is not None else 'NA'}\n")
 
+
+if __name__ == "__main__":
+    # Vai nella cartella results/ partendo da data_analysis/
+    base_dir = os.path.dirname(__file__)
+    results_dir = os.path.abspath(os.path.join(base_dir, "../data-generation/results"))
+
+    parser = argparse.ArgumentParser(description="Stima del numero di blocchi k a cui satura l'errore.")
+    parser.add_argument("--headless", action="store_true",
+                        help="analizza l'ultima versione di tutte le cartelle di results senza aprire finestre")
+    parser.add_argument("--dyadic", action="store_true", help="blocchi di 2^j elementi (Flyvbjerg–Petersen)")
+    parser.add_argument("--save-plots", default=None, help="cartella in cui salvare le curve errore vs k")
+    args = parser.parse_args()
+
+    if args.headless:
+        file_paths = [path for _, _, path in find_latest_files(results_dir)]
+    else:
+        file_paths = find_file_paths_interactive(results_dir)
+
+    if args.save_plots:
+        os.makedirs(args.save_plots, exist_ok=True)
+
+    saturazioni_globali = []
+
+    for path in file_paths:
+        print(f"Scansione di k per {path}")
+        saturazioni_globali.extend(k_scan_file(path, K_RANGE, dyadic=args.dyadic,
+                                               show=not args.headless, save_dir=args.save_plots))
+
+    output_path = os.path.join(base_dir, "k_saturation.txt")
+    update_k_saturation_file(output_path, saturazioni_globali)
+
     print(f"\n>> Risultati aggiornati in: {output_path}")
@@ -1,9 +1,17 @@
 import os
 import re
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
-from blocking import blocking_with_k_blocks
-from jackknife import jackknife_secondary_estimate
+from moments import (accumulate_block_sums_chunks, prefetched, primary_from_table, secondary_from_table,
+                     CHUNK_SIZE)
 from utils import generate_unique_filename
+from binary_series import iter_chunks, count_rows, resolve_series_path
+from autocorrelation import (StreamingAutocovariance, integrated_times, integrated_times_file, initial_max_lag,
+                             SERIES)
+from analysis_cache import AnalysisCache, DEFAULT_MAX_BYTES, file_hashes
+from manifest import Manifest
+from instrumentation import enable, get_profiler, stage
 
 BETA_C = 0.4406867935
 
@@ -11,21 +19,59 @@ BASE_DIR = os.path.dirname(__file__)
 RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../data-generation/results"))
 OUTPUT_DIR = os.path.abspath(os.path.join(BASE_DIR, "../data-analysis/analyzed_results"))
 
-folder_pattern = re.compile(r"^L(\d+)_beta([0-9.]+)$")
-version_pattern = re.compile(r"_v(\d+)\.txt$")
-
-primary_functions = {
-    "⟨m⟩": lambda m: m,
-    "⟨e⟩": lambda e: e,
-    "⟨|m|⟩": lambda m: np.abs(m),
-    "⟨m²⟩": lambda m: m**2,
+# osservabili primarie: nome -> momento di cui si fa la media (vedi moments.MOMENTS)
+primary_observables = {
+    "⟨m⟩": "m",
+    "⟨e⟩": "e",
+    "⟨|m|⟩": "|m|",
+    "⟨m²⟩": "m²",
 }
+# osservabili secondarie: nome -> (momenti in ingresso, funzione secondaria)
 secondary_observables = {
-    "⟨|m|⟩²": ([np.abs], lambda abs_m: abs_m**2),
-    "χ′": ([lambda x: x**2, np.abs], lambda m2, abs_m: m2 - abs_m**2),
-    "U": ([lambda x: x, lambda x: x**2, lambda x: x**4], lambda m, m2, m4: 1 - m4 / (3 * m2**2)),
-    "C": ([lambda x: x, lambda x: x**2], lambda e, e2: e2 - e**2),
+    "⟨|m|⟩²": (["|m|"], lambda abs_m: abs_m**2),
+    "χ′": (["m²", "|m|"], lambda m2, abs_m: m2 - abs_m**2),
+    "U": (["m", "m²", "m⁴"], lambda m, m2, m4: 1 - m4 / (3 * m2**2)),
+    "C": (["e", "e²"], lambda e, e2: e2 - e**2),
+}
+
+# serie (vedi autocorrelation.SERIES) il cui τ_int fissa la lunghezza minima dei blocchi di ogni osservabile
+tau_sources = {
+    "⟨m⟩": ["m"],
+    "⟨e⟩": ["e"],
+    "⟨|m|⟩": ["|m|"],
+    "⟨m²⟩": ["m²"],
+    "⟨|m|⟩²": ["|m|"],
+    "χ′": ["m²", "|m|"],
+    "U": ["m²"],
+    "C": ["e"],
 }
+TAU_SERIES = sorted({s for v in tau_sources.values() for s in v})
+BLOCK_TAU_FACTOR = 20 # blocchi lunghi almeno BLOCK_TAU_FACTOR * τ_int
+K_MAX = 100
+DEFAULT_K = 20 # k usato quando la finestra di τ_int non si trova: la stima di τ_int non è affidabile
+
+
+def k_map_from_tau(taus, N, factor=BLOCK_TAU_FACTOR, k_max=K_MAX, default_k=DEFAULT_K):
+    """
+    Sceglie k per ogni osservabile dai τ_int del file: il massimo numero di blocchi (fino a k_max)
+    con blocchi lunghi almeno factor * τ_int; None se non se ne possono fare almeno 2.
+    Se per una serie la finestra automatica non è stata trovata si avvisa e si usa default_k.
+    taus: {serie: (τ_int, errore, W, convergenza)}.
+    """
+    unreliable = sorted(source for source in TAU_SERIES if source in taus and not taus[source][3])
+    if unreliable:
+        print(f"Attenzione: finestra di τ_int non trovata per {', '.join(unreliable)}: si usa k = {default_k}")
+
+    k_map = {}
+    for name, sources in tau_sources.items():
+        if any(source in unreliable for source in sources):
+            k = min(default_k, N)
+        else:
+            tau = max(taus[source][0] for source in sources)
+            M_min = max(1, int(np.ceil(factor * tau)))
+            k = min(k_max, N // M_min)
+        k_map[name] = k if k >= 2 else None
+    return k_map
 
 
 # ritorna un dizionario che mappa l'osservabile nel k corrispondente, per L maggiore e beta vicino e sotto il beta_c
@@ -64,67 +110,192 @@ def k_load(path_txt):
     return mappa
 
 
+def required_ks(k_map):
+    return sorted({k for k in k_map.values() if k is not None})
+
+
+def compute_tables(file_path, ks, chunk_rows=CHUNK_SIZE):
+    """
+    Legge il file una sola volta, a pezzi di chunk_rows righe (iter_chunks: le serie intere si decodificano
+    pezzo per pezzo), e costruisce le tabelle delle somme per blocco per tutti i k validi.
+    Ritorna (N, {k: (tabella, M)}).
+    """
+    N = count_rows(file_path)
+    valid_ks = [k for k in ks if 2 <= k <= N]
+    chunks = prefetched(iter_chunks(file_path, ("m", "e"), chunk_rows))
+    return N, accumulate_block_sums_chunks(chunks, N, valid_ks)
+
+
+def observables_from_tables(tables, k_map):
+    """
+    Ricava ogni osservabile dalla tabella del suo k.
+    Ritorna la lista [media, errore, ...] nell'ordine di primary_observables e secondary_observables.
+    """
+    values = []
+
+    # variabili primarie
+    for name, moment in primary_observables.items():
+        try:
+            table, M = tables[k_map.get(name)]
+            values.extend(primary_from_table(table, M, moment))
+        except Exception:
+            values.extend([np.nan, np.nan])
+
+    # variabili secondarie
+    for name, (moments, secondary_func) in secondary_observables.items():
+        try:
+            table, M = tables[k_map.get(name)]
+            values.extend(secondary_from_table(table, M, moments, secondary_func))
+        except Exception:
+            values.extend([np.nan, np.nan])
+
+    return [float(x) for x in values]
+
+
+def analyze_file(file_path, k_map):
+    """
+    Analizza un file di serie temporali con una sola lettura: le tabelle delle somme per blocco
+    si costruiscono per tutti i k richiesti insieme, poi ogni osservabile si ricava dalla sua tabella.
+    """
+    _, tables = compute_tables(file_path, required_ks(k_map))
+    return observables_from_tables(tables, k_map)
+
+
+def tau_and_tables(file_path, chunk_rows=CHUNK_SIZE):
+    """
+    τ_int delle serie di tau_sources e tabelle delle somme per blocco da una sola lettura del file: ogni pezzo
+    va sia nell'accumulatore dell'autocorrelazione sia nelle tabelle di tutti i k candidati (2..K_MAX),
+    perché i k si scelgono solo dopo aver stimato τ_int. Se in TAU_MAX_LAG lag la finestra non si trova
+    si ripete la sola stima di τ_int con finestre più grandi (integrated_times_file).
+    Ritorna (N, taus, {k: (tabella, M)} dei k scelti, k_map).
+    """
+    N = count_rows(file_path)
+    max_lag = initial_max_lag(N)
+    acc = StreamingAutocovariance(max_lag, len(TAU_SERIES))
+
+    def feed(chunks):
+        for m_chunk, e_chunk in chunks:
+            acc.add(np.column_stack([SERIES[name](m_chunk, e_chunk) for name in TAU_SERIES]))
+            yield m_chunk, e_chunk
+
+    chunks = feed(prefetched(iter_chunks(file_path, ("m", "e"), chunk_rows)))
+    tables = accumulate_block_sums_chunks(chunks, N, range(2, min(K_MAX, N) + 1))
+
+    results = integrated_times(acc.result()[2], N, TAU_SERIES)
+    if not all(r[3] for r in results.values()) and 2 * max_lag <= N // 4:
+        results, N = integrated_times_file(file_path, series=TAU_SERIES, max_lag=2 * max_lag, chunk_rows=chunk_rows)
+
+    taus = {"N": N, "taus": {name: list(r) for name, r in results.items()}}
+    k_map = k_map_from_tau(taus["taus"], N)
+    return N, taus, {k: tables[k] for k in required_ks(k_map)}, k_map
+
+
+def _analysis_task(task):
+    """
+    Eseguita nei processi del pool (deve stare a livello di modulo per essere serializzabile).
+    Se k_map è None i k si scelgono dai τ_int: se non sono già noti si stimano nella stessa lettura delle tabelle.
+    Con hash_file=True gli hash della cache (analysis_cache.file_hashes) si calcolano in un thread mentre
+    l'analisi legge il file: i blocchi letti dai due stanno nella page cache una volta sola.
+    Ritorna (N, k_map, taus, tabelle, hash o None, record della strumentazione).
+    """
+    file_path, k_map, taus, hash_file = task
+    print(f"Analizzo {file_path}")
+
+    with stage("file", file=os.path.basename(file_path)), ThreadPoolExecutor(max_workers=1) as hasher:
+        hashes = hasher.submit(file_hashes, file_path) if hash_file else None
+        if k_map is None and taus is None:
+            N, taus, tables, k_map = tau_and_tables(file_path)
+        else:
+            if k_map is None:
+                k_map = k_map_from_tau(taus["taus"], taus["N"])
+            N, tables = compute_tables(file_path, required_ks(k_map))
+        hashes = hashes.result() if hashes is not None else None
+    return N, k_map, taus, tables, hashes, get_profiler().collect()
+
+
+def find_latest_files(results_dir):
+    """
+    Ritorna la lista ordinata per (L, beta) di (L, beta, path dell'ultima versione) per le cartelle L*_beta*
+    (dal manifest di results_dir, vedi manifest.py).
+    """
+    return Manifest(results_dir).latest_files()
+
+
 # calcolo dei valori medi e errori delle varie quantità per ogni cartella i results, ultima versione dei files
-def main():
+def main(n_workers=1, use_cache=True, cache_max_bytes=DEFAULT_MAX_BYTES, k_from_tau=True, profile_path=None,
+         verify_cache=False):
+    """
+    n_workers > 1 distribuisce le cartelle su un pool di processi; l'ordine delle righe nel file di output
+    è comunque quello (L, beta), indipendente dall'ordine di completamento.
+    Ogni processo legge la sua serie a pezzi, quindi la memoria resta limitata anche per L grandi.
+    Con use_cache=True i file non modificati dall'ultima analisi non vengono riletti (vedi analysis_cache.py).
+    Con verify_cache=True l'hash completo di ogni file si ricalcola anche se dimensione e mtime non sono cambiati.
+    Con k_from_tau=True il numero di blocchi di ogni osservabile si sceglie file per file dai τ_int
+    (finestra automatica, vedi autocorrelation.integrated_time); altrimenti si usa k_saturation.txt.
+    Con profile_path si misurano tempi, byte letti e memoria di ogni stadio e di ogni file (vedi
+    instrumentation.py): il report va in profile_path (JSON, o CSV se finisce con .csv) e il riepilogo a schermo.
+    """
+    profiler = enable() if profile_path else get_profiler()
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    k_map = k_load(os.path.join(BASE_DIR, "k_saturation.txt"))
 
-    rows = []
+    with stage("manifest"):
+        files = [(L, beta, resolve_series_path(path)) for L, beta, path in find_latest_files(RESULTS_DIR)]
+    cache = AnalysisCache(max_bytes=cache_max_bytes, verify=verify_cache) if use_cache else None
 
-    for folder in os.listdir(RESULTS_DIR):
-        full_folder = os.path.join(RESULTS_DIR, folder)
-        if not os.path.isdir(full_folder):
-            continue
+    if k_from_tau:
+        k_maps = [None] * len(files)
+    else:
+        k_map = k_load(os.path.join(BASE_DIR, "k_saturation.txt"))
+        k_maps = [k_map] * len(files)
+    taus_per_file = [None] * len(files)
 
-        match = folder_pattern.match(folder)
-        if not match:
-            continue
-        L = int(match.group(1))
-        beta = float(match.group(2))
+    # prima si servono dalla cache i file non cambiati, poi si analizzano solo quelli nuovi o modificati
+    tables_per_file = [None] * len(files)
+    if cache is not None:
+        with stage("cache_lookup"):
+            for i, (_, _, file_path) in enumerate(files):
+                if k_from_tau:
+                    taus_per_file[i] = cache.get_meta(file_path, "tau_int")
+                    # voci scritte prima che si salvasse la convergenza della finestra: si ricalcolano
+                    if taus_per_file[i] is not None and any(len(r) < 4 for r in taus_per_file[i]["taus"].values()):
+                        taus_per_file[i] = None
+                    if taus_per_file[i] is not None:
+                        k_maps[i] = k_map_from_tau(taus_per_file[i]["taus"], taus_per_file[i]["N"])
+                if k_maps[i] is not None:
+                    tables_per_file[i] = cache.get(file_path, required_ks(k_maps[i]))
+                if tables_per_file[i] is not None:
+                    print(f"Dalla cache {file_path}")
 
-        all_files = [f for f in os.listdir(full_folder) if version_pattern.search(f)]
-        if not all_files:
-            continue
+    missing = [i for i, tables in enumerate(tables_per_file) if tables is None]
+    tasks = [(files[i][2], k_maps[i], taus_per_file[i], cache is not None) for i in missing]
 
-        versions = sorted(((int(version_pattern.search(f).group(1)), f) for f in all_files), key=lambda x: x[0])
-        _, file_name = versions[-1]
-        file_path = os.path.join(full_folder, file_name)
-
-        print(f"Analizzo {file_path}")
-        data = np.loadtxt(file_path)
-        m_values = data[:, 1]
-        e_values = data[:, 2]
-
-        row = [L, beta]
-
-        # variabili primarie
-        for name in primary_functions:
-            k = k_map.get(name)
-            try:
-                mean, err = blocking_with_k_blocks(m_values, k, primary_functions[name])
-                row.extend([mean, err])
-            except Exception:
-                row.extend([np.nan, np.nan])
-
-        # variabili secondarie
-        for name in secondary_observables:
-            k = k_map.get(name)
-            if name == "C":
-                source = e_values
+    if n_workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=enable if profiler.enabled else None) as pool:
+            computed = list(pool.map(_analysis_task, tasks, chunksize=1))
+    else:
+        computed = [_analysis_task(task) for task in tasks]
+
+    for i, (N, k_map, taus, tables, hashes, records) in zip(missing, computed):
+        profiler.merge(records)
+        tables_per_file[i], k_maps[i], taus_per_file[i] = tables, k_map, taus
+        if cache is not None:
+            if taus is not None:
+                cache.put(files[i][2], tables, N, hashes=hashes, tau_int=taus)
             else:
-                source = m_values
-            try:
-                mean, err = jackknife_secondary_estimate(source, *secondary_observables[name], k)
-                row.extend([mean, err])
-            except Exception:
-                row.extend([np.nan, np.nan])
+                cache.put(files[i][2], tables, N, hashes=hashes)
+    if cache is not None:
+        with stage("cache_save"):
+            cache.save()
 
-        rows.append(row)
+    rows = []
+    for (L, beta, file_path), tables, k_map in zip(files, tables_per_file, k_maps):
+        with stage("observables", file=os.path.basename(file_path)):
+            rows.append([L, beta] + observables_from_tables(tables, k_map))
 
     output_file = generate_unique_filename(OUTPUT_DIR)
     print(f"→ Salvo risultati in: {output_file}")
 
-    with open(output_file, "w") as f:
+    with stage("write"), open(output_file, "w") as f:
         header = [
             "L", "beta",
             "⟨m⟩", "err⟨m⟩", "⟨|m|⟩", "err⟨|m|⟩", "⟨m²⟩", "err⟨m²⟩",
@@ -135,6 +306,33 @@ def main():
             formatted = "\t".join(f"{x:.8f}" if isinstance(x, float) else str(x) for x in row)
             f.write(formatted + "\n")
 
+    # il nuovo file entra subito nell'archivio indicizzato dei risultati
+    # (import locale: observables_store usa le definizioni delle osservabili di questo modulo)
+    from observables_store import load_store
+    with stage("store"):
+        load_store(OUTPUT_DIR)
+
+    if profiler.enabled:
+        profiler.write(profile_path)
+        print(profiler.summary())
+        print(f"→ Report della strumentazione in: {profile_path}")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Analisi delle serie temporali in data-generation/results.")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="numero di processi per l'analisi in parallelo (0 = tutti i core)")
+    parser.add_argument("--no-cache", action="store_true", help="rianalizza tutti i file senza usare la cache")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024**2,
+                        help="dimensione massima della cache di analisi")
+    parser.add_argument("--k-saturation", action="store_true",
+                        help="usa i k di k_saturation.txt invece di sceglierli dai τ_int di ogni file")
+    parser.add_argument("--verify-cache", action="store_true",
+                        help="controlla l'hash completo di ogni file prima di usare la cache (anche con mtime invariato)")
+    parser.add_argument("--profile", metavar="REPORT", default=None,
+                        help="misura tempi, byte letti e memoria per stadio e per file; report JSON (o CSV se .csv)")
+    args = parser.parse_args()
+
+    main(n_workers=args.workers or os.cpu_count(), use_cache=not args.no_cache,
+         cache_max_bytes=int(args.cache_max_mb * 1024**2), k_from_tau=not args.k_saturation,
+         profile_path=args.profile, verify_cache=args.verify_cache)
\ No newline at end of file
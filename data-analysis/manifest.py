@@ -0,0 +1,221 @@
+""" Manifest persistente dell'albero results/L{L}_beta{beta}/..._v{N}.{txt,bin}.
+
+    Per ogni run si registrano L, beta, versione, dimensione, mtime e numero di righe; il manifest
+    si salva in results/.manifest.json e si aggiorna in modo incrementale: la cartella results si rilegge
+    solo se è cambiato il suo mtime (cartelle aggiunte o rimosse), e una cartella L*_beta* solo se è cambiato
+    il suo (file aggiunti, rimossi o rinominati). Nel caso normale costa una stat per cartella, senza listdir.
+
+    Un file riscritto sul posto non cambia l'mtime della cartella: refresh(check_files=True) controlla
+    anche dimensione e mtime di ogni file. Il numero di righe dei binari si legge dall'header; per i file
+    di testo si conta solo quando viene richiesto (row_count) e poi resta nel manifest.
+"""
+import os
+import re
+import json
+import argparse
+from binary_series import read_header, count_rows
+
+MANIFEST_NAME = ".manifest.json"
+MANIFEST_VERSION = 1
+
+folder_pattern = re.compile(r"^L(\d+)_beta([0-9.]+)$")
+version_pattern = re.compile(r"_v(\d+)\.(?:txt|bin)$")
+
+
+def _binary_rows(path):
+    try:
+        return read_header(path)["n_rows"]
+    except (OSError, ValueError):
+        return None
+
+
+class Manifest:
+    """
+    Manifest di una cartella results; con refresh=True all'apertura si aggiorna con lo stato su disco.
+    """
+
+    def __init__(self, results_dir, refresh=True):
+        self.results_dir = os.path.abspath(results_dir)
+        self.path = os.path.join(self.results_dir, MANIFEST_NAME)
+        self.data = self._load()
+        self.dirty = False
+        self.index = {}
+        if refresh:
+            self.refresh()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("format_version") == MANIFEST_VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {"format_version": MANIFEST_VERSION, "root_mtime": None, "folders": {}}
+
+    def save(self):
+        """ Scrittura atomica; se results non è scrivibile il manifest resta solo in memoria. """
+        if not self.dirty:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except OSError:
+            pass
+
+    def _scan_folder(self, folder_name, mtime):
+        match = folder_pattern.match(folder_name)
+        old_runs = (self.data["folders"].get(folder_name) or {}).get("runs", {})
+        runs = {}
+
+        with os.scandir(os.path.join(self.results_dir, folder_name)) as entries:
+            for entry in entries:
+                version = version_pattern.search(entry.name)
+                if not version or not entry.is_file():
+                    continue
+                st = entry.stat()
+                run = {"version": int(version.group(1)), "size": st.st_size, "mtime": st.st_mtime, "n_rows": None}
+                old = old_runs.get(entry.name)
+                if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime:
+                    run["n_rows"] = old["n_rows"]
+                elif entry.name.endswith(".bin"):
+                    run["n_rows"] = _binary_rows(entry.path)
+                runs[entry.name] = run
+
+        return {"L": int(match.group(1)), "beta": float(match.group(2)), "mtime": mtime, "runs": runs}
+
+    def _check_files(self, folder_name, folder):
+        for file_name, run in folder["runs"].items():
+            path = os.path.join(self.results_dir, folder_name, file_name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if st.st_size != run["size"] or st.st_mtime != run["mtime"]:
+                run.update(size=st.st_size, mtime=st.st_mtime,
+                           n_rows=_binary_rows(path) if file_name.endswith(".bin") else None)
+                self.dirty = True
+
+    def refresh(self, check_files=False):
+        folders = self.data["folders"]
+
+        root_mtime = os.stat(self.results_dir).st_mtime
+        if root_mtime != self.data["root_mtime"]:
+            with os.scandir(self.results_dir) as entries:
+                names = {entry.name for entry in entries if folder_pattern.match(entry.name) and entry.is_dir()}
+            for gone in set(folders) - names:
+                del folders[gone]
+            for new in names - set(folders):
+                folders[new] = None
+            self.data["root_mtime"] = root_mtime
+            self.dirty = True
+
+        for folder_name in list(folders):
+            try:
+                mtime = os.stat(os.path.join(self.results_dir, folder_name)).st_mtime
+            except FileNotFoundError:
+                del folders[folder_name]
+                self.dirty = True
+                continue
+            if folders[folder_name] is None or folders[folder_name]["mtime"] != mtime:
+                folders[folder_name] = self._scan_folder(folder_name, mtime)
+                self.dirty = True
+            elif check_files:
+                self._check_files(folder_name, folders[folder_name])
+
+        self.index = {(f["L"], round(f["beta"], 9)): name for name, f in folders.items()}
+        self.save()
+
+    def _folders(self, L=None):
+        return sorted(((f["L"], f["beta"], name, f) for name, f in self.data["folders"].items()
+                       if L is None or f["L"] == L), key=lambda x: x[:3])
+
+    @staticmethod
+    def _by_version(folder):
+        """ {versione: nome file}, con il .bin se la stessa versione esiste anche in testo (già convertita). """
+        per_version = {}
+        for file_name, run in folder["runs"].items():
+            v = run["version"]
+            if v not in per_version or file_name.endswith(".bin"):
+                per_version[v] = file_name
+        return per_version
+
+    def Ls(self):
+        return sorted({f["L"] for f in self.data["folders"].values()})
+
+    def folders_by_L(self):
+        """ {L: [(nome cartella, beta, path cartella), ...]} in ordine di beta. """
+        groups = {}
+        for L, beta, name, _ in self._folders():
+            groups.setdefault(L, []).append((name, beta, os.path.join(self.results_dir, name)))
+        return groups
+
+    def versions(self, folder_name):
+        """ [(versione, path)] di una cartella, in ordine di versione. """
+        folder = self.data["folders"][folder_name]
+        return [(v, os.path.join(self.results_dir, folder_name, f)) for v, f in sorted(self._by_version(folder).items())]
+
+    def runs(self, L=None):
+        """ Tutte le run (una per versione), come dizionari con L, beta, version, path, size, mtime, n_rows. """
+        runs = []
+        for L_f, beta, name, folder in self._folders(L):
+            for v, file_name in sorted(self._by_version(folder).items()):
+                run = folder["runs"][file_name]
+                runs.append(dict(run, L=L_f, beta=beta, path=os.path.join(self.results_dir, name, file_name)))
+        return runs
+
+    def latest_files(self, L=None):
+        """ [(L, beta, path dell'ultima versione)] in ordine di (L, beta). """
+        latest = []
+        for L_f, beta, name, folder in self._folders(L):
+            per_version = self._by_version(folder)
+            if per_version:
+                latest.append((L_f, beta, os.path.join(self.results_dir, name, per_version[max(per_version)])))
+        return latest
+
+    def latest(self, L, beta):
+        """ Path dell'ultima versione per (L, beta), o None. """
+        name = self.index.get((L, round(beta, 9)))
+        if name is None:
+            return None
+        per_version = self._by_version(self.data["folders"][name])
+        if not per_version:
+            return None
+        return os.path.join(self.results_dir, name, per_version[max(per_version)])
+
+    def nearest_beta(self, L, target_beta):
+        """ (beta, path della cartella) della cartella di taglia L con beta più vicino a target_beta. """
+        folders = self._folders(L)
+        if not folders:
+            return None
+        _, beta, name, _ = min(folders, key=lambda f: abs(f[1] - target_beta))
+        return beta, os.path.join(self.results_dir, name)
+
+    def row_count(self, path):
+        """ Numero di righe di una run, dal manifest; per i file di testo si conta la prima volta. """
+        folder_name, file_name = os.path.split(os.path.relpath(os.path.abspath(path), self.results_dir))
+        run = self.data["folders"][folder_name]["runs"][file_name]
+        if run["n_rows"] is None:
+            run["n_rows"] = count_rows(path) if file_name.endswith(".txt") else _binary_rows(path)
+            self.dirty = True
+            self.save()
+        return run["n_rows"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggiorna e mostra il manifest di una cartella results.")
+    parser.add_argument("results_dir", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data-generation/results"))
+    parser.add_argument("--check-files", action="store_true", help="controlla anche dimensione e mtime di ogni file")
+    parser.add_argument("--rows", action="store_true", help="conta le righe dei file di testo non ancora contati")
+    args = parser.parse_args()
+
+    manifest = Manifest(args.results_dir, refresh=False)
+    manifest.refresh(check_files=args.check_files)
+    for run in manifest.runs():
+        n_rows = manifest.row_count(run["path"]) if args.rows else run["n_rows"]
+        print(f"L={run['L']:<4} beta={run['beta']:.6f}  v{run['version']:<3} {run['size']:>14} B  "
+              f"{n_rows if n_rows is not None else '?':>12} righe  {os.path.basename(run['path'])}")
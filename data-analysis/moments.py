@@ -0,0 +1,177 @@
+""" Accumulatore fuso dei momenti: si scorrono le serie m ed e una sola volta, a blocchi di chunk_size
+    elementi, e per ogni numero di blocchi k richiesto si costruisce la tabella (k, 6) delle somme per blocco di
+        m, |m|, m², m⁴, e, e²
+    Da questa tabella si ottengono tutte le osservabili primarie (blocking) e secondarie (jackknife),
+    senza rileggere la serie né ricalcolarne le potenze.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from jackknife import jackknife_from_block_sums
+from instrumentation import profiled
+
+MOMENTS = ("m", "|m|", "m²", "m⁴", "e", "e²")
+COLUMN = {name: i for i, name in enumerate(MOMENTS)}
+
+CHUNK_SIZE = 1 << 20
+CUMSUM_MIN_TABLES = 8
+
+
+def moment_powers(m_chunk, e_chunk):
+    """ Ritorna la matrice (n, 6) delle potenze di un pezzo di serie, nell'ordine di MOMENTS. """
+    m_chunk = np.asarray(m_chunk, dtype=float)
+    e_chunk = np.asarray(e_chunk, dtype=float)
+
+    powers = np.empty((len(m_chunk), len(MOMENTS)))
+    powers[:, 0] = m_chunk
+    np.abs(m_chunk, out=powers[:, 1])
+    np.multiply(m_chunk, m_chunk, out=powers[:, 2])
+    np.multiply(powers[:, 2], powers[:, 2], out=powers[:, 3])
+    powers[:, 4] = e_chunk
+    np.multiply(e_chunk, e_chunk, out=powers[:, 5])
+    return powers
+
+
+def _add_chunk_cumsum(tables, powers, start, N):
+    # con molti k: una sola somma cumulativa del pezzo, le somme per blocco sono differenze ai bordi dei blocchi
+    csum = np.empty((len(powers) + 1, powers.shape[1]))
+    csum[0] = 0
+    np.cumsum(powers, axis=0, out=csum[1:])
+    for k, table in tables.items():
+        M = N // k
+        stop = min(start + len(powers), M * k)
+        if start >= stop:
+            continue
+        first, last = start // M, (stop - 1) // M
+        edges = np.clip(np.arange(first, last + 2) * M, start, stop) - start
+        table[first:last + 1] += csum[edges[1:]] - csum[edges[:-1]]
+
+
+def add_chunk_to_tables(tables, powers, start, N):
+    """
+    Somma il pezzo di potenze che inizia all'indice start della serie nelle tabelle {k: (k, 6)}.
+    Come in blocking_with_k_blocks si usano solo i primi M * k elementi, con M = N // k.
+    Oltre CUMSUM_MIN_TABLES tabelle si passa dalla somma cumulativa del pezzo, che costa una passata
+    indipendentemente dal numero di k.
+    """
+    if len(tables) > CUMSUM_MIN_TABLES:
+        _add_chunk_cumsum(tables, powers, start, N)
+        return
+    for k, table in tables.items():
+        M = N // k
+        N_used = M * k
+        if start >= N_used:
+            continue
+        rows = powers[:min(len(powers), N_used - start)]
+
+        # indici (relativi al pezzo) in cui inizia un nuovo blocco
+        first_block = start // M
+        first_boundary = (first_block + 1) * M - start
+        starts = np.concatenate(([0], np.arange(first_boundary, len(rows), M)))
+
+        sums = np.add.reduceat(rows, starts, axis=0)
+        table[first_block:first_block + len(sums)] += sums
+
+
+def _empty_tables(N, ks):
+    tables = {}
+    for k in set(ks):
+        if k < 2 or k > N: # controllo
+            raise ValueError(f"Numero di blocchi non valido: k={k}, deve essere 2 <= k <= {N}")
+        tables[k] = np.zeros((k, len(MOMENTS)))
+    return tables
+
+
+def prefetched(chunks):
+    """ Itera su chunks leggendo il pezzo successivo in un thread mentre si elabora quello corrente. """
+    chunks = iter(chunks)
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        pending = reader.submit(next, chunks, None)
+        while True:
+            chunk = pending.result()
+            if chunk is None:
+                return
+            pending = reader.submit(next, chunks, None)
+            yield chunk
+
+
+def _read_chunk(m, e, start, stop):
+    # np.array forza la lettura (page-in) del pezzo di memmap; la copia rilascia il GIL
+    return np.array(m[start:stop], dtype=float), np.array(e[start:stop], dtype=float)
+
+
+@profiled("block_sums")
+def accumulate_block_sums(m, e, ks, chunk_size=CHUNK_SIZE, prefetch=True, n_rows=None):
+    """
+    Una sola passata su m ed e (array o memmap della stessa lunghezza) per tutti i k in ks;
+    con n_rows si usano solo i primi n_rows elementi, senza affettare (e copiare) le colonne.
+    Con prefetch=True la lettura del pezzo successivo avviene in un thread mentre si elabora quello corrente,
+    quindi in memoria ci sono al più due pezzi alla volta.
+    Ritorna un dizionario k -> (tabella delle somme per blocco (k, 6), M = elementi per blocco).
+    """
+    N = len(m)
+    if len(e) != N:
+        raise ValueError("Le serie m ed e devono avere la stessa lunghezza.")
+    if n_rows is not None:
+        N = min(N, n_rows)
+
+    tables = _empty_tables(N, ks)
+
+    starts = list(range(0, N, chunk_size))
+    if not prefetch or len(starts) < 2:
+        for start in starts:
+            stop = min(start + chunk_size, N)
+            powers = moment_powers(m[start:stop], e[start:stop])
+            add_chunk_to_tables(tables, powers, start, N)
+        return {k: (table, N // k) for k, table in tables.items()}
+
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        pending = reader.submit(_read_chunk, m, e, 0, min(chunk_size, N))
+        for i, start in enumerate(starts):
+            m_chunk, e_chunk = pending.result()
+            if i + 1 < len(starts):
+                next_start = starts[i + 1]
+                pending = reader.submit(_read_chunk, m, e, next_start, min(next_start + chunk_size, N))
+            powers = moment_powers(m_chunk, e_chunk)
+            add_chunk_to_tables(tables, powers, start, N)
+
+    return {k: (table, N // k) for k, table in tables.items()}
+
+
+@profiled("block_sums")
+def accumulate_block_sums_chunks(chunks, N, ks):
+    """
+    Come accumulate_block_sums, dai pezzi consecutivi (m, e) di una serie di N elementi
+    (es. binary_series.iter_chunks): in memoria c'è solo il pezzo corrente.
+    """
+    tables = _empty_tables(N, ks)
+    start = 0
+    for m_chunk, e_chunk in chunks:
+        add_chunk_to_tables(tables, moment_powers(m_chunk, e_chunk), start, N)
+        start += len(m_chunk)
+    if start != N:
+        raise ValueError(f"Letti {start} elementi, attesi {N}.")
+    return {k: (table, N // k) for k, table in tables.items()}
+
+
+def primary_from_table(table, M, moment):
+    """ Media e errore di blocking di un momento, come blocking_with_k_blocks. """
+    k = table.shape[0]
+    block_means = table[:, COLUMN[moment]] / M # media degli elementi nei singoli blocchi
+    mean_F = np.mean(block_means)
+
+    squared_diffs = np.sum((block_means - mean_F)**2)
+    error = np.sqrt(squared_diffs / (k * (k - 1)))
+
+    return mean_F, error
+
+
+def secondary_from_table(table, M, moments, secondary_func):
+    """ Media e errore jackknife di f(<F1>, ..., <Fn>) con Fi scelti tra MOMENTS. """
+    columns = [COLUMN[name] for name in moments]
+    return jackknife_from_block_sums(table[:, columns], M, secondary_func)
+
+
+def replica_means_from_table(table, M):
+    """ Medie dei momenti delle repliche jackknife leave-one-block-out, (k, 6). """
+    k = table.shape[0]
+    return (table.sum(axis=0) - table) / ((k - 1) * M)
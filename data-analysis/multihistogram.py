@@ -0,0 +1,301 @@
+""" Reweighting a istogrammi multipli (WHAM, Ferrenberg–Swendsen 1989): tutte le run di una stessa L,
+    simulate ai beta β_j, si combinano in un'unica stima della densità degli stati
+        Ω(E) = sum_j N_j(E) / D(E),     D(E) = sum_j n_j exp(f_j - β_j E),     exp(-f_j) = sum_E Ω(E) exp(-β_j E)
+    con N_j(E) l'istogramma dell'energia totale (intera) della run j e n_j il suo numero di misure.
+
+    Le energie libere f_j sono il minimo della funzione convessa
+        Φ(f) = sum_E N(E) log D(E) - sum_j n_j f_j,         N(E) = sum_j N_j(E)
+    il cui punto stazionario sono proprio le equazioni sopra: si minimizza con il metodo di Newton
+    (gradiente e hessiana R x R in forma chiusa, R = numero di run), tutto in scala logaritmica e vettorizzato
+    sulle run, fissando f_0 = 0. Il punto di partenza è una soluzione precedente oppure la catena delle stime
+    a istogramma singolo tra run consecutive.
+
+    Se le run hanno tempi di autocorrelazione diversi ognuna si pesa con 1/g_j, g_j = 1 + 2 τ_int(e).
+    Errori jackknife: ogni run è divisa in k blocchi e si toglie lo stesso blocco da tutte le run;
+    le repliche ripartono dalla soluzione completa, quindi bastano poche iterazioni di Newton.
+
+    Come il reweighting a istogramma singolo, le equazioni valgono per run campionate con exp(-beta E):
+    load_runs rifiuta le serie che non dichiarano boltzmann_sign = -1 (reweighting.check_boltzmann_sign),
+    quindi non si combinano run generate con convenzioni diverse.
+"""
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from moments import MOMENTS
+from binary_series import load_columns, resolve_series_path
+from reweighting import (energy_histograms, series_parameters, observables_from_replica_means, HIST_COLUMNS,
+                         check_boltzmann_sign)
+from autocorrelation import integrated_times_file
+from manifest import Manifest
+from main import primary_observables, secondary_observables, RESULTS_DIR, OUTPUT_DIR
+from utils import generate_unique_filename
+
+
+def _logsumexp(a, axis):
+    a_max = np.max(a, axis=axis, keepdims=True)
+    a_max = np.where(np.isfinite(a_max), a_max, 0.0)
+    return np.squeeze(a_max, axis=axis) + np.log(np.sum(np.exp(a - a_max), axis=axis))
+
+
+def _histogram_task(task):
+    file_path, k = task
+    file_path = resolve_series_path(file_path)
+    L, beta = series_parameters(file_path)
+    m, e = load_columns(file_path, ("m", "e"))
+    E_values, H = energy_histograms(m, e, L, k)
+    return L, beta, E_values, H
+
+
+def load_runs(file_paths, k=20, n_workers=1):
+    """
+    Istogrammi per blocco di tutte le run di una stessa L. Ritorna un dizionario con
+        L, k, betas (R,) in ordine crescente, E (n_E,) energie visitate da almeno una run,
+        idx: per ogni run le posizioni in E delle sue energie,
+        H: per ogni run gli istogrammi (k, n_E della run, 7) di reweighting.energy_histograms.
+    Ogni run tiene solo le sue energie, quindi la memoria non cresce con R x (energie di tutte le run).
+    """
+    for path in file_paths:
+        check_boltzmann_sign(resolve_series_path(path))
+
+    tasks = [(path, k) for path in file_paths]
+    if n_workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_histogram_task, tasks, chunksize=1))
+    else:
+        results = [_histogram_task(task) for task in tasks]
+
+    Ls = {L for L, _, _, _ in results}
+    if len(Ls) != 1:
+        raise ValueError(f"Le run da combinare devono avere la stessa L, trovate: {sorted(Ls)}")
+    results.sort(key=lambda r: r[1])
+
+    E = np.unique(np.concatenate([E_values for _, _, E_values, _ in results]))
+    return {
+        "L": Ls.pop(),
+        "k": k,
+        "betas": np.array([beta for _, beta, _, _ in results]),
+        "E": E,
+        "idx": [np.searchsorted(E, E_values) for _, _, E_values, _ in results],
+        "H": [H for _, _, _, H in results],
+    }
+
+
+def statistical_inefficiencies(file_paths):
+    """ g_j = 1 + 2 τ_int dell'energia per ogni run (stesso ordine di file_paths). """
+    g = []
+    for path in file_paths:
+        results, _ = integrated_times_file(path, series=("e",))
+        g.append(1 + 2 * results["e"][0])
+    return np.array(g)
+
+
+def _totals(runs, g=None, drop=None):
+    """
+    Somme su tutte le run, ognuna pesata 1/g_j: ritorna n (R,) misure efficaci, N (n_E,) istogramma totale
+    e S (n_E, 6) somme dei momenti per energia. drop: blocco da togliere a tutte le run (replica jackknife).
+    """
+    R = len(runs["H"])
+    g = np.ones(R) if g is None else np.asarray(g, dtype=float)
+    n = np.empty(R)
+    sums = np.zeros((len(runs["E"]), len(HIST_COLUMNS)))
+
+    for j, (idx, H) in enumerate(zip(runs["idx"], runs["H"])):
+        h = H.sum(axis=0)
+        if drop is not None:
+            h -= H[drop]
+        h /= g[j]
+        n[j] = h[:, 0].sum()
+        sums[idx] += h # le energie di una run sono distinte, nessun indice ripetuto
+
+    return n, sums[:, 0], sums[:, 1:]
+
+
+def _log_denominator(E, n, betas, f):
+    """ log D(E) = log sum_j n_j exp(f_j - β_j E), vettorizzato su run ed energie. """
+    return _logsumexp(np.log(n)[:, None] + f[:, None] - np.outer(betas, E), axis=0)
+
+
+def initial_free_energies(runs):
+    """
+    Punto di partenza per le f_j: catena di stime a istogramma singolo tra run consecutive,
+        f_{j+1} - f_j = -log ⟨exp(-(β_{j+1} - β_j) E)⟩_j
+    """
+    betas = runs["betas"]
+    f = np.zeros(len(betas))
+    for j in range(len(betas) - 1):
+        counts = runs["H"][j][:, :, 0].sum(axis=0)
+        E_j = runs["E"][runs["idx"][j]]
+        log_avg = _logsumexp(np.log(counts) - (betas[j + 1] - betas[j]) * E_j, axis=0) - np.log(counts.sum())
+        f[j + 1] = f[j] - log_avg
+    return f
+
+
+def free_energies(E, N, n, betas, f_init=None, tol=1e-9, max_iter=100):
+    """
+    Energie libere f_j (con f_0 = 0) che minimizzano Φ(f), con Newton e ricerca lineare all'indietro.
+    Convergenza quando |∂Φ/∂f_j| < tol n_j per ogni run, cioè quando ogni run è riprodotta dalla
+    densità degli stati con precisione relativa tol.
+    """
+    visited = N > 0
+    E, N = E[visited], N[visited]
+    f = np.zeros(len(betas)) if f_init is None else np.array(f_init, dtype=float)
+    f -= f[0]
+
+    def objective(f):
+        A = np.log(n)[:, None] + f[:, None] - np.outer(betas, E)
+        log_D = _logsumexp(A, axis=0)
+        return N @ log_D - n @ f, A, log_D
+
+    phi, A, log_D = objective(f)
+    for _ in range(max_iter):
+        w = np.exp(A - log_D) # w[j, E]: frazione di D(E) dovuta alla run j
+        grad = w @ N - n
+        if np.all(np.abs(grad[1:]) < tol * n[1:]):
+            return f
+
+        hess = np.diag(w @ N) - (w * N) @ w.T
+        step = np.zeros_like(f)
+        try:
+            step[1:] = np.linalg.solve(hess[1:, 1:], -grad[1:])
+        except np.linalg.LinAlgError:
+            raise ValueError("WHAM: hessiana singolare, gli istogrammi delle run non si sovrappongono.")
+
+        # lontano dal minimo il passo pieno può aumentare Φ: si dimezza finché non decresce
+        # (con una tolleranza sugli arrotondamenti, Φ è una somma di termini grandi)
+        t = 1.0
+        while True:
+            new_phi, new_A, new_log_D = objective(f + t * step)
+            if new_phi <= phi + 1e-4 * t * (grad @ step) + 1e-12 * abs(phi) or t < 1e-8:
+                break
+            t /= 2
+        f = f + t * step
+        phi, A, log_D = new_phi, new_A, new_log_D
+
+    raise RuntimeError(f"WHAM: le energie libere non convergono in {max_iter} iterazioni.")
+
+
+def solve(runs, g=None, f_init=None, jackknife=True, tol=1e-9):
+    """
+    Soluzione WHAM per le run di load_runs: dizionario con runs, g, f (R,) e, se jackknife,
+    f_jk (k, R) delle repliche senza il blocco b-esimo. f_init: soluzione precedente da cui ripartire.
+    """
+    n, N, _ = _totals(runs, g)
+    if f_init is None:
+        f_init = initial_free_energies(runs)
+    f = free_energies(runs["E"], N, n, runs["betas"], f_init, tol)
+
+    f_jk = None
+    if jackknife:
+        f_jk = np.empty((runs["k"], len(f)))
+        for b in range(runs["k"]):
+            n_b, N_b, _ = _totals(runs, g, drop=b)
+            f_jk[b] = free_energies(runs["E"], N_b, n_b, runs["betas"], f, tol)
+
+    return {"runs": runs, "g": g, "f": f, "f_jk": f_jk}
+
+
+def log_density_of_states(solution):
+    """ (E, log Ω(E)) sulle energie visitate, a meno di una costante additiva. """
+    runs = solution["runs"]
+    n, N, _ = _totals(runs, solution["g"])
+    return runs["E"], np.log(N) - _log_denominator(runs["E"], n, runs["betas"], solution["f"])
+
+
+def _moment_means(E, n, N, S, run_betas, f, betas):
+    """
+    Medie dei momenti (n_beta, 6) ai beta richiesti:
+        ⟨O⟩_β = sum_E S_O(E) exp(-β E) / D(E)  /  sum_E N(E) exp(-β E) / D(E)
+    con i pesi di ogni beta riscalati per il loro massimo (log-sum-exp).
+    """
+    visited = N > 0
+    E, N, S = E[visited], N[visited], S[visited]
+    log_w = -np.outer(betas, E) - _log_denominator(E, n, run_betas, f)
+    log_w -= log_w.max(axis=1, keepdims=True)
+    w = np.exp(log_w)
+    return (w @ S) / (w @ N)[:, None]
+
+
+def moment_means(solution, betas):
+    """ Medie dei momenti (n_beta, 6) con tutti i dati, senza errori. """
+    runs = solution["runs"]
+    n, N, S = _totals(runs, solution["g"])
+    betas = np.atleast_1d(np.asarray(betas, dtype=float))
+    return _moment_means(runs["E"], n, N, S, runs["betas"], solution["f"], betas)
+
+
+def replica_means(solution, betas):
+    """ Medie dei momenti delle repliche jackknife, (k, n_beta, 6). """
+    runs = solution["runs"]
+    if solution["f_jk"] is None:
+        raise ValueError("Soluzione WHAM senza repliche jackknife: usare solve(..., jackknife=True).")
+    betas = np.atleast_1d(np.asarray(betas, dtype=float))
+
+    means = np.empty((runs["k"], len(betas), len(MOMENTS)))
+    for b, f in enumerate(solution["f_jk"]):
+        n, N, S = _totals(runs, solution["g"], drop=b)
+        means[b] = _moment_means(runs["E"], n, N, S, runs["betas"], f, betas)
+    return means
+
+
+def observable_values(means, name):
+    """ Valori dell'osservabile name (nomi di main.py) dalle medie dei momenti (..., 6). """
+    column = {mom: i for i, mom in enumerate(MOMENTS)}
+    if name in primary_observables:
+        return means[..., column[primary_observables[name]]]
+    moments, secondary_func = secondary_observables[name]
+    return secondary_func(*(means[..., column[mom]] for mom in moments))
+
+
+def wham_curves(solution, betas):
+    """ Curve continue di tutte le osservabili di main.py: {nome: (medie (n_beta,), errori (n_beta,))}. """
+    return observables_from_replica_means(replica_means(solution, betas))
+
+
+def solve_L(L, results_dir=RESULTS_DIR, k=20, n_workers=1, use_tau=False, f_init=None):
+    """ Soluzione WHAM con l'ultima versione delle run di tutti i beta di una data L. """
+    file_paths = [resolve_series_path(path) for _, _, path in Manifest(results_dir).latest_files(L)]
+    if len(file_paths) < 2:
+        raise ValueError(f"Servono almeno due run per L={L} in {results_dir}")
+
+    runs = load_runs(file_paths, k, n_workers)
+    g = None
+    if use_tau:
+        # load_runs ordina per beta: si riordinano i file allo stesso modo
+        order = np.argsort([series_parameters(path)[1] for path in file_paths])
+        g = statistical_inefficiencies([file_paths[i] for i in order])
+    return solve(runs, g, f_init)
+
+
+def beta_grid(solution, n_betas=401):
+    """ Griglia densa sull'intervallo dei beta simulati (fuori dagli istogrammi il WHAM non è affidabile). """
+    betas = solution["runs"]["betas"]
+    return np.linspace(betas[0], betas[-1], n_betas)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Curve continue delle osservabili di una L dal WHAM su tutti i beta.")
+    parser.add_argument("L", type=int, nargs="+", help="taglie da analizzare")
+    parser.add_argument("--k", type=int, default=20, help="numero di blocchi jackknife per run")
+    parser.add_argument("--n-betas", type=int, default=401, help="punti della griglia in beta")
+    parser.add_argument("--tau", action="store_true", help="pesa le run con 1 / (1 + 2 τ_int(e))")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="processi per leggere le run (0 = tutti i core)")
+    args = parser.parse_args()
+
+    names = list(primary_observables) + list(secondary_observables)
+    for L in args.L:
+        solution = solve_L(L, k=args.k, n_workers=args.workers or os.cpu_count(), use_tau=args.tau)
+        betas = beta_grid(solution, args.n_betas)
+        curves = wham_curves(solution, betas)
+
+        output_dir = os.path.join(OUTPUT_DIR, f"L{L}")
+        os.makedirs(output_dir, exist_ok=True)
+        output_file = generate_unique_filename(output_dir, base_name="wham")
+        print(f"→ L={L}: salvo le curve WHAM in {output_file}")
+
+        with open(output_file, "w") as f:
+            header = ["beta"] + [col for name in names for col in (name, "err" + name)]
+            f.write("# " + "\t".join(header) + "\n")
+            for i, beta in enumerate(betas):
+                values = [x for name in names for x in (curves[name][0][i], curves[name][1][i])]
+                f.write("\t".join(f"{x:.8f}" for x in [beta] + values) + "\n")
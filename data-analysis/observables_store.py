@@ -0,0 +1,240 @@
+""" Archivio colonnare dei risultati di analisi (observables_vN.txt), indicizzato per (L, beta, osservabile, versione).
+
+    Ogni colonna (L, beta, version, observable, value, error) è un file binario a sé, aggiunto in coda
+    senza riscrivere i dati già presenti e letto con np.memmap: le colonne sono viste NumPy senza copie.
+    meta.json tiene il numero di righe valide (aggiornato per ultimo, quindi un'aggiunta interrotta
+    viene semplicemente ignorata), i nomi delle osservabili e i file già importati (dimensione e mtime).
+
+    All'apertura si costruisce in memoria un dizionario (L, beta, osservabile) -> riga dell'ultima versione,
+    quindi la ricerca dell'ultima versione è O(1); curve(L, osservabile) dà tutti i beta di una L insieme.
+
+    Si importano i due formati di file presenti in analyzed_results/:
+    - observables_vN.txt scritti da main.py (colonne L, beta, poi valore ed errore di ogni osservabile
+      nell'ordine di main.primary_observables e main.secondary_observables);
+    - L*/observables_vN.txt scritti da FSS.py (beta, poi valore ed errore di ⟨m⟩, ⟨|m|⟩, V χ′, V χ, V C
+      e ⟨m⁴⟩/⟨m²⟩²).
+    Le due famiglie di file hanno numerazioni delle versioni indipendenti, quindi ogni osservabile è
+    identificata dalla coppia (formato, nome): le versioni si confrontano solo all'interno dello stesso formato.
+    A parità di versione vale la riga aggiunta per ultima.
+"""
+import os
+import re
+import json
+import argparse
+from collections import defaultdict
+import numpy as np
+from main import primary_observables, secondary_observables, OUTPUT_DIR
+
+STORE_COLUMNS = (
+    ("L", "<i4"),
+    ("beta", "<f8"),
+    ("version", "<i4"),
+    ("observable", "<i4"),
+    ("value", "<f8"),
+    ("error", "<f8"),
+)
+
+# osservabili dei due formati, nell'ordine delle colonne (valore, errore)
+MAIN_COLUMNS = list(primary_observables) + list(secondary_observables)
+PER_L_COLUMNS = ["⟨m⟩", "⟨|m|⟩", "Vχ′", "Vχ", "VC", "⟨m⁴⟩/⟨m²⟩²"]
+LAYOUTS = {"main": MAIN_COLUMNS, "per_L": PER_L_COLUMNS}
+
+DEFAULT_STORE_DIR = os.path.join(OUTPUT_DIR, "observables_store")
+
+observables_pattern = re.compile(r"^observables_v(\d+)\.txt$")
+L_folder_pattern = re.compile(r"^L(\d+)$")
+
+
+def _beta_key(beta):
+    # i beta arrivano da file di testo con 8 decimali: si confrontano arrotondati
+    return round(float(beta), 8)
+
+
+class ObservablesStore:
+    """
+    Archivio in store_dir; i dati si leggono dalle colonne memmap in self.columns.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        self.meta_file = os.path.join(store_dir, "meta.json")
+        os.makedirs(store_dir, exist_ok=True)
+
+        meta = {"n_rows": 0, "observables": [], "sources": {}}
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file) as f:
+                meta = json.load(f)
+        self.n_rows = meta["n_rows"]
+        self.observables = meta["observables"]
+        self.sources = meta["sources"]
+        self._open()
+
+    def _column_file(self, name):
+        return os.path.join(self.store_dir, f"{name}.bin")
+
+    def _open(self):
+        self.columns = {}
+        for name, dtype in STORE_COLUMNS:
+            if self.n_rows > 0:
+                self.columns[name] = np.memmap(self._column_file(name), dtype=dtype, mode="r", shape=(self.n_rows,))
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Un ordinamento per (L, beta, osservabile, versione, riga): l'ultima riga di ogni gruppo (L, beta, osservabile)
+        è quella dell'ultima versione.
+        """
+        self.index = {}
+        self.curves = {}
+        if self.n_rows == 0:
+            return
+
+        c = self.columns
+        order = np.lexsort((np.arange(self.n_rows), c["version"], c["observable"], c["beta"], c["L"]))
+        L, beta, obs = c["L"][order], c["beta"][order], c["observable"][order]
+        last = np.ones(self.n_rows, dtype=bool)
+        last[:-1] = (L[1:] != L[:-1]) | (beta[1:] != beta[:-1]) | (obs[1:] != obs[:-1])
+
+        curves = defaultdict(list)
+        for row in order[last]:
+            L_row, obs_row = int(c["L"][row]), int(c["observable"][row])
+            self.index[(L_row, _beta_key(c["beta"][row]), obs_row)] = row
+            curves[(L_row, obs_row)].append(row) # già in ordine di beta crescente
+        self.curves = {key: np.array(rows) for key, rows in curves.items()}
+
+    def _save_meta(self):
+        tmp = self.meta_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"n_rows": self.n_rows, "observables": self.observables, "sources": self.sources},
+                      f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.meta_file)
+
+    def observable_id(self, name, layout="per_L", create=False):
+        key = f"{layout}:{name}"
+        if key not in self.observables:
+            if not create:
+                raise KeyError(f"Osservabile '{name}' del formato {layout} non presente nell'archivio")
+            self.observables.append(key)
+        return self.observables.index(key)
+
+    def append(self, L, betas, version, layout, values, errors, source=None):
+        """
+        Aggiunge in coda i risultati di una tabella: L e betas (n,), values ed errors (n, osservabili del formato).
+        Ogni colonna si estende sul suo file, poi si aggiorna meta.json.
+        """
+        names = LAYOUTS[layout]
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        errors = np.atleast_2d(np.asarray(errors, dtype=float))
+        n, n_obs = values.shape
+        if n_obs != len(names) or errors.shape != values.shape:
+            raise ValueError("values ed errors devono avere forma (righe, numero di osservabili).")
+
+        ids = [self.observable_id(name, layout, create=True) for name in names]
+        new_rows = {
+            "L": np.repeat(np.broadcast_to(L, n), n_obs),
+            "beta": np.repeat(np.broadcast_to(betas, n), n_obs),
+            "version": np.full(n * n_obs, version),
+            "observable": np.tile(ids, n),
+            "value": values.ravel(),
+            "error": errors.ravel(),
+        }
+
+        self.columns = {} # chiude le memmap prima di scrivere
+        for name, dtype in STORE_COLUMNS:
+            path = self._column_file(name)
+            with open(path, "ab") as f:
+                # eventuali byte oltre n_rows vengono da un'aggiunta interrotta
+                f.truncate(self.n_rows * np.dtype(dtype).itemsize)
+                np.asarray(new_rows[name], dtype=dtype).tofile(f)
+
+        self.n_rows += n * n_obs
+        if source is not None:
+            self.sources[os.path.abspath(source)] = [os.path.getsize(source), os.path.getmtime(source)]
+        self._save_meta()
+        self._open()
+
+    def _is_ingested(self, path):
+        return self.sources.get(os.path.abspath(path)) == [os.path.getsize(path), os.path.getmtime(path)]
+
+    def ingest_file(self, path, layout, L=None):
+        """
+        Importa un file observables_vN.txt nel formato "main" (main.py) o "per_L" (FSS.py, serve L).
+        I file già importati e non modificati vengono saltati; ritorna True se il file è stato importato.
+        """
+        if self._is_ingested(path):
+            return False
+        version = int(observables_pattern.match(os.path.basename(path)).group(1))
+        data = np.loadtxt(path, comments="#", ndmin=2)
+
+        if layout == "main":
+            L_col, betas, first = data[:, 0].astype(int), data[:, 1], 2
+        elif layout == "per_L":
+            L_col, betas, first = np.full(len(data), L), data[:, 0], 1
+        else:
+            raise ValueError(f"Formato sconosciuto: {layout}")
+        n_columns = first + 2 * len(LAYOUTS[layout])
+        if data.shape[1] != n_columns:
+            raise ValueError(f"{path}: attese {n_columns} colonne, trovate {data.shape[1]}")
+
+        self.append(L_col, betas, version, layout, data[:, first::2], data[:, first + 1::2], source=path)
+        return True
+
+    def ingest_tree(self, root_dir=OUTPUT_DIR):
+        """
+        Importa i file nuovi o modificati di root_dir (formato main) e di root_dir/L*/ (formato per_L).
+        Ritorna il numero di file importati.
+        """
+        n_new = 0
+        if not os.path.isdir(root_dir):
+            return n_new
+        for name in sorted(os.listdir(root_dir)):
+            path = os.path.join(root_dir, name)
+            if observables_pattern.match(name) and os.path.isfile(path):
+                n_new += self.ingest_file(path, "main")
+                continue
+            match = L_folder_pattern.match(name)
+            if match and os.path.isdir(path):
+                for file_name in sorted(os.listdir(path)):
+                    if observables_pattern.match(file_name):
+                        n_new += self.ingest_file(os.path.join(path, file_name), "per_L", int(match.group(1)))
+        return n_new
+
+    def latest(self, L, beta, name, layout="per_L"):
+        """ (valore, errore) dell'ultima versione, in O(1). """
+        row = self.index[(int(L), _beta_key(beta), self.observable_id(name, layout))]
+        return float(self.columns["value"][row]), float(self.columns["error"][row])
+
+    def curve(self, L, name, layout="per_L"):
+        """ (betas, valori, errori) dell'ultima versione di ogni beta per una L, in ordine di beta. """
+        rows = self.curves.get((int(L), self.observable_id(name, layout)), np.empty(0, dtype=int))
+        return self.columns["beta"][rows], self.columns["value"][rows], self.columns["error"][rows]
+
+    def Ls(self, name=None, layout="per_L"):
+        """ Taglie presenti (con l'osservabile name, se dato). """
+        if name is None:
+            return sorted({L for L, _ in self.curves})
+        if f"{layout}:{name}" not in self.observables:
+            return []
+        obs = self.observable_id(name, layout)
+        return sorted(L for L, o in self.curves if o == obs)
+
+
+def load_store(root_dir=OUTPUT_DIR, store_dir=None):
+    """ Apre l'archivio di root_dir e importa i file observables_vN.txt nuovi o modificati. """
+    store = ObservablesStore(store_dir or os.path.join(root_dir, "observables_store"))
+    store.ingest_tree(root_dir)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archivio colonnare dei file observables_vN.txt.")
+    parser.add_argument("root", nargs="?", default=OUTPUT_DIR, help="cartella analyzed_results")
+    args = parser.parse_args()
+
+    store = ObservablesStore(os.path.join(args.root, "observables_store"))
+    n_new = store.ingest_tree(args.root)
+    print(f"Importati {n_new} file, {store.n_rows} righe, osservabili: {', '.join(store.observables)}")
+    for L in store.Ls():
+        print(f"L = {L}: {len({b for (L_row, b, _) in store.index if L_row == L})} beta")
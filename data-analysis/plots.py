@@ -1,15 +1,18 @@
 import os
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.spatial.distance import cdist
 from collections import defaultdict
 from blocking import blocking_with_k_blocks
 from jackknife import jackknife_secondary_estimate
+from binary_series import load_columns
+from binning import find_saturation
+from manifest import Manifest, folder_pattern
+from utils import file_label
 
 
 def plot_estimated_error_vs_k(data, k_min=2, k_max=50, func=lambda x: x,
                               secondary=False, primary_functions=None,
-                              secondary_function=None):
+                              secondary_function=None, show=True, save_path=None):
     """
     Plotta la deviazione standard stimata della media campionaria in funzione di k.
     Se secondary = False → blocking, altrimenti (se True) jackknife.
@@ -36,24 +39,36 @@ def plot_estimated_error_vs_k(data, k_min=2, k_max=50, func=lambda x: x,
                 continue
 
     # stima della saturazione
-    k_saturazione = None
-    for i in range(1, len(devst_means)):
-        delta = abs(devst_means[i] - devst_means[i - 1])
-        if devst_means[i - 1] != 0:
-            rel_delta = delta / abs(devst_means[i - 1])
-            if rel_delta < 0.01:
-                k_saturazione = ks[i]
-                break
+    k_saturazione = find_saturation(ks, devst_means)
+
+    plot_error_curve(ks, devst_means, show=show, save_path=save_path)
+
+    return k_saturazione
+
+
+def plot_error_curve(ks, devst_means, title="Deviazione standard vs k", k_saturazione=None, show=True, save_path=None):
+    """
+    Plotta una curva errore vs k già calcolata (es. da binning.error_scan).
+    Con show=False e save_path=None non apre nessuna finestra (modalità headless).
+    """
+    if not show and save_path is None:
+        return
 
     plt.figure(figsize=(7, 4))
     plt.plot(ks, devst_means, marker='o')
+    if k_saturazione is not None:
+        plt.axvline(k_saturazione, color='r', linestyle='--', label=f"k saturazione = {k_saturazione}")
+        plt.legend()
     plt.xlabel("Numero di blocchi k")
     plt.ylabel("Deviazione standard stimata della media campionaria")
-    plt.title("Deviazione standard vs k")
+    plt.title(title)
     plt.grid(True)
-    plt.show()
-
-    return k_saturazione
+    if save_path:
+        plt.savefig(save_path, bbox_inches="tight")
+    if show:
+        plt.show()
+    else:
+        plt.close()
 
 # plots per P(m)
 def extract_beta_from_foldername(foldername):
@@ -71,39 +86,31 @@ def extract_L_from_foldername(foldername):
         return None
 
 
-def find_closest_folders(base_dir, target_betas):
+def find_closest_folders(base_dir, target_betas, manifest=None):
     """
-    Cerca per ogni L le cartelle con β più vicino ai valori target.
+    Cerca per ogni L le cartelle con β più vicino ai valori target (dal manifest di base_dir).
     Ritorna un dizionario: L -> {beta_target: folder_path}
     """
-    folders = [f for f in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, f))]
-    L_groups = {}
-    for folder in folders:
-        L = extract_L_from_foldername(folder)
-        beta = extract_beta_from_foldername(folder)
-        if L is not None and beta is not None:
-            if L not in L_groups:
-                L_groups[L] = []
-            L_groups[L].append((beta, os.path.join(base_dir, folder)))
-
-    closest = {}
-    for L, beta_paths in L_groups.items():
-        betas = np.array([bp[0] for bp in beta_paths]).reshape(-1, 1)
-        target_betas_array = np.array(target_betas).reshape(-1, 1)
-        dists = cdist(betas, target_betas_array)
-        closest_indices = np.argmin(dists, axis=0)
-        closest[L] = {target_betas[i]: beta_paths[closest_indices[i]][1] for i in range(len(target_betas))}
-    return closest
-
-
-def get_highest_version_file(folder):
+    manifest = manifest or Manifest(base_dir)
+    return {L: {beta: manifest.nearest_beta(L, beta)[1] for beta in target_betas} for L in manifest.Ls()}
+
+
+def get_highest_version_file(folder, manifest=None):
     """
-    Ritorna il file con versione maggiore nella cartella, es. m_v3.txt > m_v2.txt.
+    Ritorna il file con versione maggiore nella cartella, es. m_v3.txt > m_v2.txt
+    (a parità di versione si preferisce il .bin convertito).
+    Per le cartelle L*_beta* di results si usa il manifest, senza listdir.
     """
-    txt_files = [f for f in os.listdir(folder) if f.endswith(".txt") and "_v" in f]
+    folder_name = os.path.basename(os.path.normpath(folder))
+    if manifest is not None or folder_pattern.match(folder_name):
+        manifest = manifest or Manifest(os.path.dirname(os.path.normpath(folder)))
+        versions = manifest.versions(folder_name)
+        return os.path.basename(versions[-1][1]) if versions else None
+
+    txt_files = [f for f in os.listdir(folder) if f.endswith((".txt", ".bin")) and "_v" in f]
     if not txt_files:
         return None
-    versions = sorted(txt_files, key=lambda x: int(x.split("_v")[-1].split(".")[0]), reverse=True)
+    versions = sorted(txt_files, key=lambda x: (int(x.split("_v")[-1].split(".")[0]), x.endswith(".bin")), reverse=True)
     return versions[0]
 
 
@@ -111,17 +118,16 @@ def plot_magnetization_histograms_two_subplots(results_dir, target_betas=[0.35,
     """
     Plotta due subplot: uno per β ≈ 0.35 e uno per β ≈ 0.5, con tutti i L in ciascuno.
     """
-    folders = find_closest_folders(results_dir, target_betas)
+    manifest = Manifest(results_dir)
     fig, axs = plt.subplots(1, 2, figsize=(12, 5), sharey=True)
 
     for ax, beta in zip(axs, target_betas):
-        for L, beta_dict in sorted(folders.items()):
-            folder = beta_dict[beta]
-            best_file = get_highest_version_file(folder)
+        for L in manifest.Ls():
+            beta_L, _ = manifest.nearest_beta(L, beta)
+            best_file = manifest.latest(L, beta_L)
             if not best_file:
                 continue
-            data = np.loadtxt(os.path.join(folder, best_file))
-            m_values = data[:, 1]
+            (m_values,) = load_columns(best_file, ("m",))
             label = f"L={L}"
             ax.hist(
                 m_values,
@@ -148,7 +154,8 @@ def plot_magnetization_histograms_two_subplots(results_dir, target_betas=[0.35,
 
 
 # collapse plots
-def plot_collapse_from_file(txt_path, beta_c=0.4406868, nu=1, gamma=1.75, beta_exp=0.125, save_path=None):
+def plot_collapse_from_file(txt_path, beta_c=0.4406868, nu=1, gamma=1.75, beta_exp=0.125, save_path=None,
+                            optimize=False, beta_range=None):
     """
     Plotta i collapse plots di:
       - χ' (suscettività ridotta)
@@ -156,33 +163,50 @@ def plot_collapse_from_file(txt_path, beta_c=0.4406868, nu=1, gamma=1.75, beta_e
       - χ  (suscettività tradizionale)
       - U  (cumulante di Binder)
 
-    dai file observables_vX.txt
+    dai file observables_vX.txt di main.py (colonne come in observables_store.MAIN_COLUMNS; χ′ e ⟨m²⟩
+    sono senza il fattore di volume, quindi si moltiplicano per L²).
+    Con optimize=True beta_c, nu e gamma si stimano dal collapse di χ′ e poi beta_exp da quello di ⟨|m|⟩
+    con beta_c e nu fissati (vedi collapse.py), invece di usare i valori passati.
     """
-    data = np.loadtxt(txt_path, comments="#")
+    from observables_store import MAIN_COLUMNS
+
+    if optimize:
+        from collapse import collapse_file
+        params, errs, S = collapse_file(txt_path, "χ′", beta_range)
+        beta_c, nu, gamma = params["beta_c"], 1 / params["inv_nu"], params["omega"] / params["inv_nu"]
+        print(f"Collapse di χ′: beta_c = {beta_c:.6f} ± {errs['beta_c']:.6f}, "
+              f"1/nu = {params['inv_nu']:.4f} ± {errs['inv_nu']:.4f}, "
+              f"gamma/nu = {params['omega']:.4f} ± {errs['omega']:.4f} (S = {S:.2f})")
+        params_m, errs_m, S_m = collapse_file(txt_path, "⟨|m|⟩", beta_range,
+                                              fixed={"beta_c": beta_c, "inv_nu": params["inv_nu"]})
+        beta_exp = params_m["omega"] * nu
+        print(f"Collapse di ⟨|m|⟩: beta/nu = {params_m['omega']:.4f} ± {errs_m['omega']:.4f} (S = {S_m:.2f})")
+
+    data = np.loadtxt(txt_path, comments="#", ndmin=2)
+
+    def column(name):
+        i = 2 + 2 * MAIN_COLUMNS.index(name)
+        return data[:, i], data[:, i + 1]
 
     L = data[:, 0]
     beta = data[:, 1]
-    abs_m = data[:, 4]
-    err_abs_m = data[:, 5]
-    chi_red = data[:, 10]
-    err_chi_red = data[:, 11]
-    chi = data[:, 8]
-    err_chi = data[:, 9]
-    U = data[:, 12]
-    err_U = data[:, 13]
+    abs_m, err_abs_m = column("⟨|m|⟩")
+    chi_red, err_chi_red = column("χ′")
+    chi, err_chi = column("⟨m²⟩")
+    U, err_U = column("U")
 
     # Asse x comune
     x = (beta - beta_c) * L**(1 / nu)
 
     # Scaling delle y
-    y_chi_red = chi_red * L**(-gamma / nu)
-    err_chi_red *= L**(-gamma / nu)
+    y_chi_red = chi_red * L**(2 - gamma / nu)
+    err_chi_red = err_chi_red * L**(2 - gamma / nu)
 
     y_m = abs_m * L**(beta_exp / nu)
-    err_abs_m *= L**(beta_exp / nu)
+    err_abs_m = err_abs_m * L**(beta_exp / nu)
 
-    y_chi = chi * L**(-gamma / nu)
-    err_chi *= L**(-gamma / nu)
+    y_chi = chi * L**(2 - gamma / nu)
+    err_chi = err_chi * L**(2 - gamma / nu)
 
     # U non scala, si usa direttamente
 
@@ -190,7 +214,7 @@ def plot_collapse_from_file(txt_path, beta_c=0.4406868, nu=1, gamma=1.75, beta_e
 
     axs[0, 0].errorbar(x, y_chi_red, yerr=err_chi_red, fmt='o', capsize=3)
     axs[0, 0].set_title(r"Collapse: $\chi'$")
-    axs[0, 0].set_ylabel(r"$\chi' \cdot L^{-\gamma/\nu}$")
+    axs[0, 0].set_ylabel(r"$L^2 \chi' \cdot L^{-\gamma/\nu}$")
 
     axs[0, 1].errorbar(x, y_m, yerr=err_abs_m, fmt='o', capsize=3)
     axs[0, 1].set_title(r"Collapse: $\langle |m| \rangle$")
@@ -198,7 +222,7 @@ def plot_collapse_from_file(txt_path, beta_c=0.4406868, nu=1, gamma=1.75, beta_e
 
     axs[1, 0].errorbar(x, y_chi, yerr=err_chi, fmt='o', capsize=3)
     axs[1, 0].set_title(r"Collapse: $\chi$")
-    axs[1, 0].set_ylabel(r"$\chi \cdot L^{-\gamma/\nu}$")
+    axs[1, 0].set_ylabel(r"$L^2 \langle m^2 \rangle \cdot L^{-\gamma/\nu}$")
 
     axs[1, 1].errorbar(x, U, yerr=err_U, fmt='o', capsize=3)
     axs[1, 1].set_title(r"Collapse: $U$ (Binder)")
@@ -208,7 +232,7 @@ def plot_collapse_from_file(txt_path, beta_c=0.4406868, nu=1, gamma=1.75, beta_e
         ax.set_xlabel(r"$(\beta - \beta_c) \cdot L^{1/\nu}$")
         ax.grid(True)
 
-    plt.suptitle("Data Collapse — Ising 2D ($\nu=1$, $\gamma=7/4$, $\beta=1/8$)")
+    plt.suptitle(f"Data Collapse — Ising 2D ($\\beta_c={beta_c:.5f}$, $\\nu={nu:.3f}$, $\\gamma={gamma:.3f}$, $\\beta={beta_exp:.3f}$)")
 
     if save_path:
         plt.savefig(save_path, bbox_inches="tight")
@@ -218,6 +242,15 @@ def plot_collapse_from_file(txt_path, beta_c=0.4406868, nu=1, gamma=1.75, beta_e
 
 
 
+# osservabili di plot_observables_vs_beta (una figura ciascuna)
+OBSERVABLES_VS_BETA = ["⟨m⟩", "⟨|m|⟩", "⟨ε⟩", "χ′", "χ", "U", "C"]
+
+
+def observables_figure_path(save_path_prefix, nome):
+    """ File della figura di nome vs beta: prefisso_absm.png per ⟨|m|⟩, prefisso_chip.png per χ′, ... """
+    return f"{save_path_prefix}_{file_label(nome)}.png"
+
+
 # plot delle osservabili
 def plot_observables_vs_beta(txt_path, save_path_prefix=None):
     """
@@ -243,15 +276,9 @@ def plot_observables_vs_beta(txt_path, save_path_prefix=None):
         gruppi[l].append(i)
 
     # Funzioni da plottare (nome, dati, errore)
-    osservabili = [
-        ("⟨m⟩", m, err_m),
-        ("⟨|m|⟩", abs_m, err_abs_m),
-        ("⟨ε⟩", e, err_e),
-        ("χ′", chi_red, err_chi_red),
-        ("χ", chi, err_chi),
-        ("U", U, err_U),
-        ("C", C, err_C),
-    ]
+    osservabili = zip(OBSERVABLES_VS_BETA,
+                      [m, abs_m, e, chi_red, chi, U, C],
+                      [err_m, err_abs_m, err_e, err_chi_red, err_chi, err_U, err_C])
 
     for nome, y, yerr in osservabili:
         plt.figure(figsize=(6, 4))
@@ -267,7 +294,7 @@ def plot_observables_vs_beta(txt_path, save_path_prefix=None):
         plt.grid(True)
         plt.legend()
         if save_path_prefix:
-            fname = f"{save_path_prefix}_{nome.replace('|', '').replace('⟨', '').replace('⟩', '').replace('′', 'p').replace('ε', 'eps')}.png"
+            fname = observables_figure_path(save_path_prefix, nome)
             plt.savefig(fname, bbox_inches="tight")
             print(f"→ Salvato: {fname}")
         else:
@@ -0,0 +1,244 @@
+""" Generazione non interattiva di tutte le figure (backend Agg), in parallelo su più processi.
+
+    Ogni figura (o gruppo di figure prodotte dalla stessa funzione) è un job:
+        {"name", "func": "modulo:funzione", "kwargs", "inputs": [file letti], "outputs": [file scritti]}
+    Lo stato dell'ultima generazione si salva in output_dir/.render_state.json: per ogni job un'impronta
+    di funzione, argomenti e (dimensione, mtime) dei file di input. Un job si rigenera solo se l'impronta
+    è cambiata o se manca uno dei suoi output (con --force sempre).
+
+    Figure prodotte:
+    - osservabili vs beta, dall'ultimo analyzed_results/observables_vN.txt (plots.plot_observables_vs_beta);
+    - collapse plot dallo stesso file (plots.plot_collapse_from_file);
+    - istogrammi P(m) (plots.plot_magnetization_histograms_two_subplots);
+    - curve errore vs k dell'ultima versione di ogni run (k_estimate.k_scan_file);
+    - osservabili per L e fit FSS da analyzed_results/L*/ (FSS.py e FSS_extract_critical_values.py).
+"""
+import os
+import time
+import json
+import hashlib
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg") # prima di importare pyplot, anche nei moduli di analisi
+
+from main import RESULTS_DIR, OUTPUT_DIR
+from manifest import Manifest
+from observables_store import load_store, observables_pattern, L_folder_pattern, PER_L_COLUMNS
+
+DEFAULT_FIGURES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "figures"))
+STATE_NAME = ".render_state.json"
+KINDS = ("observables", "collapse", "histograms", "k_curves", "fss")
+
+# nomi dei file delle osservabili per L (FSS.plot_observable_vs_beta)
+PER_L_FILE_NAMES = ["m", "absm", "Vchip", "Vchi", "VC", "binder_ratio"]
+
+
+def _latest_main_observables(analyzed_dir):
+    """ Path dell'ultimo observables_vN.txt scritto da main.py, o None. """
+    versions = []
+    if os.path.isdir(analyzed_dir):
+        for name in os.listdir(analyzed_dir):
+            match = observables_pattern.match(name)
+            if match:
+                versions.append((int(match.group(1)), os.path.join(analyzed_dir, name)))
+    return max(versions)[1] if versions else None
+
+
+def _per_L_files(analyzed_dir):
+    """ Tutti i file analyzed_results/L*/observables_vN.txt (ogni versione può cambiare l'ultima riga di un beta). """
+    paths = []
+    if os.path.isdir(analyzed_dir):
+        for name in sorted(os.listdir(analyzed_dir)):
+            folder = os.path.join(analyzed_dir, name)
+            if L_folder_pattern.match(name) and os.path.isdir(folder):
+                paths += [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if observables_pattern.match(f)]
+    return paths
+
+
+def _job(name, func, kwargs, inputs, outputs=()):
+    return {"name": name, "func": func, "kwargs": kwargs, "inputs": list(inputs), "outputs": list(outputs)}
+
+
+def collect_jobs(results_dir=RESULTS_DIR, analyzed_dir=OUTPUT_DIR, output_dir=DEFAULT_FIGURES_DIR, kinds=KINDS):
+    """ Lista dei job per i tipi di figura in kinds, con i file di input e di output di ognuno. """
+    jobs = []
+    main_file = _latest_main_observables(analyzed_dir)
+
+    if "observables" in kinds and main_file:
+        from plots import OBSERVABLES_VS_BETA, observables_figure_path
+        prefix = os.path.join(output_dir, "observables")
+        jobs.append(_job("observables", "plots:plot_observables_vs_beta",
+                         {"txt_path": main_file, "save_path_prefix": prefix},
+                         [main_file], [observables_figure_path(prefix, nome) for nome in OBSERVABLES_VS_BETA]))
+
+    if "collapse" in kinds and main_file:
+        save_path = os.path.join(output_dir, "collapse.png")
+        jobs.append(_job("collapse", "plots:plot_collapse_from_file",
+                         {"txt_path": main_file, "save_path": save_path}, [main_file], [save_path]))
+
+    manifest = Manifest(results_dir) if os.path.isdir(results_dir) else None
+
+    if "histograms" in kinds and manifest and manifest.Ls():
+        target_betas = [0.35, 0.5]
+        inputs = []
+        for L in manifest.Ls():
+            for beta in target_betas:
+                beta_L, _ = manifest.nearest_beta(L, beta)
+                inputs.append(manifest.latest(L, beta_L))
+        save_path = os.path.join(output_dir, "istogrammi_m.png")
+        jobs.append(_job("histograms", "plots:plot_magnetization_histograms_two_subplots",
+                         {"results_dir": results_dir, "target_betas": target_betas, "save_path": save_path},
+                         [p for p in inputs if p], [save_path]))
+
+    if "k_curves" in kinds and manifest:
+        from k_estimate import K_RANGE, error_curve_path
+        from binning import SCAN_OBSERVABLES
+        save_dir = os.path.join(output_dir, "errore_vs_k")
+        for L, beta, path in manifest.latest_files():
+            file_id = os.path.splitext(os.path.basename(path))[0]
+            jobs.append(_job(f"k_curves/{os.path.basename(path)}", "k_estimate:k_scan_file",
+                             {"path": path, "k_range": K_RANGE, "show": False, "save_dir": save_dir}, [path],
+                             [error_curve_path(save_dir, file_id, obs) for obs in SCAN_OBSERVABLES]))
+
+    per_L_files = _per_L_files(analyzed_dir)
+    if "fss" in kinds and per_L_files:
+        save_dir = os.path.join(output_dir, "fss")
+        for i, (label, file_name) in enumerate(zip(PER_L_COLUMNS, PER_L_FILE_NAMES)):
+            save_path = os.path.join(save_dir, f"{file_name}_vs_beta.png")
+            jobs.append(_job(f"fss/{file_name}", "FSS:plot_observable_vs_beta",
+                             {"root_dir": analyzed_dir, "observable_index": i, "observable_label": label,
+                              "ylabel": label, "save_path": save_path}, per_L_files, [save_path]))
+        jobs.append(_job("fss/fit", "render:fss_figures", {"root_dir": analyzed_dir, "save_dir": save_dir},
+                         per_L_files, [os.path.join(save_dir, "fig_5_5.png")]))
+
+    return jobs
+
+
+def fss_figures(root_dir, save_dir):
+    """ Fit dei picchi di χ′ per ogni L, fit di scaling di beta_pc e χ′_max, figura 5.5 e incroci di Binder. """
+    import numpy as np
+    from FSS_extract_critical_values import (extract_fit_data_all_L, fit_beta_pc_vs_L, fit_chi_max_vs_L,
+                                             estimate_betac_from_binder_crossings, plot_fig_5_5)
+
+    results = extract_fit_data_all_L(root_dir, save_dir=save_dir)
+    if results:
+        L, beta_pc, err_beta_pc, chi_max, err_chi_max = map(np.array, zip(*results))
+        plot_fig_5_5(L, beta_pc, err_beta_pc, chi_max, err_chi_max, save_path=os.path.join(save_dir, "fig_5_5.png"))
+        if len(L) >= 3:
+            fit_beta_pc_vs_L(L, beta_pc, err_beta_pc, plot=False,
+                             save_path=os.path.join(save_dir, "fit_beta_pc_vs_L.png"))
+            fit_chi_max_vs_L(L, chi_max, err_chi_max, plot=False,
+                             save_path=os.path.join(save_dir, "fit_chi_max_vs_L.png"))
+    estimate_betac_from_binder_crossings(root_dir, plot=False, save_path=os.path.join(save_dir, "incroci_binder.png"))
+
+
+def job_stamp(job):
+    """ Impronta di un job: funzione, argomenti e (dimensione, mtime) degli input; None se manca un input. """
+    stats = []
+    for path in job["inputs"]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stats.append((os.path.abspath(path), st.st_size, st.st_mtime))
+    payload = json.dumps([job["func"], job["kwargs"], stats], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def load_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, STATE_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_NAME)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+
+def is_up_to_date(job, state):
+    stamp = job_stamp(job)
+    return stamp is not None and state.get(job["name"]) == stamp and all(os.path.exists(p) for p in job["outputs"])
+
+
+def _render_task(job):
+    """ Esegue un job in un processo del pool; ritorna (nome, errore o None, secondi). """
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    error = None
+    try:
+        for key in ("save_dir", "save_path", "save_path_prefix"):
+            if key in job["kwargs"]:
+                target = job["kwargs"][key]
+                os.makedirs(target if key == "save_dir" else os.path.dirname(target), exist_ok=True)
+        module_name, func_name = job["func"].split(":")
+        getattr(importlib.import_module(module_name), func_name)(**job["kwargs"])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        plt.close("all")
+    return job["name"], error, time.perf_counter() - start
+
+
+def render(jobs, output_dir=DEFAULT_FIGURES_DIR, n_workers=None, force=False):
+    """
+    Genera le figure dei job non aggiornati con n_workers processi (default: numero di CPU).
+    Ritorna {"rendered": [...], "skipped": [...], "failed": {nome: errore}}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state = load_state(output_dir)
+    todo = [job for job in jobs if force or not is_up_to_date(job, state)]
+    stamps = {job["name"]: job_stamp(job) for job in todo}
+    report = {"rendered": [], "skipped": [job["name"] for job in jobs if job not in todo], "failed": {}}
+    if not todo:
+        return report
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        for name, error, seconds in pool.map(_render_task, todo):
+            if error is None:
+                state[name] = stamps[name]
+                report["rendered"].append(name)
+                print(f"[{seconds:6.2f} s] {name}")
+            else:
+                state.pop(name, None)
+                report["failed"][name] = error
+                print(f"[ERRORE] {name}: {error}")
+
+    save_state(output_dir, state)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera tutte le figure senza finestre, in parallelo.")
+    parser.add_argument("--results-dir", default=RESULTS_DIR, help="cartella con le serie temporali")
+    parser.add_argument("--analyzed-dir", default=OUTPUT_DIR, help="cartella analyzed_results")
+    parser.add_argument("--output-dir", default=DEFAULT_FIGURES_DIR, help="cartella delle figure")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="numero di processi (default: numero di CPU)")
+    parser.add_argument("--force", action="store_true", help="rigenera anche le figure aggiornate")
+    parser.add_argument("--only", nargs="+", choices=KINDS, default=KINDS, help="tipi di figura da generare")
+    parser.add_argument("--dry-run", action="store_true", help="elenca i job da rigenerare senza eseguirli")
+    args = parser.parse_args()
+
+    # l'archivio delle osservabili si aggiorna qui una volta sola: i processi del pool lo trovano
+    # già allineato e lo leggono soltanto, senza aggiunte concorrenti sugli stessi file
+    if os.path.isdir(args.analyzed_dir):
+        load_store(args.analyzed_dir)
+
+    jobs = collect_jobs(args.results_dir, args.analyzed_dir, args.output_dir, args.only)
+    if args.dry_run:
+        state = load_state(args.output_dir)
+        for job in jobs:
+            print(f"{'aggiornato ' if not args.force and is_up_to_date(job, state) else 'da generare'}  {job['name']}")
+    else:
+        report = render(jobs, args.output_dir, args.jobs, args.force)
+        print(f"\nGenerati {len(report['rendered'])}, già aggiornati {len(report['skipped'])}, "
+              f"falliti {len(report['failed'])} -> {args.output_dir}")
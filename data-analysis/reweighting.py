@@ -0,0 +1,195 @@
+""" Reweighting a istogramma singolo (Ferrenberg–Swendsen): da una sola serie (m, e) simulata a beta0
+    si stimano le osservabili a ogni beta vicino con i pesi
+        w_i(β) = exp(-(β - beta0) E_i),     E_i = e_i L² energia totale (intera sul reticolo)
+    ⟨O⟩_β = sum_i O_i w_i / sum_i w_i
+
+    Le energie sono intere, quindi per ogni blocco jackknife si costruisce l'istogramma in E delle somme
+    di 1, m, |m|, m², m⁴, e, e² (una passata sulla serie); i pesi si calcolano poi solo sui valori di E
+    e per tutti i beta insieme, sottraendo per ogni beta il massimo esponente (log-sum-exp) per stabilità.
+    Gli errori sono jackknife leave-one-block-out, come in main.py.
+
+    I pesi valgono per serie campionate con exp(-beta E): si controlla boltzmann_sign nell'header (o nei
+    commenti dei file di testo) e si rifiutano le serie che non lo dichiarano, come quelle scritte da
+    data-generation prima della correzione del segno di energy_difference (exp(+beta E)).
+"""
+import numpy as np
+from moments import MOMENTS, moment_powers
+from binary_series import (load_columns, read_header, resolve_series_path, is_binary, name_pattern,
+                           boltzmann_sign, BOLTZMANN_SIGN)
+from main import primary_observables, secondary_observables
+
+CHUNK_SIZE = 1 << 20
+
+# colonne dell'istogramma: 1 (conteggi) e poi i momenti nell'ordine di moments.MOMENTS
+HIST_COLUMNS = ("1",) + MOMENTS
+
+
+def integer_energies(e_chunk, V):
+    E = np.asarray(e_chunk, dtype=float) * V
+    E_int = np.rint(E)
+    if np.any(np.abs(E - E_int) > 0.1):
+        raise ValueError("Le energie totali e * L² non sono intere: il file non viene da un reticolo L x L?")
+    return E_int.astype(np.int64)
+
+
+def energy_histograms(m, e, L, k, chunk_size=CHUNK_SIZE):
+    """
+    Istogrammi per blocco delle somme dei momenti in funzione dell'energia totale.
+    Ritorna (valori di E (n_E,), H (k, n_E, 7)) con H[b, j, c] = sum su blocco b con E = E_j di HIST_COLUMNS[c].
+    """
+    V = L * L
+    N = len(m)
+    if k < 2 or k > N:
+        raise ValueError(f"Numero di blocchi non valido: k={k}, deve essere 2 <= k <= {N}")
+    M = N // k
+    N_used = M * k
+
+    # prima passata: intervallo delle energie visitate, per istogrammi compatti
+    E_min, E_max = None, None
+    for start in range(0, N_used, chunk_size):
+        E = integer_energies(e[start:min(start + chunk_size, N_used)], V)
+        E_min = E.min() if E_min is None else min(E_min, E.min())
+        E_max = E.max() if E_max is None else max(E_max, E.max())
+    n_bins = int(E_max - E_min) + 1
+
+    H = np.zeros((k, n_bins, len(HIST_COLUMNS)))
+    for b in range(k):
+        for start in range(b * M, (b + 1) * M, chunk_size):
+            stop = min(start + chunk_size, (b + 1) * M)
+            idx = integer_energies(e[start:stop], V) - E_min
+            powers = moment_powers(m[start:stop], e[start:stop])
+            H[b, :, 0] += np.bincount(idx, minlength=n_bins)
+            for c in range(powers.shape[1]):
+                H[b, :, c + 1] += np.bincount(idx, weights=powers[:, c], minlength=n_bins)
+
+    # si tengono solo le energie effettivamente visitate
+    visited = H[:, :, 0].sum(axis=0) > 0
+    E_values = (np.arange(n_bins) + E_min)[visited]
+    return E_values.astype(float), H[:, visited, :]
+
+
+def reweighted_block_sums(E_values, H, beta0, betas):
+    """
+    Somme pesate per blocco a tutti i beta: ritorna W (k, n_beta, 7), con i pesi di ogni beta
+    divisi per lo stesso fattore exp(max esponente), quindi direttamente sommabili tra blocchi.
+    """
+    betas = np.atleast_1d(np.asarray(betas, dtype=float))
+    exponents = -np.outer(betas - beta0, E_values) # (n_beta, n_E)
+    exponents -= exponents.max(axis=1, keepdims=True)
+    weights = np.exp(exponents)
+    return np.einsum("be,kec->kbc", weights, H)
+
+
+def observables_from_replica_means(means):
+    """
+    Jackknife su tutte le osservabili di main.py a partire dalle medie dei momenti delle repliche
+    leave-one-block-out, means (k, n_beta, 6) nell'ordine di moments.MOMENTS.
+    Ritorna {nome: (medie (n_beta,), errori (n_beta,))}.
+    """
+    k = means.shape[0]
+    column = {name: i for i, name in enumerate(MOMENTS)}
+
+    def jackknife(F_jk):
+        F_mean = F_jk.mean(axis=0)
+        F_error = np.sqrt((k - 1) / k * np.sum((F_jk - F_mean)**2, axis=0))
+        return F_mean, F_error
+
+    results = {}
+    for name, moment in primary_observables.items():
+        results[name] = jackknife(means[:, :, column[moment]])
+    for name, (moments, secondary_func) in secondary_observables.items():
+        results[name] = jackknife(secondary_func(*(means[:, :, column[mom]] for mom in moments)))
+    return results
+
+
+def observables_from_weighted_sums(W):
+    """
+    Jackknife su tutte le osservabili di main.py a partire dalle somme pesate per blocco W (k, n_beta, 7).
+    Ritorna {nome: (medie (n_beta,), errori (n_beta,))}.
+    """
+    reduced = W.sum(axis=0) - W # somme senza il blocco i-esimo
+    return observables_from_replica_means(reduced[:, :, 1:] / reduced[:, :, :1])
+
+
+def reweight(m, e, L, beta0, betas, k=50):
+    """
+    Osservabili con errori jackknife (k blocchi) a tutti i beta in betas, dalla serie simulata a beta0.
+    """
+    E_values, H = energy_histograms(m, e, L, k)
+    W = reweighted_block_sums(E_values, H, beta0, betas)
+    return observables_from_weighted_sums(W)
+
+
+def reweighting_window(e, L, n_sigma=1.0, chunk_size=CHUNK_SIZE):
+    """
+    Semiampiezza indicativa dell'intervallo di beta affidabile: la media di E si sposta di circa Δβ σ_E²,
+    quindi resta entro n_sigma larghezze σ_E dell'istogramma simulato per |Δβ| <= n_sigma / σ_E.
+    σ_E si accumula a pezzi di chunk_size righe, con le somme di E - shift ed (E - shift)² (shift = media
+    del primo pezzo, per non perdere cifre nella differenza dei quadrati): nessuna copia della serie intera.
+    """
+    V = L * L
+    N = len(e)
+    shift, S1, S2 = None, 0.0, 0.0
+    for start in range(0, N, chunk_size):
+        E = np.asarray(e[start:min(start + chunk_size, N)], dtype=float) * V
+        if shift is None:
+            shift = E.mean()
+        E -= shift
+        S1 += E.sum()
+        S2 += np.dot(E, E)
+    variance = S2 / N - (S1 / N)**2
+    return n_sigma / np.sqrt(variance)
+
+
+def series_parameters(file_path):
+    """ (L, beta) di una serie: dall'header per i file binari, altrimenti dal nome del file. """
+    if is_binary(file_path):
+        header = read_header(file_path)
+        return header["L"], header["beta"]
+    match = name_pattern.search(file_path)
+    if match is None:
+        raise ValueError(f"Impossibile ricavare L e beta da {file_path}")
+    return int(match.group(1)), float(match.group(2))
+
+
+def check_boltzmann_sign(file_path):
+    """ Errore se la serie non dichiara di essere campionata con exp(-beta E) (binary_series.boltzmann_sign). """
+    sign = boltzmann_sign(file_path)
+    if sign is None:
+        raise ValueError(f"{file_path}: la serie non dichiara boltzmann_sign; se generata prima della correzione "
+                         "di energy_difference segue exp(+beta E) e non si può ripesare: rigenerarla")
+    if sign != BOLTZMANN_SIGN:
+        raise ValueError(f"{file_path}: serie campionata con exp({sign:+d} beta E), il reweighting assume exp(-beta E)")
+
+
+def reweight_file(file_path, betas=None, k=50, n_betas=201, n_sigma=1.0):
+    """
+    Reweighting di un file di serie temporali; L e beta0 dall'header (binari) o dal nome del file.
+    Se betas è None si usa una griglia densa di n_betas punti in beta0 ± reweighting_window.
+    Ritorna (betas, {nome: (medie, errori)}).
+    """
+    file_path = resolve_series_path(file_path)
+    check_boltzmann_sign(file_path)
+    L, beta0 = series_parameters(file_path)
+
+    m, e = load_columns(file_path, ("m", "e"))
+    if betas is None:
+        delta = reweighting_window(e, L, n_sigma)
+        betas = np.linspace(beta0 - delta, beta0 + delta, n_betas)
+
+    return np.asarray(betas), reweight(m, e, L, beta0, betas, k)
+
+
+def find_peak(betas, values):
+    """ Posizione e valore del massimo, raffinati con la parabola per i tre punti attorno al massimo del grid. """
+    betas = np.asarray(betas)
+    values = np.asarray(values)
+    i = int(np.argmax(values))
+    if i == 0 or i == len(values) - 1:
+        return betas[i], values[i]
+
+    a, b, c = np.polyfit(betas[i - 1:i + 2], values[i - 1:i + 2], 2)
+    if a >= 0:
+        return betas[i], values[i]
+    beta_peak = -b / (2 * a)
+    return beta_peak, c - b**2 / (4 * a)
@@ -1,13 +1,20 @@
 import os, re
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
 from collections import defaultdict
 from numpy.fft import fft, ifft
 from utils import find_file_paths_interactive, update_tau_exp_file
+from manifest import Manifest
+from binary_series import count_rows
+from autocorrelation import streaming_acf, integrated_times_file, SERIES, CHUNK_ROWS
+from concurrent.futures import ProcessPoolExecutor
 
 BETA_C = 0.4406867935
 
+# max_lag di default delle ACF: multiplo del τ_int di m stimato sulla stessa run, con un minimo
+DEFAULT_LAG_TAUS = 20
+MIN_DEFAULT_LAG = 256
+
 """
 La funzione di autocorrelazione di una serie temporale misura quanto il valore in un certo istante 
 è correlato con il valore a distanza di tempo τ.
@@ -48,11 +55,37 @@ def autocorrelation_function(x, max_lag):
     return acf
 
 
-def stima_tau_exp_media_acf(data_dir, max_lag=None):
+def default_max_lag(path, chunk_rows=CHUNK_ROWS):
+    """
+    max_lag per l'ACF di m quando non è dato: DEFAULT_LAG_TAUS volte τ_int(m) (almeno la finestra W e
+    MIN_DEFAULT_LAG), per cui C(τ) è già decaduta. Con max_lag = N - 1 memoria e tempo della passata
+    FFT crescerebbero con la lunghezza della serie.
+    """
+    results, N = integrated_times_file(path, series=("m",), chunk_rows=chunk_rows)
+    tau, _, W, _ = results["m"]
+    return min(max(int(np.ceil(DEFAULT_LAG_TAUS * tau)), W + 1, MIN_DEFAULT_LAG), N - 1)
+
+
+def _acf_task(task):
+    # eseguita nei processi del pool: ACF della magnetizzazione letta a pezzi dal file
+    path, max_lag, chunk_rows = task
+    if max_lag is None:
+        max_lag_local = default_max_lag(path, chunk_rows)
+    else:
+        max_lag_local = min(max_lag, count_rows(path) - 1)
+    return streaming_acf(path, max_lag_local, ("m",), chunk_rows)[:, 0]
+
+
+def stima_tau_exp_media_acf(data_dir, max_lag=None, n_workers=1, chunk_rows=CHUNK_ROWS):
     """
     Per ogni L, prende tutte le run (più versioni), calcola e media le ACF,
     poi stima tau_exp da questa media.
+    - Le ACF si calcolano leggendo i file a pezzi (autocorrelation.py): la memoria dipende da chunk_rows
+    e max_lag, non dalla lunghezza della serie; con n_workers > 1 i file sono distribuiti su più processi.
     """
+    import matplotlib.pyplot as plt
+    from scipy.optimize import curve_fit
+
     file_paths = find_file_paths_interactive(data_dir)
 
     # Raggruppa i path per valore di L
@@ -63,6 +96,14 @@ def stima_tau_exp_media_acf(data_dir, max_lag=None):
             L = int(match.group(1))
             gruppi_per_L[L].append(path)
 
+    # ACF di tutte le run di tutti gli L, in parallelo
+    tasks = [(path, max_lag, chunk_rows) for L in sorted(gruppi_per_L) for path in gruppi_per_L[L]]
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            acf_per_path = dict(zip((t[0] for t in tasks), pool.map(_acf_task, tasks, chunksize=1)))
+    else:
+        acf_per_path = {task[0]: _acf_task(task) for task in tasks}
+
     L_values = []
     tau_exp_values = []
 
@@ -70,20 +111,11 @@ def stima_tau_exp_media_acf(data_dir, max_lag=None):
 
     for L in sorted(gruppi_per_L.keys()):
         paths = gruppi_per_L[L]
-        acf_list = []
-
-        for path in paths:
-            data = np.loadtxt(path, skiprows=1)
-            m = data[:, 1]
 
-            # imposta max_lag se non specificato
-            if max_lag is None:
-                max_lag_local = len(m)-1
-            else:
-                max_lag_local = min(max_lag, len(m) - 1)
-
-            acf = autocorrelation_function(m, max_lag_local)
-            acf_list.append(acf)
+        # run di lunghezze diverse: si media sui lag comuni
+        acf_list = [acf_per_path[path] for path in paths]
+        n_lags = min(len(acf) for acf in acf_list)
+        acf_list = [acf[:n_lags] for acf in acf_list]
 
         # calcola media delle autocorrelazioni
         acf_array = np.array(acf_list)
@@ -119,9 +151,50 @@ def stima_tau_exp_media_acf(data_dir, max_lag=None):
 
 
 
-if __name__ == "__main__":
+def _tau_int_task(path):
+    results, N = integrated_times_file(path, series=tuple(SERIES))
+    return N, results
+
+
+def stima_tau_int_tutte_le_run(data_dir, output_path, n_workers=1):
+    """
+    τ_int con finestra automatica di m, |m|, e, m² per ogni run (tutte le versioni) delle cartelle L*_beta*
+    di data_dir, una sola passata FFT per file. Scrive una riga per (file, osservabile) in output_path.
+    """
+    # per ogni versione il manifest tiene un solo file, il .bin se esiste già la conversione
+    paths = {os.path.splitext(os.path.basename(run["path"]))[0]: run["path"] for run in Manifest(data_dir).runs()}
+
+    file_ids = sorted(paths)
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            risultati = list(pool.map(_tau_int_task, [paths[f] for f in file_ids], chunksize=1))
+    else:
+        risultati = [_tau_int_task(paths[f]) for f in file_ids]
+
+    with open(output_path, "w") as f:
+        f.write("# file_id                      osservabile  tau_int        err_tau_int    W       N\n")
+        for file_id, (N, results) in zip(file_ids, risultati):
+            for obs, (tau, err, W, converged) in results.items():
+                flag = "" if converged else "  # finestra non trovata"
+                f.write(f"{file_id:<30} {obs:<12} {tau:<14.6f} {err:<14.6f} {W:<7d} {N}{flag}\n")
+                print(f"{file_id}: τ_int({obs}) = {tau:.3f} ± {err:.3f} (W = {W})")
 
-    data_dir = "../data-generation/results-tau-exp"
+    return file_ids, risultati
 
-    L_vals, tau_exp_vals = stima_tau_exp_media_acf(data_dir)
-    update_tau_exp_file(L_vals, tau_exp_vals, "tau_exp_results.txt")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stima di tau_exp dalla media delle ACF per ogni L.")
+    parser.add_argument("--max-lag", type=int, default=None,
+                        help=f"lag massimo delle ACF (default: {DEFAULT_LAG_TAUS} τ_int di m per ogni run)")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="processi per il calcolo delle ACF")
+    parser.add_argument("--tau-int", metavar="DATA_DIR", default=None,
+                        help="stima τ_int di tutte le run in DATA_DIR e scrive tau_int_results.txt")
+    args = parser.parse_args()
+
+    if args.tau_int:
+        stima_tau_int_tutte_le_run(args.tau_int, "tau_int_results.txt", args.workers)
+    else:
+        data_dir = "../data-generation/results-tau-exp"
+
+        L_vals, tau_exp_vals = stima_tau_exp_media_acf(data_dir, args.max_lag, args.workers)
+        update_tau_exp_file(L_vals, tau_exp_vals, "tau_exp_results.txt")
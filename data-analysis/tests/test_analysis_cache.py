@@ -0,0 +1,123 @@
+""" Validità delle voci di analysis_cache.AnalysisCache ed eliminazione LRU. """
+import os
+import sys
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ANALYSIS_DIR)
+
+import analysis_cache  # noqa: E402
+from analysis_cache import AnalysisCache  # noqa: E402
+
+N_BYTES = 4096
+
+
+def write_series(path, seed, n_bytes=N_BYTES):
+    path.write_bytes(np.random.default_rng(seed).bytes(n_bytes))
+    return str(path)
+
+
+def make_tables(seed):
+    rng = np.random.default_rng(seed)
+    return {k: (rng.normal(size=(k, 5)), 10) for k in (2, 4)}
+
+
+def assert_same_tables(tables, expected):
+    assert tables is not None
+    assert sorted(tables) == sorted(expected)
+    for k, (table, M) in expected.items():
+        np.testing.assert_array_equal(tables[k][0], table)
+        assert tables[k][1] == M
+
+
+def test_unchanged_file_is_a_hit(tmp_path):
+    file_path = write_series(tmp_path / "serie.bin", 0)
+    tables = make_tables(0)
+    cache = AnalysisCache(tmp_path / "cache")
+    cache.put(file_path, tables, 100, tau_int={"taus": [1.0]})
+    cache.save()
+
+    reopened = AnalysisCache(tmp_path / "cache")
+    assert_same_tables(reopened.get(file_path, [2, 4]), tables)
+    assert reopened.get_meta(file_path, "tau_int") == {"taus": [1.0]}
+    assert reopened.get(file_path, [2, 8]) is None # k mancante
+
+
+def test_touch_only_is_a_hit(tmp_path):
+    file_path = write_series(tmp_path / "serie.bin", 0)
+    tables = make_tables(0)
+    cache = AnalysisCache(tmp_path / "cache")
+    cache.put(file_path, tables, 100)
+
+    st = os.stat(file_path)
+    os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert_same_tables(cache.get(file_path, [2, 4]), tables)
+
+
+def test_same_size_rewrite_with_restored_mtime_is_a_miss_with_verify(tmp_path):
+    # abbastanza grande da lasciare buchi tra i pezzi campionati da content_hash
+    n_bytes = 4 * (analysis_cache.HASH_SAMPLES + 1) * analysis_cache.HASH_PIECE
+    file_path = write_series(tmp_path / "serie.bin", 0, n_bytes)
+    cache = AnalysisCache(tmp_path / "cache")
+    cache.put(file_path, make_tables(0), 100)
+    cache.save()
+
+    st = os.stat(file_path)
+    hash_before = analysis_cache.content_hash(file_path)
+    with open(file_path, "r+b") as f: # cambia un byte tra il primo e il secondo pezzo campionato
+        f.seek(n_bytes // (analysis_cache.HASH_SAMPLES + 1) + 2 * analysis_cache.HASH_PIECE)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert os.stat(file_path).st_size == st.st_size
+    assert analysis_cache.content_hash(file_path) == hash_before
+
+    assert AnalysisCache(tmp_path / "cache").get(file_path, [2, 4]) is not None # senza verify non si nota
+    assert AnalysisCache(tmp_path / "cache", verify=True).get(file_path, [2, 4]) is None
+
+
+def test_verification_and_worker_hashes_avoid_rereading(tmp_path, monkeypatch):
+    file_path = write_series(tmp_path / "serie.bin", 0)
+    hashes = analysis_cache.file_hashes(file_path)
+
+    calls = []
+    full_content_hash = analysis_cache.full_content_hash
+    monkeypatch.setattr(analysis_cache, "full_content_hash", lambda path: calls.append(path) or full_content_hash(path))
+
+    cache = AnalysisCache(tmp_path / "cache", verify=True)
+    cache.put(file_path, make_tables(0), 100, hashes=hashes)
+    cache.save()
+    assert calls == [] # hash già calcolati da chi ha letto il file
+
+    cache = AnalysisCache(tmp_path / "cache", verify=True)
+    cache.get_meta(file_path, "tau_int")
+    assert cache.get(file_path, [2, 4]) is not None
+    cache.put(file_path, make_tables(1), 100)
+    assert calls == [file_path] # una sola verifica per sessione
+
+
+def test_eviction_removes_least_recently_used(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(analysis_cache, "time", SimpleNamespace(time=lambda: next(clock)))
+
+    cache = AnalysisCache(tmp_path / "cache")
+    paths = [write_series(tmp_path / f"serie_{i}.bin", i) for i in range(3)]
+    for i, file_path in enumerate(paths):
+        cache.put(file_path, make_tables(i), 100)
+    assert cache.get(paths[0], [2]) is not None # la prima diventa la più recente
+
+    entry_bytes = max(entry["bytes"] for entry in cache.index.values())
+    cache.max_bytes = 2 * entry_bytes
+    entry_files = {path: cache.index[os.path.abspath(path)]["file"] for path in paths}
+    cache.save()
+
+    reopened = AnalysisCache(tmp_path / "cache")
+    assert reopened.get(paths[1], [2]) is None
+    assert not os.path.exists(entry_files[paths[1]])
+    assert reopened.get(paths[0], [2]) is not None
+    assert reopened.get(paths[2], [2]) is not None
+    assert reopened.total_bytes() <= 2 * entry_bytes
@@ -0,0 +1,57 @@
+""" Serie binarie intere (totali M ed E con divisor V, step implicito) rilette da load_columns e iter_chunks. """
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ANALYSIS_DIR)
+
+from binary_series import create_series, open_series, integer_dtypes, load_columns, iter_chunks  # noqa: E402
+
+N_ROWS = 1000
+CHUNK_ROWS = 64
+STEP_START = 5000
+STRIDE = 10
+
+
+@pytest.mark.parametrize("L, m_dtype, e_dtype", [(128, "<i2", "<i4"), (182, "<i4", "<i4")])
+def test_integer_series_round_trip(tmp_path, L, m_dtype, e_dtype):
+    V = L * L
+    assert integer_dtypes(L) == (m_dtype, e_dtype)
+
+    rng = np.random.default_rng(L)
+    M = rng.integers(-V, V, size=N_ROWS, endpoint=True)
+    E = rng.integers(-2 * V, 2 * V, size=N_ROWS, endpoint=True)
+    M[:2], E[:2] = (-V, V), (-2 * V, 2 * V) # estremi del dtype scelto
+
+    file_path = str(tmp_path / f"L{L}_beta0.440000_v1.bin")
+    dtypes = [("m", m_dtype, {"divisor": V}), ("e", e_dtype, {"divisor": V})]
+    _, columns = create_series(file_path, N_ROWS, dtypes, L=L, step_start=STEP_START, stride=STRIDE)
+    columns["m"][:] = M
+    columns["e"][:] = E
+    for col in columns.values():
+        col.flush()
+    del columns
+
+    header, _ = open_series(file_path)
+    assert {col["name"]: col["dtype"] for col in header["columns"]} == {"m": m_dtype, "e": e_dtype}
+
+    expected_m = M / V
+    expected_e = E / V
+    expected_step = STEP_START + STRIDE * np.arange(N_ROWS)
+
+    step, m, e = load_columns(file_path, names=("step", "m", "e"))
+    np.testing.assert_array_equal(step, expected_step)
+    np.testing.assert_array_equal(np.asarray(m), expected_m)
+    np.testing.assert_array_equal(np.asarray(e), expected_e)
+    np.testing.assert_array_equal(m[100:200], expected_m[100:200])
+
+    chunks = list(iter_chunks(file_path, names=("step", "m", "e"), chunk_rows=CHUNK_ROWS))
+    assert [len(chunk[0]) for chunk in chunks] == [min(CHUNK_ROWS, N_ROWS - start)
+                                                   for start in range(0, N_ROWS, CHUNK_ROWS)]
+    for i, expected in enumerate((expected_step, expected_m, expected_e)):
+        values = np.concatenate([chunk[i] for chunk in chunks])
+        assert values.dtype == expected.dtype
+        np.testing.assert_array_equal(values, expected)
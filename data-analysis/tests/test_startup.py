@@ -0,0 +1,32 @@
+""" Avvio dei comandi di cli.py: i comandi numerici non devono importare matplotlib né scipy. """
+import os
+import sys
+import subprocess
+
+import pytest
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ANALYSIS_DIR)
+
+from cli import COMMANDS, measure_startup  # noqa: E402
+
+NUMERIC_COMMANDS = [command for command, (_, _, heavy_allowed) in COMMANDS.items() if not heavy_allowed]
+
+# limite largo sul tempo di import (numpy incluso) per non dipendere dalla macchina: scatta solo se
+# un comando torna a caricare all'avvio qualcosa di molto pesante; il tempo misurato finisce nel report
+STARTUP_LIMIT = 3.0
+
+
+@pytest.mark.parametrize("command", NUMERIC_COMMANDS)
+def test_command_does_not_import_heavy_modules(command, record_property):
+    module = COMMANDS[command][0]
+    seconds, heavy = measure_startup(module, repeats=1)
+    record_property("startup_seconds", round(seconds, 4))
+    assert heavy == [], f"{command} ({module}) importa all'avvio: {', '.join(heavy)}"
+    assert seconds < STARTUP_LIMIT, f"{command} ({module}) impiega {seconds:.2f} s ad avviarsi"
+
+
+def test_startup_check_exits_cleanly():
+    result = subprocess.run([sys.executable, "cli.py", "startup", "--check", "-n", "1"],
+                            cwd=ANALYSIS_DIR, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
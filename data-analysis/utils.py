@@ -1,7 +1,7 @@
 import os
 import re
-from collections import defaultdict
-import numpy as np
+from binary_series import load_columns, open_series, column_values
+from manifest import Manifest
 
 
 def find_file_paths_interactive(data_dir):
@@ -11,19 +11,9 @@ def find_file_paths_interactive(data_dir):
     - per ciascun L guida alla scelta della cartella e del file versione;
     - ritorna una lista di path completi dei file scelti.
     """
-    folder_pattern = re.compile(r"^L(\d+)_beta([\d.]+)$")
-    version_pattern = re.compile(r"_v(\d+)\.txt$")
-
-    # Raggruppa cartelle per L
-    gruppi_per_L = defaultdict(list)
-    for folder_name in os.listdir(data_dir):
-        match = folder_pattern.match(folder_name)
-        if match:
-            L = int(match.group(1))
-            beta = float(match.group(2))
-            folder_path = os.path.join(data_dir, folder_name)
-            if os.path.isdir(folder_path):
-                gruppi_per_L[L].append((folder_name, beta, folder_path))
+    # Raggruppa cartelle per L (dal manifest della cartella, vedi manifest.py)
+    manifest = Manifest(data_dir)
+    gruppi_per_L = manifest.folders_by_L()
 
     if not gruppi_per_L:
         raise RuntimeError(f"Nessuna cartella trovata in '{data_dir}' con formato L*_beta*")
@@ -72,24 +62,19 @@ def find_file_paths_interactive(data_dir):
         else:
             idx_cartella = 0
 
-        folder_name, beta, folder_path = cartelle_per_L[idx_cartella]
+        folder_name, beta, _ = cartelle_per_L[idx_cartella]
 
-        # Trova versioni disponibili
-        files = [f for f in os.listdir(folder_path) if f.startswith(folder_name) and version_pattern.search(f)]
-        versions = []
-        for f in files:
-            m = version_pattern.search(f)
-            if m:
-                versions.append((int(m.group(1)), f))
-        versions.sort()
+        # Trova versioni disponibili (se una versione esiste sia .txt che .bin, già convertita, si tiene il .bin)
+        versions = manifest.versions(folder_name)
+        per_versione = dict(versions)
 
         if not versions:
             print(f"Nessun file versione trovato in '{folder_name}'. Skipping.")
             continue
 
         print(f"\nVersioni disponibili per {folder_name}:")
-        for v, fname in versions:
-            print(f"v{v}  →  {fname}")
+        for v, path in versions:
+            print(f"v{v}  →  {os.path.basename(path)}")
 
         available_versions = [v for v, _ in versions]
 
@@ -108,9 +93,7 @@ def find_file_paths_interactive(data_dir):
                 print("Input non valido. Inserisci numeri interi separati da spazio.")
 
         for v in versioni_scelte:
-            fname_scelto = f"{folder_name}_v{v}.txt"
-            full_path = os.path.join(folder_path, fname_scelto)
-            file_paths.append(full_path)
+            file_paths.append(per_versione[v])
 
 
     return file_paths
@@ -154,11 +137,31 @@ def generate_unique_filename(base_dir, base_name="observables"):
             return candidate
         i += 1
 
+def file_label(name):
+    """ Nome di un'osservabile adatto a un nome di file: ⟨|m|⟩ -> absm, χ′ -> chip, ⟨m²⟩ -> m2, ⟨ε⟩ -> eps. """
+    name = re.sub(r"\|(.*?)\|", r"abs\1", name)
+    for old, new in (("⟨", ""), ("⟩", ""), ("′", "p"), ("²", "2"), ("ε", "eps"), ("χ", "chi")):
+        name = name.replace(old, new)
+    return name
+
+
 def read_data_file(file_path):
 
-    data = np.loadtxt(file_path)
-    m_values = data[:, 1]
-    e_values = data[:, 2]
+    m_values, e_values = load_columns(file_path, ("m", "e"))
 
     return m_values, e_values
 
+
+def read_simulation_series(file_path):
+    """
+    Serie binaria scritta da data-generation (main, tau_exp_main: series_writer in src/utils.c).
+    Ritorna (header, colonne): header con L, beta, seed, thermalization, stride e n_rows,
+    colonne step, m, e come np.memmap in sola lettura (nessuna copia finché non si leggono i dati).
+    Per le serie intere (--integers) m ed e sono ricostruiti esatti come M / V, E / V e step da step_start.
+    n_rows conta le righe scritte fino all'ultimo blocco: per una run interrotta la serie è più corta.
+    """
+    header, columns = open_series(file_path)
+    missing = {"L", "beta", "seed", "thermalization", "stride"} - set(header)
+    if missing:
+        raise ValueError(f"{file_path}: header senza {', '.join(sorted(missing))}, non scritto da data-generation")
+    return header, {name: column_values(header, columns, name) for name in ("step", "m", "e")}
@@ -4,8 +4,11 @@
 a evitare duplicazioni*/
 #define GEOMETRY_H
 
+#include "pcg32min.h"
+
 int *create_lattice(int L);
 void initialize_lattice(int L, int *lattice);
+void initialize_lattice_stream(int L, int *lattice, pcg32_random_t *rng);
 void free_lattice(int **lattice);
 
 #endif
\ No newline at end of file
@@ -4,11 +4,19 @@
 a evitare duplicazioni*/
 #define ISING_H
 
+#include "pcg32min.h"
+
 void initialize_metropolis_lookup(double beta, double *p_lookup);
 int energy_difference(int *lattice, int s_r,  int L, int i, int j);
-void metropolis_sweep(int *lattice, int L, double beta, double *p_lookup);
-void metropolis_sweep_single_update(int *lattice, int L, double beta, double *p_lookup, int i, int j);
+void metropolis_sweep(int *lattice, int L, double beta, double *p_lookup, int *M_tot, int *E_tot);
+void metropolis_sweep_stream(int *lattice, int L, double *p_lookup, int *M_tot, int *E_tot, pcg32_random_t *rng);
+void metropolis_sweep_single_update(int *lattice, int L, double beta, double *p_lookup, int i, int j,
+                                    int *M_tot, int *E_tot);
+int compute_magnetization(int *lattice, int L);
+int compute_energy(int *lattice, int L);
 double compute_magnetization_volume(int *lattice, int L);
 double compute_energy_per_spin(int *lattice, int L);
+long metropolis_run(int *lattice, int L, double beta, long n_sweeps, int stride, double *m_out, double *e_out,
+                    pcg32_random_t *rng);
 
 #endif
\ No newline at end of file
@@ -9,7 +9,7 @@
 
 typedef struct { uint64_t state;  uint64_t inc; } pcg32_random_t;
 
-extern pcg32_random_t pcg32_random_state;
+extern _Thread_local pcg32_random_t pcg32_random_state; /* uno per thread */
 
 uint32_t pcg32_random_r(pcg32_random_t* rng);
 void pcg32_srandom_r(pcg32_random_t* rng, uint64_t initstate, uint64_t initseq);
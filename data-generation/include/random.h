@@ -4,9 +4,25 @@
 a evitare duplicazioni*/
 #define RANDOM_H
 
+#include <stddef.h>
+#include <stdint.h>
+#include "pcg32min.h"
+
+/* generatore di default: uno stato per thread (pcg32_random_state) */
 void random_generator_init(unsigned long int initstate, unsigned long int initseq);
 double random_generator_doublenorm_1open(void);
 double random_generator_doublenorm_open(void);
 int random_generator_int(void);
+pcg32_random_t *random_generator_state(void);
+
+/* stream espliciti: ogni pcg32_random_t è un generatore indipendente, senza stato globale */
+void random_stream_init(pcg32_random_t *rng, uint64_t initstate, uint64_t initseq);
+void random_stream_advance(pcg32_random_t *rng, uint64_t delta);
+void random_stream_split(const pcg32_random_t *parent, pcg32_random_t *child, uint64_t k, uint64_t block);
+double random_stream_doublenorm_1open(pcg32_random_t *rng);
+double random_stream_doublenorm_open(pcg32_random_t *rng);
+void random_stream_fill_uint32(pcg32_random_t *rng, uint32_t *out, size_t n);
+void random_stream_fill_1open(pcg32_random_t *rng, double *out, size_t n);
+void random_stream_fill_open(pcg32_random_t *rng, double *out, size_t n);
 
 #endif
\ No newline at end of file
@@ -1,9 +1,45 @@
 #ifndef UTILS_H
 #define UTILS_H
 
+#include <stdio.h>
+
 void create_directory_if_needed(const char *path);
-void generate_unique_filename(char *folder, char *base_name, char *out_path, int max_len);
+void generate_unique_filename(char *folder, char *base_name, const char *extension, char *out_path, int max_len);
 double* generate_beta_range(int L, int *num_beta);
 unsigned long long read_tau_exp_from_file(int L, const char *filename);
 
+/* scrittura bufferizzata delle serie nel formato binario ISINGBIN di data-analysis/binary_series.py:
+   SERIES_DOUBLE: colonne step (int64), m ed e (float64);
+   SERIES_INTEGER: M = sum s ed E = -sum s_i s_j interi (int16 o int32 secondo L), m = M / V ed e = E / V
+   si ricostruiscono esatti in lettura; step implicito, step_start + k * stride */
+#define SERIES_DOUBLE 0
+#define SERIES_INTEGER 1
+#define SERIES_MAX_COLUMNS 3
+#define SERIES_BUFFER_ROWS 65536 /* righe tenute in memoria per colonna prima di scrivere */
+/* le serie campionano exp(BOLTZMANN_SIGN * beta * E): scritto negli header per distinguerle da quelle
+   generate prima della correzione del segno di energy_difference */
+#define BOLTZMANN_SIGN -1
+#define TEXT_SERIES_HEADER "# step\tm\tenergy\n# boltzmann_sign = -1\n"
+
+typedef struct {
+    FILE *fp;
+    char header[1024];                       /* campi fissi dell'header JSON (L, beta, seed, ...) */
+    long header_length;                      /* byte riservati all'header JSON, padding incluso */
+    long long capacity, n_rows, n_flushed;   /* righe previste, scritte, già passate al file */
+    int mode, n_columns, volume;
+    const char *names[SERIES_MAX_COLUMNS], *dtypes[SERIES_MAX_COLUMNS];
+    int itemsizes[SERIES_MAX_COLUMNS];
+    long long offsets[SERIES_MAX_COLUMNS];   /* offset delle colonne nel file */
+    long long buffers[SERIES_MAX_COLUMNS][SERIES_BUFFER_ROWS]; /* 8 byte per riga, bastano per ogni dtype */
+    int n_buffered;
+} series_writer;
+
+series_writer *series_writer_open(const char *path, int mode, long long capacity, int L, double beta,
+                                  unsigned long initstate, unsigned long initseq,
+                                  unsigned long long thermalization, unsigned long long step_start, int stride,
+                                  const char *source);
+void series_writer_append(series_writer *w, long long step, double m, double e);
+void series_writer_append_integers(series_writer *w, int M, int E);
+void series_writer_close(series_writer *w);
+
 #endif
@@ -6,57 +6,104 @@
 #include <string.h>
 #include <time.h>
 #include <math.h>
+#include <stdbool.h>
 
 #include "geometry.h"
 #include "ising.h"
 #include "random.h"
 #include "utils.h"
 
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
 #define MAX_LEN 200
+#ifndef N_SWEEPS
+#define N_SWEEPS 50000000ULL // 5 × 10^7 sweep dell'intero reticolo (-DN_SWEEPS=... per prove brevi)
+#endif
 #define BETA_C 0.4406867935
 
 
 /* argc: numero di argomenti (incluso il nome del programma)
    argv: array di stringhe con gli argomenti ->
    argv[0] è il nome del programma (es. "./main");
-   argv[1] è il primo argomento passato dall’utente (in questo caso L)*/
+   argv[1] è il primo argomento passato dall’utente (in questo caso L);
+   con --text le serie si scrivono nel vecchio formato testuale invece che in binario (utils.c, series_writer),
+   con --integers in binario come totali interi M ed E (esatti, 4-8 byte per misura invece di 24);
+   -t N: numero di thread, i beta si simulano in parallelo (default: tutti i core, OMP_NUM_THREADS);
+   -s SEED: seed principale (default: time(NULL), stampato a schermo per poter ripetere la run).
+
+   Ogni beta ha il suo reticolo e il suo stream PCG: initstate = seed principale, initseq = (L << 32) | b.
+   Lo stream dipende solo da seed, L e indice del beta, non da quale thread lo esegue né in che ordine:
+   i risultati sono identici bit per bit con qualsiasi numero di thread. */
+
+static void usage(const char *program) {
+    fprintf(stderr, "Uso: %s <L> [--text | --integers] [-t THREAD] [-s SEED]\n", program);
+    exit(EXIT_FAILURE);
+}
+
 
 int main(int argc, char *argv[]) {
-    if (argc != 2) {
-        fprintf(stderr, "Uso: %s <L>\n", argv[0]);
-        return EXIT_FAILURE;
+    bool text_output = false;
+    int series_mode = SERIES_DOUBLE, L = 0, n_threads = 0, num_beta, b;
+    unsigned long master_seed = (unsigned long) time(NULL);
+
+    for (int a = 1; a < argc; a++) {
+        if (strcmp(argv[a], "--text") == 0)
+            text_output = true;
+        else if (strcmp(argv[a], "--integers") == 0)
+            series_mode = SERIES_INTEGER;
+        else if (strcmp(argv[a], "-t") == 0 && a + 1 < argc)
+            n_threads = atoi(argv[++a]);
+        else if (strcmp(argv[a], "-s") == 0 && a + 1 < argc)
+            master_seed = strtoul(argv[++a], NULL, 10);
+        else if (L == 0)
+            L = atoi(argv[a]); /* converte la stringa in un intero (L) usando atoi() (ASCII to Integer) */
+        else
+            usage(argv[0]);
     }
-
-    int L = atoi(argv[1]); /* converte la stringa argv[1] in un intero (L) usando atoi() (ASCII to Integer) */
-    if (L <= 0) {
+    if (L == 0)
+        usage(argv[0]);
+    if (L < 0) {
         fprintf(stderr, "Errore: L deve essere un intero positivo.\n");
         return EXIT_FAILURE;
     }
 
-    double m, e, p_lookup[4];
-    int num_beta, b, step;
-    const unsigned long long T = 50000000ULL; // 5 × 10^7 sweep dell'intero reticolo
+    const unsigned long long T = N_SWEEPS;
 
     char tau_exp_path[] = "../data-analysis/tau_exp_results.txt";
     const unsigned long long TAU_MAX = read_tau_exp_from_file(L, tau_exp_path)/(L*L); // tau_exp per termalizzazione
-    double *betas = generate_beta_range(L, &num_beta), beta;
+    double *betas = generate_beta_range(L, &num_beta);
+
+#ifdef _OPENMP
+    if (n_threads <= 0)
+        n_threads = omp_get_max_threads();
+#else
+    n_threads = 1;
+#endif
+    printf("L = %d, %d beta, seed %lu, %d thread\n", L, num_beta, master_seed, n_threads);
 
-    // inizializza RNG
-    unsigned long initstate = (unsigned long) time(NULL);
-    unsigned long initseq = 54;
-    random_generator_init(initstate, initseq);
+    create_directory_if_needed("results");
 
+    /* schedule dynamic: i beta vicini a beta_c (dove gli sweep costano di più in accettazioni) non si accumulano
+       su un solo thread */
+    #pragma omp parallel for schedule(dynamic, 1) num_threads(n_threads)
     for (b = 0; b < num_beta; b++) {
-        beta = betas[b];
+        double beta = betas[b], m, e, p_lookup[9]; /* indici k = 2, 4, 6, 8 */
+        unsigned long long step;
+
+        // stream PCG del beta b (lo stato del generatore è per thread, vedi pcg32min.c)
+        unsigned long initstate = master_seed;
+        unsigned long initseq = ((unsigned long)L << 32) | (unsigned long)b;
+        random_generator_init(initstate, initseq);
 
         // prepara cartelle e nomi file
         char base_name[MAX_LEN], out_path[MAX_LEN], sotto_cartella_results[256];
         snprintf(base_name, sizeof(base_name), "L%d_beta%.6f", L, beta);
         snprintf(sotto_cartella_results, sizeof(sotto_cartella_results), "results/%s", base_name);
 
-        create_directory_if_needed("results");
         create_directory_if_needed(sotto_cartella_results);
-        generate_unique_filename(sotto_cartella_results, base_name, out_path, MAX_LEN);
+        generate_unique_filename(sotto_cartella_results, base_name, text_output ? ".txt" : ".bin", out_path, MAX_LEN);
 
         // inizializza lookup Metropolis
         initialize_metropolis_lookup(beta, p_lookup);
@@ -64,31 +111,44 @@ int main(int argc, char *argv[]) {
         // inizializza reticolo
         int *lattice = create_lattice(L);
         initialize_lattice(L, lattice);
-
-        FILE *fp = fopen(out_path, "w");
-        if (!fp) {
-            perror("Errore apertura file");
-            exit(EXIT_FAILURE);
+        int M_tot = compute_magnetization(lattice, L), E_tot = compute_energy(lattice, L);
+
+        FILE *fp = NULL;
+        series_writer *writer = NULL;
+        if (text_output) {
+            fp = fopen(out_path, "w");
+            if (!fp) {
+                perror("Errore apertura file");
+                exit(EXIT_FAILURE);
+            }
+            fprintf(fp, TEXT_SERIES_HEADER); // scrive intestazione, con la convenzione dei pesi
+        } else {
+            writer = series_writer_open(out_path, series_mode, (long long)(T > TAU_MAX ? T - TAU_MAX : 0), L, beta,
+                                        initstate, initseq, TAU_MAX, TAU_MAX, 1, "main");
         }
 
-        // scrive intestazione
-        fprintf(fp, "# step\tm\tenergy\n");
-
         for (step = 0; step < T; step++) {
-            metropolis_sweep(lattice, L, beta, p_lookup);
+            metropolis_sweep(lattice, L, beta, p_lookup, &M_tot, &E_tot);
 
             if (step >= TAU_MAX) { /* salva ogni L^2 steps */
-                m = compute_magnetization_volume(lattice, L);
-                e = compute_energy_per_spin(lattice, L);
-                fprintf(fp, "%d\t%.6f\t%.6f\n", step, m, e);
+                m = (double)M_tot / (L * L);
+                e = (double)E_tot / (L * L);
+                if (text_output)
+                    fprintf(fp, "%llu\t%.6f\t%.6f\n", step, m, e);
+                else if (series_mode == SERIES_INTEGER)
+                    series_writer_append_integers(writer, M_tot, E_tot);
+                else
+                    series_writer_append(writer, (long long)step, m, e);
             }
         }
 
-        fclose(fp);
+        if (text_output)
+            fclose(fp);
+        else
+            series_writer_close(writer);
         free_lattice(&lattice);
     }
 
     free(betas);
     return 0;
 }
-
@@ -28,11 +28,16 @@ int *create_lattice(int L) {
 /* inizializza il reticolo in modo random (+/-1 per i vari siti), ma qualsiasi altra scelta sarebbe andata bene;
 non restituisce nulla */
 void initialize_lattice(int L, int *lattice) {
+    initialize_lattice_stream(L, lattice, random_generator_state());
+}
+
+/* come initialize_lattice, con i numeri casuali presi dallo stream rng */
+void initialize_lattice_stream(int L, int *lattice, pcg32_random_t *rng) {
     int i, j, r;
 
     for (i = 0; i < L; i++) {
         for (j = 0; j < L; j++) {
-            r = random_generator_int(); /* intero tra 0 e RAND_MAX */
+            r = pcg32_random_r(rng) % (RAND_MAX + 1u); /* intero tra 0 e RAND_MAX, come random_generator_int */
             lattice[i * L + j] = (r % 2 == 0) ? 1 : -1; /* se pari è 1, altrimenti -1; Nota: equivalente a *(lattice + (i * L + j))*/
         }
     }
@@ -4,6 +4,7 @@
 #include <stdio.h>
 #include <stdlib.h>
 #include <math.h>
+#include <assert.h>
 #include "ising.h"
 #include "random.h"
 #include "geometry.h"
@@ -19,7 +20,8 @@ void initialize_metropolis_lookup(double beta, double *p_lookup) {
 }
 
 
-/* calcolo efficiente della differenza di energia delle due configurazioni: E' - E */
+/* calcolo efficiente della differenza di energia delle due configurazioni: E' - E, con s_r il nuovo valore
+   dello spin in (i, j) (il vecchio è -s_r) */
 int energy_difference(int *lattice, int s_r,  int L, int i, int j){
     int up, down, left, right, S_r;
 
@@ -31,13 +33,35 @@ int energy_difference(int *lattice, int s_r,  int L, int i, int j){
 
     S_r = up + down + left + right;
 
-    return 2* s_r * S_r; /* ritorna la differenza in energia */
+    return -2 * s_r * S_r; /* E = -sum s_i s_j: E' - E = -(s_r - (-s_r)) * S_r */
 
 }
 
 
-/* update Metropolis di tutto il reticolo, uno step di simulazione */
-void metropolis_sweep(int *lattice, int L, double beta, double *p_lookup) {
+/* totali M = sum s e E = -sum s_i s_j tenuti aggiornati dagli update: a ogni flip accettato
+   M cambia di 2 * trial e E di E' - E = k (k = energy_difference). Con -DDEBUG (make DEBUG=1)
+   si confrontano con il ricalcolo completo, O(L^2), dopo ogni update. */
+static void check_running_totals(int *lattice, int L, int M_tot, int E_tot) {
+#ifdef DEBUG
+    assert(M_tot == compute_magnetization(lattice, L));
+    assert(E_tot == compute_energy(lattice, L));
+#else
+    (void)lattice; (void)L; (void)M_tot; (void)E_tot;
+#endif
+}
+
+
+/* update Metropolis di tutto il reticolo, uno step di simulazione; aggiorna i totali *M_tot ed *E_tot.
+   Usa il generatore di default del thread (random_generator_state) */
+void metropolis_sweep(int *lattice, int L, double beta, double *p_lookup, int *M_tot, int *E_tot) {
+    (void)beta;
+    metropolis_sweep_stream(lattice, L, p_lookup, M_tot, E_tot, random_generator_state());
+}
+
+
+/* come metropolis_sweep, con i numeri casuali presi dallo stream rng: reticoli diversi con stream diversi
+   si possono simulare in parallelo senza stato condiviso */
+void metropolis_sweep_stream(int *lattice, int L, double *p_lookup, int *M_tot, int *E_tot, pcg32_random_t *rng) {
     double epsilon, w;
     int i, j, trial, k;
 
@@ -46,7 +70,7 @@ void metropolis_sweep(int *lattice, int L, double beta, double *p_lookup) {
         for (j = 0; j < L; j++) {
 
         /* calcolo un valore di epsilon in (0,1) */
-        epsilon = random_generator_doublenorm_open();
+        epsilon = random_stream_doublenorm_open(rng);
 
         if (epsilon >= 0.5) /* se si mette a 1 accetta sempre il flip come trial, a 0 non lo accetta mai come trial;
         lasciamo 0.5 e poi magari confrontiamo */
@@ -55,21 +79,24 @@ void metropolis_sweep(int *lattice, int L, double beta, double *p_lookup) {
            trial = (lattice[i*L + j] == -1) ? 1 : -1; /* flip dello spin in posizione i,j */
 
             k = energy_difference(lattice, trial, L, i, j);
-            if (k <= 0)
-                lattice[i * L + j] = trial; /* accettata, modifico il reticolo e vado al prossimo punto del lattice */
-            else {
-                w = random_generator_doublenorm_1open(); /* in [0,1) */
-                if (p_lookup[k] >= w) 
-                    lattice[i * L + j] = trial; /* accetto e modifico il reticolo */ 
-                }
+            if (k > 0) {
+                w = random_stream_doublenorm_1open(rng); /* in [0,1) */
+                if (p_lookup[k] < w)
+                    continue; /* rifiutato */
+            }
+            lattice[i * L + j] = trial; /* accettato, modifico il reticolo e aggiorno i totali */
+            *M_tot += 2 * trial;
+            *E_tot += k;
             }
         }
     }
+    check_running_totals(lattice, L, *M_tot, *E_tot);
 }
 
 
 /* update Metropolis di un punto (i, j) del reticolo, uno step di simulazione per la stima di tau_exp */
-void metropolis_sweep_single_update(int *lattice, int L, double beta, double *p_lookup, int i, int j) {
+void metropolis_sweep_single_update(int *lattice, int L, double beta, double *p_lookup, int i, int j,
+                                    int *M_tot, int *E_tot) {
     double epsilon, w;
     int trial, k;
 
@@ -80,19 +107,22 @@ void metropolis_sweep_single_update(int *lattice, int L, double beta, double *p_
         trial = (lattice[i*L + j] == -1) ? 1 : -1; /* flip dello spin in posizione i,j */
 
         k = energy_difference(lattice, trial, L, i, j);
-        if (k <= 0)
-            lattice[i * L + j] = trial; /* accettata, modifico il reticolo e vado al prossimo punto del lattice */
-        else {
+        if (k > 0) {
             w = random_generator_doublenorm_1open(); /* in [0,1) */
-            if (p_lookup[k] >= w) 
-                lattice[i * L + j] = trial; /* accetto e modifico il reticolo */ 
+            if (p_lookup[k] < w)
+                return; /* rifiutato */
         }
+        lattice[i * L + j] = trial; /* accettato, modifico il reticolo e aggiorno i totali */
+        *M_tot += 2 * trial;
+        *E_tot += k;
+        check_running_totals(lattice, L, *M_tot, *E_tot);
     }
 }
 
 
-/* calcolo della magnetizzazione e energia per unità di volume, utile per il salvataggio dei dati */
-double compute_magnetization_volume(int *lattice, int L) {
+/* magnetizzazione ed energia totali (interi), ricalcolate da zero in O(L^2): servono per inizializzare
+   i totali tenuti dagli update e per controllarli */
+int compute_magnetization(int *lattice, int L) {
     int i, j, sum = 0;
 
     for (i = 0; i < L; i++) {
@@ -101,10 +131,10 @@ double compute_magnetization_volume(int *lattice, int L) {
         }
     }
 
-    return (double)sum / (L * L);
+    return sum;
 }
 
-double compute_energy_per_spin(int *lattice, int L) {
+int compute_energy(int *lattice, int L) {
     int sum = 0, i, j, right, down;
 
     for (i = 0; i < L; i++) { 
@@ -119,5 +149,48 @@ double compute_energy_per_spin(int *lattice, int L) {
         }
     }
 
-    return -((double)sum) / (L * L);
-}
\ No newline at end of file
+    return -sum;
+}
+
+
+/* calcolo della magnetizzazione e energia per unità di volume, utile per il salvataggio dei dati */
+double compute_magnetization_volume(int *lattice, int L) {
+    return (double)compute_magnetization(lattice, L) / (L * L);
+}
+
+double compute_energy_per_spin(int *lattice, int L) {
+    return (double)compute_energy(lattice, L) / (L * L);
+}
+
+
+/* n_sweeps sweep Metropolis di seguito; dopo ogni stride sweep si scrivono magnetizzazione ed energia per spin
+   in m_out[n] ed e_out[n] (uno dei due può essere NULL). I buffer li alloca il chiamante, con almeno
+   n_sweeps / stride elementi: così da Python si riempiono direttamente array NumPy, senza file intermedi.
+   I numeri casuali vengono dallo stream rng del chiamante (uno per reticolo), non dal generatore di default:
+   da Python più reticoli in thread diversi non si contendono lo stato.
+   Ritorna il numero di misure scritte. */
+long metropolis_run(int *lattice, int L, double beta, long n_sweeps, int stride, double *m_out, double *e_out,
+                    pcg32_random_t *rng) {
+    double p_lookup[9]; /* indici k = 2, 4, 6, 8 */
+    double V = (double)L * L;
+    long step, n = 0;
+    int M_tot = compute_magnetization(lattice, L), E_tot = compute_energy(lattice, L);
+
+    if (stride < 1)
+        stride = 1;
+    initialize_metropolis_lookup(beta, p_lookup);
+
+    for (step = 1; step <= n_sweeps; step++) {
+        metropolis_sweep_stream(lattice, L, p_lookup, &M_tot, &E_tot, rng);
+
+        if (step % stride == 0) {
+            if (m_out != NULL)
+                m_out[n] = M_tot / V;
+            if (e_out != NULL)
+                e_out[n] = E_tot / V;
+            n++;
+        }
+    }
+
+    return n;
+}
@@ -34,4 +34,6 @@ void pcg32_srandom_r(pcg32_random_t* rng, uint64_t initstate, uint64_t initseq)
     }
 
 // random number internal state
-pcg32_random_t pcg32_random_state;
\ No newline at end of file
+/* uno stato per thread: in main ogni thread OpenMP inizializza e usa il proprio stream (random_generator_init),
+   senza condividere lo stato con gli altri; con un solo thread è il vecchio stato globale */
+_Thread_local pcg32_random_t pcg32_random_state;
\ No newline at end of file
@@ -7,6 +7,8 @@
 #include "pcg32min.h"
 
 #define TWO32 4294967296.0 /* 2^32 */
+#define PCG32_MULT 6364136223846793005ULL /* moltiplicatore dell'LCG di pcg32_random_r */
+#define FILL_LANES 8 /* stati avanzati in parallelo nei riempimenti a blocchi */
 
 /* una sola volta all'inizio del programma, serve a inizializzare lo stato interno del generatore */
 void random_generator_init(unsigned long int initstate, unsigned long int initseq)
@@ -31,3 +33,126 @@ int random_generator_int(void) {
     return pcg32_random_r(&pcg32_random_state) % (RAND_MAX + 1u);
 }
 
+
+/* stato del generatore di default del thread corrente, per passarlo alle funzioni random_stream_* */
+pcg32_random_t *random_generator_state(void) {
+    return &pcg32_random_state;
+}
+
+
+/* ========== stream espliciti ==========
+   Stesso generatore PCG32 (pcg32min.c), con lo stato passato esplicitamente: più stream nello stesso programma,
+   anche in thread diversi, senza stato condiviso. Con lo stesso seed uno stream produce esattamente la sequenza
+   di random_generator_*. */
+
+void random_stream_init(pcg32_random_t *rng, uint64_t initstate, uint64_t initseq) {
+    pcg32_srandom_r(rng, initstate, initseq);
+}
+
+
+/* coefficienti (mult, plus) dell'LCG avanzato di delta passi: state -> mult * state + plus, calcolati per
+   quadrature successive in O(log delta) (Brown, "Random number generation with arbitrary strides", 1994) */
+static void lcg_jump(uint64_t inc, uint64_t delta, uint64_t *mult, uint64_t *plus) {
+    uint64_t cur_mult = PCG32_MULT, cur_plus = inc, acc_mult = 1u, acc_plus = 0u;
+
+    while (delta > 0) {
+        if (delta & 1u) {
+            acc_mult *= cur_mult;
+            acc_plus = acc_plus * cur_mult + cur_plus;
+        }
+        cur_plus = (cur_mult + 1) * cur_plus;
+        cur_mult *= cur_mult;
+        delta /= 2;
+    }
+    *mult = acc_mult;
+    *plus = acc_plus;
+}
+
+
+/* salta delta numeri in O(log delta): equivale a delta chiamate di pcg32_random_r */
+void random_stream_advance(pcg32_random_t *rng, uint64_t delta) {
+    uint64_t mult, plus;
+
+    lcg_jump(rng->inc | 1u, delta, &mult, &plus);
+    rng->state = mult * rng->state + plus;
+}
+
+
+/* sottostream k-esimo di parent: la stessa sequenza a partire dal numero k * block. I sottostream con k diversi
+   non si sovrappongono finché ognuno usa al più block numeri; parent non viene modificato */
+void random_stream_split(const pcg32_random_t *parent, pcg32_random_t *child, uint64_t k, uint64_t block) {
+    *child = *parent;
+    random_stream_advance(child, k * block);
+}
+
+
+double random_stream_doublenorm_1open(pcg32_random_t *rng) {
+    return (double) pcg32_random_r(rng) / TWO32; /* in [0,1) */
+}
+
+double random_stream_doublenorm_open(pcg32_random_t *rng) {
+    return (pcg32_random_r(rng) + 0.5) / TWO32; /* in (0,1) */
+}
+
+
+/* funzione di output di pcg32_random_r (XSH RR) applicata a uno stato */
+static inline uint32_t pcg32_output(uint64_t state) {
+    uint32_t xorshifted = (uint32_t) (((state >> 18u) ^ state) >> 27u);
+    uint32_t rot = (uint32_t) (state >> 59u);
+    return (xorshifted >> rot) | (xorshifted << ((-rot) & 31));
+}
+
+
+/* n numeri a 32 bit, gli stessi di n chiamate di pcg32_random_r. L'LCG è sequenziale, quindi si tengono
+   FILL_LANES stati sfasati di un passo che avanzano insieme di FILL_LANES passi alla volta: il ciclo interno
+   non ha dipendenze tra le corsie e il compilatore lo può vettorizzare */
+void random_stream_fill_uint32(pcg32_random_t *rng, uint32_t *out, size_t n) {
+    uint64_t lanes[FILL_LANES], mult, plus, inc = rng->inc | 1u;
+    size_t i = 0;
+    int j;
+
+    if (n >= FILL_LANES) {
+        for (j = 0; j < FILL_LANES; j++) {
+            lanes[j] = rng->state;
+            rng->state = rng->state * PCG32_MULT + inc;
+        }
+        lcg_jump(inc, FILL_LANES, &mult, &plus);
+
+        for (; i + FILL_LANES <= n; i += FILL_LANES) {
+            for (j = 0; j < FILL_LANES; j++) {
+                out[i + j] = pcg32_output(lanes[j]);
+                lanes[j] = lanes[j] * mult + plus;
+            }
+        }
+        rng->state = lanes[0]; /* stato dopo i numeri già prodotti */
+    }
+    for (; i < n; i++)
+        out[i] = pcg32_random_r(rng);
+}
+
+
+/* n double in [0,1) (o in (0,1)), come n chiamate di random_stream_doublenorm_1open (_open): gli interi si
+   generano a blocchi di FILL_BLOCK in un buffer locale e si convertono in un ciclo vettorizzabile */
+#define FILL_BLOCK 1024
+
+void random_stream_fill_1open(pcg32_random_t *rng, double *out, size_t n) {
+    uint32_t raw[FILL_BLOCK];
+
+    for (size_t start = 0; start < n; start += FILL_BLOCK) {
+        size_t count = (n - start < FILL_BLOCK) ? n - start : FILL_BLOCK;
+        random_stream_fill_uint32(rng, raw, count);
+        for (size_t i = 0; i < count; i++)
+            out[start + i] = (double) raw[i] / TWO32;
+    }
+}
+
+void random_stream_fill_open(pcg32_random_t *rng, double *out, size_t n) {
+    uint32_t raw[FILL_BLOCK];
+
+    for (size_t start = 0; start < n; start += FILL_BLOCK) {
+        size_t count = (n - start < FILL_BLOCK) ? n - start : FILL_BLOCK;
+        random_stream_fill_uint32(rng, raw, count);
+        for (size_t i = 0; i < count; i++)
+            out[start + i] = (raw[i] + 0.5) / TWO32;
+    }
+}
@@ -1,7 +1,10 @@
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
+#include <sys/types.h>
 #include <sys/stat.h>
 #include <stdbool.h>
+#include <errno.h>
 #include <math.h>
 #include "utils.h"
 
@@ -10,6 +13,10 @@
 #define WIDTH_FACTOR 1.0     // fattore moltiplicativo per la finestra: serve a controllare quanto largo è il range di beta simulato per ogni L
 #define NUM_BETA 40          // numero di beta per ogni L
 
+#define SERIES_MAGIC "ISINGBIN"
+#define SERIES_PREAMBLE 12       // 8 byte di magic + uint32 con la lunghezza dell'header
+#define SERIES_ALIGNMENT 4096    // ogni colonna inizia a un multiplo di 4096 byte, come in binary_series.py
+
 
 /* controlla se esite già la cartella 'results' per esempio, altrimenti la crea */
 void create_directory_if_needed(const char *path) {
@@ -17,7 +24,8 @@ void create_directory_if_needed(const char *path) {
 
     if (stat(path, &st) == -1) {  /* stat() controlla se la cartella esiste, se -1 (non esiste o c'è un errore, 0 se esiste), tenta di crearla;
         la funzione stat() riempie il contenuto della struttura st con informazioni sulla directory path */
-        if (mkdir(path, 0755) != 0) {
+        /* EEXIST: la cartella è stata creata nel frattempo da un altro thread o processo, va bene lo stesso */
+        if (mkdir(path, 0755) != 0 && errno != EEXIST) {
             perror("mkdir"); /* stampa un messaggio di errore relativo all’ultima operazione fallita */
             exit(EXIT_FAILURE);
         }
@@ -25,21 +33,32 @@ void create_directory_if_needed(const char *path) {
 }
 
 
-/* genera un nome di file che non esiste ancora, nella cartella folder, con prefisso base_name, seguito da una versione numerata */
-void generate_unique_filename(char *folder, char *base_name, char *out_path, int max_len) {
-    int version = 1;
+static bool version_exists(char *folder, char *base_name, int version, const char *extension, int max_len) {
+    char path[max_len];
+    FILE *fp;
+
+    snprintf(path, max_len, "%s/%s_v%d%s", folder, base_name, version, extension);
+    fp = fopen(path, "r");
+    if (fp == NULL)
+        return false;
+    fclose(fp);
+    return true;
+}
 
-    snprintf(out_path, max_len, "%s/%s_v%d.txt", folder, base_name, version); /* genera il primo nome candidato;
-    'string formatted print with limit': scrive una stringa formattata (come printf), ma la scrive in un buffer,
-    cioè in una variabile char[], senza superare una certa lunghezza massima */
-    FILE *fp = fopen(out_path, "r");
 
-    while (fp != NULL) {
-        fclose(fp);
+/* genera un nome di file che non esiste ancora, nella cartella folder, con prefisso base_name, seguito da una versione
+   numerata ed extension (".txt" o ".bin"); una versione è libera solo se non c'è né il .txt né il .bin, perché in
+   data-analysis _vN.txt e _vN.bin sono la stessa run */
+void generate_unique_filename(char *folder, char *base_name, const char *extension, char *out_path, int max_len) {
+    int version = 1;
+
+    while (version_exists(folder, base_name, version, ".txt", max_len) ||
+           version_exists(folder, base_name, version, ".bin", max_len))
         version++;
-        snprintf(out_path, max_len, "%s/%s_v%d.txt", folder, base_name, version);
-        fp = fopen(out_path, "r");
-    }
+
+    snprintf(out_path, max_len, "%s/%s_v%d%s", folder, base_name, version, extension); /* 'string formatted print
+    with limit': scrive una stringa formattata (come printf), ma la scrive in un buffer, cioè in una variabile char[],
+    senza superare una certa lunghezza massima */
 }
 
 
@@ -96,4 +115,213 @@ unsigned long long read_tau_exp_from_file(int L, const char *filename) {
 
 
 
-/* caso colonne, makefile, tipi, riguardare utils.py e macro, valori T */
\ No newline at end of file
+/* caso colonne, makefile, tipi, riguardare utils.py e macro, valori T */
+
+
+/* ========== serie binarie ==========
+   Formato ISINGBIN (data-analysis/binary_series.py): magic, lunghezza dell'header, header JSON con L, beta, seed,
+   termalizzazione, stride e offset delle colonne, poi le colonne una dopo l'altra, ognuna allineata a 4096 byte.
+   Le misure si accumulano in buffer di SERIES_BUFFER_ROWS righe e si scrivono a blocchi, niente formattazione
+   testuale e nessun arrotondamento. Dopo ogni blocco si riscrive n_rows nell'header: una simulazione interrotta
+   lascia un file leggibile fino all'ultimo blocco scritto.
+   In modalità SERIES_INTEGER le colonne m ed e contengono M ed E interi con "divisor": V nell'header, e la colonna
+   step non c'è: 2 + 2 byte per riga fino a L = 128, 4 + 4 fino a L = 32768, contro gli 8 + 8 + 8 dei double.
+   Le colonne sono scritte con l'ordine dei byte della macchina, little-endian (x86, ARM). */
+
+static long long align_up(long long n) {
+    return (n + SERIES_ALIGNMENT - 1) / SERIES_ALIGNMENT * SERIES_ALIGNMENT;
+}
+
+
+/* beta con il minimo numero di cifre che lo rilegge identico */
+static void format_double(char *out, int size, double x) {
+    for (int digits = 6; digits <= 17; digits++) {
+        snprintf(out, size, "%.*g", digits, x);
+        if (strtod(out, NULL) == x)
+            return;
+    }
+}
+
+
+static void series_add_column(series_writer *w, const char *name, const char *dtype, int itemsize) {
+    w->names[w->n_columns] = name;
+    w->dtypes[w->n_columns] = dtype;
+    w->itemsizes[w->n_columns] = itemsize;
+    w->n_columns++;
+}
+
+
+/* header JSON completo; ritorna la lunghezza del testo senza padding */
+static int series_header_text(series_writer *w, char *text, int size, long long n_rows) {
+    int n = snprintf(text, size, "{%s, \"format_version\": 1, \"n_rows\": %lld, \"columns\": [", w->header, n_rows);
+
+    for (int c = 0; c < w->n_columns; c++) {
+        n += snprintf(text + n, size - n, "%s{\"name\": \"%s\", \"dtype\": \"%s\", \"offset\": %lld",
+                      c > 0 ? ", " : "", w->names[c], w->dtypes[c], w->offsets[c]);
+        if (w->mode == SERIES_INTEGER)
+            n += snprintf(text + n, size - n, ", \"divisor\": %d", w->volume);
+        n += snprintf(text + n, size - n, "}");
+    }
+    return n + snprintf(text + n, size - n, "]}");
+}
+
+
+static void series_write_header(series_writer *w) {
+    char text[SERIES_ALIGNMENT];
+    unsigned char length[4];
+    int n = series_header_text(w, text, sizeof(text), w->n_rows);
+
+    memset(text + n, ' ', w->header_length - n); /* padding fino all'inizio della zona dati */
+    for (int b = 0; b < 4; b++)
+        length[b] = (unsigned char)(w->header_length >> (8 * b)); /* uint32 little-endian */
+
+    if (fseeko(w->fp, 0, SEEK_SET) != 0 || fwrite(SERIES_MAGIC, 1, 8, w->fp) != 8 || fwrite(length, 1, 4, w->fp) != 4 ||
+        fwrite(text, 1, w->header_length, w->fp) != (size_t)w->header_length) {
+        perror("Errore scrittura header");
+        exit(EXIT_FAILURE);
+    }
+}
+
+
+static void series_flush(series_writer *w) {
+    if (w->n_buffered == 0)
+        return;
+
+    for (int c = 0; c < w->n_columns; c++) {
+        if (fseeko(w->fp, (off_t)(w->offsets[c] + w->n_flushed * w->itemsizes[c]), SEEK_SET) != 0 ||
+            fwrite(w->buffers[c], w->itemsizes[c], w->n_buffered, w->fp) != (size_t)w->n_buffered) {
+            perror("Errore scrittura serie");
+            exit(EXIT_FAILURE);
+        }
+    }
+    w->n_flushed += w->n_buffered;
+    w->n_buffered = 0;
+
+    series_write_header(w);
+    fflush(w->fp);
+}
+
+
+/* apre path per capacity misure al massimo (mode SERIES_DOUBLE o SERIES_INTEGER); seed, thermalization e stride
+   finiscono nell'header, step_start (primo step misurato) solo nella modalità intera, dove step è implicito */
+series_writer *series_writer_open(const char *path, int mode, long long capacity, int L, double beta,
+                                  unsigned long initstate, unsigned long initseq,
+                                  unsigned long long thermalization, unsigned long long step_start, int stride,
+                                  const char *source) {
+    char beta_text[32], text[SERIES_ALIGNMENT];
+    long long offset = SERIES_ALIGNMENT;
+    int n;
+    series_writer *w = malloc(sizeof(series_writer));
+
+    if (!w) {
+        fprintf(stderr, "Errore: allocazione buffer della serie fallita\n");
+        exit(EXIT_FAILURE);
+    }
+    w->fp = fopen(path, "wb");
+    if (!w->fp) {
+        perror("Errore apertura file");
+        exit(EXIT_FAILURE);
+    }
+
+    format_double(beta_text, sizeof(beta_text), beta);
+    n = snprintf(w->header, sizeof(w->header), "\"L\": %d, \"beta\": %s, \"seed\": [%lu, %lu], "
+                 "\"thermalization\": %llu, \"stride\": %d, \"source\": \"%s\", \"boltzmann_sign\": %d",
+                 L, beta_text, initstate, initseq, thermalization, stride, source, BOLTZMANN_SIGN);
+    w->capacity = capacity;
+    w->n_rows = w->n_flushed = 0;
+    w->n_buffered = 0;
+    w->mode = mode;
+    w->volume = L * L;
+    w->n_columns = 0;
+
+    if (mode == SERIES_INTEGER) {
+        snprintf(w->header + n, sizeof(w->header) - n, ", \"step_start\": %llu", step_start);
+        /* |M| <= V, |E| <= 2V: il tipo intero più piccolo che li contiene */
+        if (w->volume <= 32767)
+            series_add_column(w, "m", "<i2", 2);
+        else
+            series_add_column(w, "m", "<i4", 4);
+        if (2 * w->volume <= 32767)
+            series_add_column(w, "e", "<i2", 2);
+        else
+            series_add_column(w, "e", "<i4", 4);
+    } else {
+        series_add_column(w, "step", "<i8", 8);
+        series_add_column(w, "m", "<f8", 8);
+        series_add_column(w, "e", "<f8", 8);
+    }
+
+    /* come _layout in binary_series.py; i campi fissi stanno in w->header (1024 byte), quindi l'header completo
+       sta sempre nel primo blocco e i dati iniziano a SERIES_ALIGNMENT */
+    for (int c = 0; c < w->n_columns; c++) {
+        w->offsets[c] = offset;
+        offset = align_up(offset + capacity * w->itemsizes[c]);
+    }
+    if (SERIES_PREAMBLE + series_header_text(w, text, sizeof(text), capacity) >= SERIES_ALIGNMENT) {
+        fprintf(stderr, "Errore: header della serie troppo lungo\n");
+        exit(EXIT_FAILURE);
+    }
+    w->header_length = SERIES_ALIGNMENT - SERIES_PREAMBLE;
+
+    series_write_header(w);
+    return w;
+}
+
+
+/* copia il valore nella riga corrente del buffer della colonna c (itemsizes[c] byte) */
+static void series_store(series_writer *w, int c, const void *value) {
+    memcpy((unsigned char *)w->buffers[c] + (size_t)w->n_buffered * w->itemsizes[c], value, w->itemsizes[c]);
+}
+
+
+static void series_next_row(series_writer *w) {
+    w->n_buffered++;
+    w->n_rows++;
+    if (w->n_buffered == SERIES_BUFFER_ROWS)
+        series_flush(w);
+}
+
+
+static void series_check_capacity(series_writer *w) {
+    if (w->n_rows >= w->capacity) {
+        fprintf(stderr, "Errore: serie piena (%lld righe)\n", w->capacity);
+        exit(EXIT_FAILURE);
+    }
+}
+
+
+/* una misura in modalità SERIES_DOUBLE */
+void series_writer_append(series_writer *w, long long step, double m, double e) {
+    series_check_capacity(w);
+    series_store(w, 0, &step);
+    series_store(w, 1, &m);
+    series_store(w, 2, &e);
+    series_next_row(w);
+}
+
+
+/* una misura in modalità SERIES_INTEGER: totali M ed E del reticolo */
+void series_writer_append_integers(series_writer *w, int M, int E) {
+    int values[2] = {M, E};
+    short narrow;
+
+    series_check_capacity(w);
+    for (int c = 0; c < 2; c++) {
+        if (w->itemsizes[c] == 2) {
+            narrow = (short)values[c];
+            series_store(w, c, &narrow);
+        } else {
+            series_store(w, c, &values[c]);
+        }
+    }
+    series_next_row(w);
+}
+
+
+/* scrive le righe rimaste, aggiorna n_rows nell'header, chiude il file e libera w */
+void series_writer_close(series_writer *w) {
+    series_flush(w);
+    series_write_header(w);
+    fclose(w->fp);
+    free(w);
+}
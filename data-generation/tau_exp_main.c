@@ -6,6 +6,7 @@ si sceglie L da terminale e si prende un beta vicino a beta_c */
 #include <string.h>
 #include <time.h>
 #include <math.h>
+#include <stdbool.h>
 
 #include "geometry.h"
 #include "ising.h"
@@ -18,11 +19,25 @@ utile per dichiarare array statici, ma non hanno tipo; una macro vale in tutto i
 #define MAX_LEN 200
 #define BETA  0.44068679 /* leggermente sotto beta_c */
 
+/* con --text le serie si scrivono nel vecchio formato testuale invece che in binario (utils.c, series_writer),
+   con --integers in binario come totali interi M ed E (esatti, 4-8 byte per misura invece di 24) */
 int main(int argc, char *argv[]) {
-    if (argc != 2) {
-        fprintf(stderr, "Uso: %s <L>\n", argv[0]);
+    bool text_output = false;
+    int series_mode = SERIES_DOUBLE;
+    if (argc < 2 || argc > 3) {
+        fprintf(stderr, "Uso: %s <L> [--text | --integers]\n", argv[0]);
         return EXIT_FAILURE;
     }
+    if (argc == 3) {
+        if (strcmp(argv[2], "--text") == 0)
+            text_output = true;
+        else if (strcmp(argv[2], "--integers") == 0)
+            series_mode = SERIES_INTEGER;
+        else {
+            fprintf(stderr, "Uso: %s <L> [--text | --integers]\n", argv[0]);
+            return EXIT_FAILURE;
+        }
+    }
 
     int L = atoi(argv[1]);
     if (L <= 0) {
@@ -30,7 +45,7 @@ int main(int argc, char *argv[]) {
         return EXIT_FAILURE;
     }
 
-    double m, e, p_lookup[4];
+    double m, e, p_lookup[9]; /* indici k = 2, 4, 6, 8 */
     const unsigned long long T = 50000000ULL * (L*L); // numero di sweep Metropolis (single update)
 
     /* inizializza generatore di numeri casuali */
@@ -45,7 +60,7 @@ int main(int argc, char *argv[]) {
 
     create_directory_if_needed("results-tau-exp");
     create_directory_if_needed(sotto_cartella_results);
-    generate_unique_filename(sotto_cartella_results, base_name, out_path, MAX_LEN);
+    generate_unique_filename(sotto_cartella_results, base_name, text_output ? ".txt" : ".bin", out_path, MAX_LEN);
 
     // inizializza lookup table per Metropolis
     initialize_metropolis_lookup(BETA, p_lookup);
@@ -53,31 +68,46 @@ int main(int argc, char *argv[]) {
     // crea e inizializza reticolo
     int *lattice = create_lattice(L);
     initialize_lattice(L, lattice);
+    int M_tot = compute_magnetization(lattice, L), E_tot = compute_energy(lattice, L);
 
     // apre il file di output
-    FILE *fp = fopen(out_path, "w");
-    if (!fp) {
-        perror("Errore apertura file di output");
-        exit(EXIT_FAILURE);
+    FILE *fp = NULL;
+    series_writer *writer = NULL;
+    if (text_output) {
+        fp = fopen(out_path, "w");
+        if (!fp) {
+            perror("Errore apertura file di output");
+            exit(EXIT_FAILURE);
+        }
+        fprintf(fp, TEXT_SERIES_HEADER); // scrive intestazione, con la convenzione dei pesi
+    } else {
+        writer = series_writer_open(out_path, series_mode, (long long)T, L, BETA, initstate, initseq, 0, 0, 1,
+                                    "tau_exp_main");
     }
 
-    // scrive intestazione
-    fprintf(fp, "# step\tm\tenergy\n");
-
     // esegue T sweep singoli e salva magnetizzazione ed energia a ogni passo
     for (unsigned long long step = 0; step < T; step++) {
         int site = step % (L * L);
         /* mapping da indice lineare a coordinate bidimensionali */
         int i = site / L;
         int j = site % L;
-        metropolis_sweep_single_update(lattice, L, BETA, p_lookup, i, j);
-
-        m = compute_magnetization_volume(lattice, L);
-        e = compute_energy_per_spin(lattice, L);
-        fprintf(fp, "%llu\t%.8f\t%.8f\n", step, m, e);
+        metropolis_sweep_single_update(lattice, L, BETA, p_lookup, i, j, &M_tot, &E_tot);
+
+        /* misure O(1) dai totali aggiornati dall'update, senza ripassare il reticolo */
+        m = (double)M_tot / (L * L);
+        e = (double)E_tot / (L * L);
+        if (text_output)
+            fprintf(fp, "%llu\t%.8f\t%.8f\n", step, m, e);
+        else if (series_mode == SERIES_INTEGER)
+            series_writer_append_integers(writer, M_tot, E_tot);
+        else
+            series_writer_append(writer, (long long)step, m, e);
     }
 
-    fclose(fp);
+    if (text_output)
+        fclose(fp);
+    else
+        series_writer_close(writer);
     free_lattice(&lattice);
 
     return 0;
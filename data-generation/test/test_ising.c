@@ -7,8 +7,8 @@
 
 /* tests */
 int main(void) {
-    int L = 25, *lattice, step;
-    double beta = 0.5, p_lookup[4], M, E;
+    int L = 25, *lattice, step, M_tot, E_tot;
+    double beta = 0.5, p_lookup[9], M, E;
 
     random_generator_init(4, 54);
 
@@ -27,20 +27,94 @@ int main(void) {
     printf("Initial energy: %.6f\n", E);
 
     initialize_metropolis_lookup(beta, p_lookup);
+    M_tot = compute_magnetization(lattice, L);
+    E_tot = compute_energy(lattice, L);
 
-    /* 10 sweep di Metropolis */
+    /* 160 sweep di Metropolis: i totali aggiornati dagli update devono coincidere con il ricalcolo */
     for (step = 1; step <= 160; step++) {
-        metropolis_sweep(lattice, L, beta, p_lookup);
+        metropolis_sweep(lattice, L, beta, p_lookup, &M_tot, &E_tot);
 
         M = compute_magnetization_volume(lattice, L);
         E = compute_energy_per_spin(lattice, L);
 
         assert(M >= -1.0 && M <= 1.0);
         assert(E >= -2.0 && E <= 2.0);
+        assert(M_tot == compute_magnetization(lattice, L));
+        assert(E_tot == compute_energy(lattice, L));
 
         printf("Step %2d — M: %.6f  E: %.6f\n", step, M, E);
     }
 
+    /* update di un solo sito, come in tau_exp_main */
+    for (step = 0; step < 4 * L * L; step++) {
+        metropolis_sweep_single_update(lattice, L, beta, p_lookup, (step % (L * L)) / L, step % L, &M_tot, &E_tot);
+        assert(M_tot == compute_magnetization(lattice, L));
+        assert(E_tot == compute_energy(lattice, L));
+    }
+    printf("Totali M = %d, E = %d coerenti con il ricalcolo\n", M_tot, E_tot);
+
+    /* metropolis_run con lo stesso seed deve riprodurre esattamente il ciclo di sweep manuale */
+    {
+        int *lattice_run, n_sweeps = 40, stride = 4;
+        double p_run[9], m_run[10], e_run[10];
+        pcg32_random_t rng;
+        long n;
+
+        /* lo stream esplicito con il seed (7, 11) produce la stessa sequenza del generatore di default */
+        random_stream_init(&rng, 7, 11);
+        lattice_run = create_lattice(L);
+        initialize_lattice_stream(L, lattice_run, &rng);
+        random_generator_init(1, 1); /* il generatore di default non deve influire su metropolis_run */
+        n = metropolis_run(lattice_run, L, beta, n_sweeps, stride, m_run, e_run, &rng);
+        assert(n == n_sweeps / stride);
+
+        random_generator_init(7, 11);
+        initialize_lattice(L, lattice);
+        initialize_metropolis_lookup(beta, p_run);
+        M_tot = compute_magnetization(lattice, L);
+        E_tot = compute_energy(lattice, L);
+        for (step = 1; step <= n_sweeps; step++) {
+            metropolis_sweep(lattice, L, beta, p_run, &M_tot, &E_tot);
+            if (step % stride == 0) {
+                assert(m_run[step / stride - 1] == compute_magnetization_volume(lattice, L));
+                assert(e_run[step / stride - 1] == compute_energy_per_spin(lattice, L));
+            }
+        }
+
+        /* senza buffer per e */
+        assert(metropolis_run(lattice_run, L, beta, 8, 3, m_run, NULL, &rng) == 2);
+
+        free_lattice(&lattice_run);
+        printf("metropolis_run: %ld misure, uguali al ciclo manuale\n", n);
+    }
+
+    /* energy_difference è E' - E: confronto con il ricalcolo completo dopo il flip di ogni sito */
+    {
+        int i, j, s, E_before, k;
+
+        random_generator_init(3, 54);
+        initialize_lattice(L, lattice);
+        for (i = 0; i < L; i++) {
+            for (j = 0; j < L; j++) {
+                s = lattice[i * L + j];
+                E_before = compute_energy(lattice, L);
+                k = energy_difference(lattice, -s, L, i, j);
+                lattice[i * L + j] = -s;
+                assert(compute_energy(lattice, L) - E_before == k);
+                lattice[i * L + j] = s;
+            }
+        }
+
+        /* a beta = 1 il ferromagnete si ordina: energia per spin vicina a -2 */
+        initialize_metropolis_lookup(1.0, p_lookup);
+        M_tot = compute_magnetization(lattice, L);
+        E_tot = compute_energy(lattice, L);
+        for (step = 0; step < 2000; step++)
+            metropolis_sweep(lattice, L, 1.0, p_lookup, &M_tot, &E_tot);
+        assert(compute_energy_per_spin(lattice, L) < -1.5);
+        printf("energy_difference = E' - E; energia per spin a beta = 1: %.4f\n", compute_energy_per_spin(lattice, L));
+    }
+
     free_lattice(&lattice);
     return 0;
 }
@@ -1,6 +1,7 @@
 #include <stdlib.h>
 #include <stdio.h>
 #include <assert.h>
+#include <math.h>
 #include "random.h"
 #include "pcg32min.h"
 
@@ -33,6 +34,108 @@ int main(void) {
         if (r > max_int) max_int = r;
     }
 
+    /* stream espliciti: stessa sequenza del generatore di default con lo stesso seed */
+    printf("Testing random_stream_* (stessa sequenza di random_generator_*)...\n");
+    pcg32_random_t s, t, u;
+    random_generator_init(42, 54);
+    random_stream_init(&s, 42, 54);
+    for (int i = 0; i < 1000; i++) {
+        assert(random_generator_doublenorm_1open() == random_stream_doublenorm_1open(&s));
+        assert(random_generator_doublenorm_open() == random_stream_doublenorm_open(&s));
+    }
+    assert(random_generator_state()->state == s.state);
+
+    /* primi valori della demo di riferimento di pcg32 (pcg32-demo, seed 42, 54), generati a blocchi */
+    const uint32_t reference[6] = {0xa15c02b7, 0x7b47f409, 0xba1d3330, 0x83d2f293, 0xbfa4784b, 0xcbed606e};
+    uint32_t first[6];
+    random_stream_init(&s, 42, 54);
+    random_stream_fill_uint32(&s, first, 6);
+    for (int i = 0; i < 6; i++)
+        assert(first[i] == reference[i]);
+
+    /* riempimenti a blocchi: uguali alle chiamate singole, per lunghezze attorno al numero di corsie e ai blocchi */
+    printf("Testing random_stream_fill_*...\n");
+    size_t sizes[] = {0, 1, 7, 8, 9, 1000, 1024, 1025, 4099};
+    uint32_t *raw = malloc(4099 * sizeof(uint32_t));
+    double *values = malloc(4099 * sizeof(double));
+    for (size_t k = 0; k < sizeof(sizes) / sizeof(sizes[0]); k++) {
+        size_t n = sizes[k];
+        random_stream_init(&s, 7, 11);
+        random_stream_init(&t, 7, 11);
+        random_stream_fill_uint32(&s, raw, n);
+        for (size_t i = 0; i < n; i++)
+            assert(raw[i] == pcg32_random_r(&t));
+        assert(s.state == t.state); /* lo stato prosegue come dopo n chiamate */
+
+        random_stream_fill_1open(&s, values, n);
+        for (size_t i = 0; i < n; i++)
+            assert(values[i] == random_stream_doublenorm_1open(&t));
+        random_stream_fill_open(&s, values, n);
+        for (size_t i = 0; i < n; i++)
+            assert(values[i] == random_stream_doublenorm_open(&t) && values[i] > 0.0 && values[i] < 1.0);
+    }
+
+    /* advance: equivale a delta chiamate, si compone, e avanzare di 2^64 - d riporta indietro di d */
+    printf("Testing random_stream_advance...\n");
+    uint64_t deltas[] = {0, 1, 2, 63, 12345};
+    for (size_t k = 0; k < sizeof(deltas) / sizeof(deltas[0]); k++) {
+        random_stream_init(&s, 3, 5);
+        random_stream_init(&t, 3, 5);
+        random_stream_advance(&s, deltas[k]);
+        for (uint64_t i = 0; i < deltas[k]; i++)
+            pcg32_random_r(&t);
+        assert(s.state == t.state && pcg32_random_r(&s) == pcg32_random_r(&t));
+    }
+    random_stream_init(&s, 3, 5);
+    t = s;
+    random_stream_advance(&s, 1000000007ULL);
+    random_stream_advance(&s, 999999937ULL);
+    random_stream_advance(&t, 1000000007ULL + 999999937ULL);
+    assert(s.state == t.state);
+    random_stream_advance(&s, (uint64_t)0 - (1000000007ULL + 999999937ULL));
+    random_stream_init(&t, 3, 5);
+    assert(s.state == t.state);
+
+    /* split: il sottostream k parte dal numero k * block della sequenza del padre, che resta invariato */
+    printf("Testing random_stream_split...\n");
+    random_stream_init(&s, 9, 13);
+    t = s;
+    random_stream_split(&s, &u, 3, 1000);
+    for (int i = 0; i < 3000; i++)
+        pcg32_random_r(&t);
+    assert(u.state == t.state);
+    pcg32_random_t parent;
+    random_stream_init(&parent, 9, 13);
+    assert(parent.state == s.state);
+
+    /* indipendenza: medie dei sottostream e correlazioni tra coppie compatibili con zero (5 sigma) */
+    printf("Testing indipendenza dei sottostream...\n");
+    enum { N_STREAMS = 4, N_SAMPLES = 200000 };
+    pcg32_random_t streams[N_STREAMS];
+    double *samples = malloc((size_t)N_STREAMS * N_SAMPLES * sizeof(double));
+    for (int k = 0; k < N_STREAMS; k++) {
+        random_stream_split(&parent, &streams[k], (uint64_t)k, 1ULL << 40);
+        random_stream_fill_1open(&streams[k], samples + (size_t)k * N_SAMPLES, N_SAMPLES);
+        double mean = 0.0;
+        for (int i = 0; i < N_SAMPLES; i++)
+            mean += samples[(size_t)k * N_SAMPLES + i];
+        mean /= N_SAMPLES;
+        assert(fabs(mean - 0.5) < 5.0 * sqrt(1.0 / 12.0 / N_SAMPLES));
+    }
+    for (int a = 0; a < N_STREAMS; a++) {
+        for (int b = a + 1; b < N_STREAMS; b++) {
+            double corr = 0.0;
+            for (int i = 0; i < N_SAMPLES; i++)
+                corr += (samples[(size_t)a * N_SAMPLES + i] - 0.5) * (samples[(size_t)b * N_SAMPLES + i] - 0.5);
+            corr *= 12.0 / N_SAMPLES; /* coefficiente di correlazione, varianza di U(0,1) = 1/12 */
+            assert(fabs(corr) < 5.0 / sqrt((double)N_SAMPLES));
+            assert(samples[(size_t)a * N_SAMPLES] != samples[(size_t)b * N_SAMPLES]);
+        }
+    }
+    free(samples);
+    free(values);
+    free(raw);
+
     printf("All tests passed.\n");
     printf("Min int observed: %d, Max int observed: %d\n", min_int, max_int);
 
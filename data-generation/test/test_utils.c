@@ -6,6 +6,7 @@
 #include <sys/types.h>
 #include <unistd.h>
 #include <stdbool.h>
+#include <assert.h>
 #include "utils.h"
 
 
@@ -23,7 +24,7 @@ int main(void) {
 
     // Test 2: generare file unico per la prima combinazione
     snprintf(base_name, sizeof(base_name), "L%d_beta%.6f", L_test, beta_test);
-    generate_unique_filename((char *)results_dir, base_name, full_path, sizeof(full_path));
+    generate_unique_filename((char *)results_dir, base_name, ".txt", full_path, sizeof(full_path));
     printf("Nome file unico generato: %s\n", full_path);
 
     // Test 3: testare generate_beta_range
@@ -40,5 +41,71 @@ int main(void) {
         fprintf(stderr, "Errore: generazione betas fallita\n");
     }
 
+    // Test 4: la versione salta anche i file .bin esistenti
+    char bin_path[200], next_path[200];
+    snprintf(base_name, sizeof(base_name), "L%d_beta%.6f_writer", L_test, beta_test);
+    generate_unique_filename((char *)results_dir, base_name, ".bin", bin_path, sizeof(bin_path));
+
+    // Test 5: series_writer, più righe del buffer per passare da almeno due scritture a blocchi
+    long long capacity = 100000, n = SERIES_BUFFER_ROWS + 1001, step_read;
+    double m_read, e_read;
+    series_writer *writer = series_writer_open(bin_path, SERIES_DOUBLE, capacity, L_test, beta_test, 42, 54, 1000, 1000, 1,
+                                               "test_utils");
+    for (long long k = 0; k < n; k++)
+        series_writer_append(writer, 1000 + k, (double)k / 3.0, -(double)k / 7.0);
+    series_writer_close(writer);
+
+    FILE *fp = fopen(bin_path, "rb");
+    char magic[9] = {0}, header[4096];
+    unsigned char length_bytes[4];
+    assert(fread(magic, 1, 8, fp) == 8 && strcmp(magic, "ISINGBIN") == 0);
+    assert(fread(length_bytes, 1, 4, fp) == 4);
+    long length = length_bytes[0] | length_bytes[1] << 8 | length_bytes[2] << 16 | (long)length_bytes[3] << 24;
+    assert(12 + length == 4096); /* header corto: i dati iniziano al primo blocco da 4096 byte */
+    assert(fread(header, 1, length, fp) == (size_t)length);
+    header[length - 1] = '\0';
+    assert(strstr(header, "\"n_rows\": 66537") != NULL);
+    assert(strstr(header, "\"seed\": [42, 54]") != NULL);
+    assert(strstr(header, "\"thermalization\": 1000") != NULL);
+
+    /* ultima riga: step dalla colonna a 4096, m ed e dalle colonne successive (capacity righe ciascuna, allineate) */
+    long long col = 4096, col_size = (capacity * 8 + 4095) / 4096 * 4096;
+    fseek(fp, col + (n - 1) * 8, SEEK_SET);
+    assert(fread(&step_read, 8, 1, fp) == 1 && step_read == 1000 + n - 1);
+    fseek(fp, col + col_size + (n - 1) * 8, SEEK_SET);
+    assert(fread(&m_read, 8, 1, fp) == 1 && m_read == (double)(n - 1) / 3.0);
+    fseek(fp, col + 2 * col_size + (n - 1) * 8, SEEK_SET);
+    assert(fread(&e_read, 8, 1, fp) == 1 && e_read == -(double)(n - 1) / 7.0);
+    fclose(fp);
+    printf("Serie binaria scritta e riletta: %s (%lld righe)\n", bin_path, n);
+
+    generate_unique_filename((char *)results_dir, base_name, ".txt", next_path, sizeof(next_path));
+    assert(strcmp(next_path, bin_path) != 0);
+    remove(bin_path);
+
+    // Test 6: modalità intera, L = 16 -> M ed E in int16, step implicito
+    int L_small = 16;
+    short M_read, E_read;
+    writer = series_writer_open(bin_path, SERIES_INTEGER, capacity, L_small, beta_test, 42, 54, 1000, 1000, 1,
+                                "test_utils");
+    for (long long k = 0; k < n; k++)
+        series_writer_append_integers(writer, (int)(k % 513) - 256, -2 * ((int)(k % 257) - 128));
+    series_writer_close(writer);
+
+    fp = fopen(bin_path, "rb");
+    assert(fseek(fp, 12, SEEK_SET) == 0 && fread(header, 1, length, fp) == (size_t)length);
+    header[length - 1] = '\0';
+    assert(strstr(header, "\"step_start\": 1000") != NULL);
+    assert(strstr(header, "\"name\": \"m\", \"dtype\": \"<i2\", \"offset\": 4096, \"divisor\": 256") != NULL);
+    assert(strstr(header, "\"step\"") == NULL);
+    col_size = (capacity * 2 + 4095) / 4096 * 4096;
+    fseek(fp, col + (n - 1) * 2, SEEK_SET);
+    assert(fread(&M_read, 2, 1, fp) == 1 && M_read == (n - 1) % 513 - 256);
+    fseek(fp, col + col_size + (n - 1) * 2, SEEK_SET);
+    assert(fread(&E_read, 2, 1, fp) == 1 && E_read == -2 * ((n - 1) % 257 - 128));
+    fclose(fp);
+    printf("Serie intera scritta e riletta: %s\n", bin_path);
+    remove(bin_path);
+
     return 0;
 }
\ No newline at end of file